@@ -1,7 +1,6 @@
 from flask import Flask, jsonify
-import subprocess
-import os
 import sys
+import threading
 from flask_cors import CORS
 import atexit
 from pathlib import Path
@@ -49,77 +48,114 @@ APPS_PARA_INICIAR = [
 
 # -----------------------------------------
 
-services_started = False
-running_processes = []
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+if str(cwd) not in sys.path:
+    sys.path.append(str(cwd))
+
+from comum import config
+from comum.cliente_ia import aquecer_modelo
+from comum.multipagina import PAGINAS
+from supervisor import Supervisor
+
+# Layout "unico": um só servidor Streamlit (portal.py) com todos os geradores como páginas.
+# O supervisor cuida só dele, e cada app da lista acima vira uma página do portal.
+PORTAL_UNICO = config.PORTAL_LAYOUT == "unico"
+NOME_PORTAL = "PORTAL"
+PAGINAS_POR_NOME = {pagina.nome: pagina for pagina in PAGINAS}
+
+if PORTAL_UNICO:
+    SERVICOS = [
+        {
+            "nome": NOME_PORTAL,
+            "caminho_app": Path(__file__).resolve().parent / "portal.py",
+            "porta": config.PORTAL_PORTA,
+        },
+    ]
+else:
+    SERVICOS = APPS_PARA_INICIAR
+
+def servico_do_app(nome):
+    """Nome do serviço do supervisor que atende o app (KeyError se o app não existir)."""
+    if not PORTAL_UNICO:
+        return nome
+    if nome not in PAGINAS_POR_NOME and nome != NOME_PORTAL:
+        raise KeyError(nome)
+    return NOME_PORTAL
+
+def status_apps():
+    """Status de cada app, com o endereço em que ele é aberto no layout atual."""
+    if not PORTAL_UNICO:
+        return [
+            dict(status_app, url=f"http://localhost:{status_app['porta']}/")
+            for status_app in supervisor.status()
+        ]
+    status_portal = supervisor.status()[0]
+    return [
+        dict(status_portal, nome=app["nome"], url=f"http://localhost:{config.PORTAL_PORTA}/{PAGINAS_POR_NOME[app['nome']].url_path}")
+        for app in APPS_PARA_INICIAR
+    ]
+
+# Inicia os apps, acompanha o /_stcore/health de cada um e reinicia os que caírem.
+# Sob demanda, cada app só sobe no primeiro clique e é encerrado quando fica ocioso.
+supervisor = Supervisor(
+    SERVICOS,
+    python=PYTHON_EXECUTABLE,
+    ocioso=config.SUPERVISOR_OCIOSO_MIN * 60 if config.SUPERVISOR_SOB_DEMANDA else 0,
+)
+
+_modelo_aquecido = threading.Event()
+
+def aquecer_modelo_uma_vez():
+    # Carrega o modelo no Ollama enquanto os apps sobem, sem atrasar a resposta
+    if not _modelo_aquecido.is_set():
+        _modelo_aquecido.set()
+        threading.Thread(target=aquecer_modelo, name="aquecer-modelo", daemon=True).start()
 
 @app.route("/start_services")
 def start_services():
-    global services_started, running_processes
-    
-    if services_started:
+    if supervisor.iniciado and not config.SUPERVISOR_SOB_DEMANDA:
         print("Serviços já foram iniciados anteriormente.")
         return jsonify({"status": "already_running", "message": "Os serviços já foram iniciados."})
 
     try:
         print("Recebido comando para iniciar os serviços...")
-        for app_info in APPS_PARA_INICIAR:
-            app_name = app_info['nome']
-            app_path = app_info['caminho_app']
-            app_port = app_info['porta']
-
-            print(f"Iniciando {app_name} na porta {app_port}...")
-            
-            if not os.path.exists(app_path):
-                print(f"!!! ERRO: O arquivo para '{app_name}' não foi encontrado em: {app_path}")
-                continue 
-
-            command = [
-                PYTHON_EXECUTABLE,
-                "-m", "streamlit", "run",
-                app_path,
-                "--server.port", app_port,
-                "--server.headless=true"
-            ]
-            
-            # Define o diretório de trabalho como a pasta onde o app.py está
-            working_directory = os.path.dirname(app_path)
-            
-            # Define o nome do arquivo de log para capturar saídas e erros
-            log_file_path = f"{app_name}_log.txt"
-            
-            # Abre o arquivo de log para escrita
-            log_file = open(log_file_path, 'wb')
-            
-            # Inicia o processo em segundo plano, sem janela de console
-            process = subprocess.Popen(
-                command,
-                stdout=log_file,
-                stderr=log_file,
-                cwd=working_directory, # Define o diretório de trabalho
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            running_processes.append(process)
-            print(f"-> Comando para '{app_name}' enviado. Logs serão salvos em '{log_file_path}'")
-
-        services_started = True
-        print("Todos os comandos de inicialização foram enviados. Serviços estão rodando em segundo plano.")
-        return jsonify({"status": "success", "message": "Serviços iniciados em segundo plano com sucesso."})
+        aquecer_modelo_uma_vez()
+
+        # Todos os apps sobem ao mesmo tempo; o portal acompanha cada um pelo /status
+        supervisor.iniciar_todos()
+
+        print("Todos os comandos de inicialização foram enviados. Acompanhe em /status.")
+        return jsonify({"status": "success", "message": "Serviços iniciando em segundo plano."})
 
     except Exception as e:
         print(f"Ocorreu um erro crítico ao tentar iniciar os processos: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
-    
+
+@app.route("/start/<nome>")
+def start_app(nome):
+    """Inicia só o app pedido (se ainda não estiver no ar). O portal espera o estado "pronto" no /status."""
+    try:
+        status_app = supervisor.iniciar(servico_do_app(nome))
+    except KeyError:
+        return jsonify({"status": "error", "message": f"App desconhecido: {nome}"}), 404
+    aquecer_modelo_uma_vez()
+    return jsonify({"status": status_app["estado"], "app": status_app})
+
+@app.route("/status")
+def status():
+    """Estado de cada app (parado, iniciando, pronto, aguardando, falhou), sessões, memória e reinícios."""
+    return jsonify({
+        "iniciado": supervisor.iniciado,
+        "sob_demanda": config.SUPERVISOR_SOB_DEMANDA,
+        "layout": config.PORTAL_LAYOUT,
+        "apps": status_apps(),
+    })
+
 @atexit.register
 def proc_kill():
-    global services_started, running_processes
-
-    if services_started:
-        p: subprocess.Popen
-        for p in running_processes:
-            print(f"Killing process: {p.args}")
-            p.kill()
+    supervisor.parar_todos()
 
 if __name__ == "__main__":
     print("Servidor de Controle (versão final e headless) rodando em http://localhost:5000")
     print("Acesse seu index.html e clique no botão 'Iniciar Serviços'.")
-    app.run(port=5000)
\ No newline at end of file
+    app.run(port=5000, threaded=True)
\ No newline at end of file
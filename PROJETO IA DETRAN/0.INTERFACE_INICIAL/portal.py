@@ -0,0 +1,18 @@
+# portal.py
+# Todos os geradores de documentos em um único servidor Streamlit, como páginas.
+#
+#   python -m streamlit run portal.py --server.port 8500
+#
+# O controlador.py inicia este app quando PORTAL_LAYOUT=unico (em vez de um servidor
+# por gerador). Detalhes em comum/multipagina.py.
+import sys
+from pathlib import Path
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum.multipagina import executar_portal
+
+executar_portal()
@@ -0,0 +1,359 @@
+# supervisor.py
+# Supervisão dos apps Streamlit iniciados pelo controlador.py.
+#
+# Cada app vira um ServicoApp com um estado:
+#
+#   parado -> iniciando -> pronto
+#                 |          |
+#                 v          v
+#               falhou <-----+   (processo encerrou, não respondeu a tempo ou
+#                 |               deixou de responder ao /_stcore/health)
+#                 v
+#             aguardando -> iniciando ...   (nova tentativa com espera crescente)
+#
+# Uma thread de monitoramento consulta, a cada SUPERVISOR_INTERVALO segundos, o
+# endpoint /_stcore/health de todos os apps ao mesmo tempo e reinicia os que caíram.
+# A espera antes de cada nova tentativa dobra a cada falha seguida (até
+# SUPERVISOR_ESPERA_MAX) e volta ao início depois que o app fica estável.
+#
+# Modo sob demanda (SUPERVISOR_SOB_DEMANDA): nenhum app sobe com o portal; cada um é
+# iniciado no primeiro clique (iniciar(nome)) e encerrado depois de
+# SUPERVISOR_OCIOSO_MIN minutos sem nenhuma sessão aberta. As sessões vêm da métrica
+# active_sessions do Streamlit (/_stcore/metrics) ou, se ela não existir, das conexões
+# abertas na porta do app (psutil). Sem nenhuma das duas, o app não é encerrado.
+#
+# Funciona no Windows (sem janela de console) e no Linux/macOS (cada app em um grupo
+# de processos próprio). O uso de memória só é informado se o psutil estiver instalado.
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+
+try:
+    import psutil
+except ImportError:  # opcional: sem ele, o status sai sem o uso de memória
+    psutil = None
+
+PASTA_LOGS = Path(__file__).resolve().parent
+
+# Falhas seguidas do health check de um app pronto até ele ser reiniciado
+FALHAS_PARA_REINICIAR = 3
+
+
+class ServicoApp:
+    """Um app Streamlit supervisionado: processo, estado e contadores."""
+
+    def __init__(self, nome: str, caminho_app: Path, porta: str):
+        self.nome = nome
+        self.caminho_app = Path(caminho_app)
+        self.porta = str(porta)
+        self.estado = "parado"
+        self.processo: Optional[subprocess.Popen] = None
+        self.reinicios = 0
+        self.falhas_seguidas = 0   # tentativas de início que falharam em sequência
+        self.falhas_health = 0     # health checks sem resposta desde o último ok
+        self.ultimo_erro = ""
+        self.iniciado_em = 0.0
+        self.pronto_em = 0.0
+        self.proxima_tentativa = 0.0
+        self.ultimo_uso = 0.0      # última vez em que o app tinha sessão aberta (ou foi pedido)
+        self.sessoes: Optional[int] = None
+        self._log = None
+
+    @property
+    def url_health(self) -> str:
+        return f"http://127.0.0.1:{self.porta}/_stcore/health"
+
+    @property
+    def url_metricas(self) -> str:
+        return f"http://127.0.0.1:{self.porta}/_stcore/metrics?families=active_sessions"
+
+    @property
+    def rodando(self) -> bool:
+        return self.processo is not None and self.processo.poll() is None
+
+    def iniciar(self, python: str) -> None:
+        if not self.caminho_app.exists():
+            self.estado = "falhou"
+            self.ultimo_erro = f"Arquivo não encontrado: {self.caminho_app}"
+            print(f"!!! ERRO: O arquivo para '{self.nome}' não foi encontrado em: {self.caminho_app}")
+            return
+
+        comando = [
+            python,
+            "-m", "streamlit", "run",
+            str(self.caminho_app),
+            "--server.port", self.porta,
+            "--server.headless=true",
+        ]
+        # Windows: sem janela de console. Linux/macOS: grupo de processos próprio, para
+        # encerrar o app junto com os processos que ele abrir
+        if os.name == "nt":
+            opcoes = {"creationflags": subprocess.CREATE_NO_WINDOW}
+        else:
+            opcoes = {"start_new_session": True}
+
+        self._fechar_log()
+        self._log = open(PASTA_LOGS / f"{self.nome}_log.txt", "ab")
+        self._log.write(f"\n===== {time.strftime('%Y-%m-%d %H:%M:%S')} iniciando {self.nome} =====\n".encode("utf-8"))
+        self._log.flush()
+
+        print(f"Iniciando {self.nome} na porta {self.porta}...")
+        self.processo = subprocess.Popen(
+            comando,
+            stdout=self._log,
+            stderr=self._log,
+            cwd=self.caminho_app.parent,  # Diretório de trabalho: a pasta do app
+            **opcoes,
+        )
+        self.estado = "iniciando"
+        self.iniciado_em = time.time()
+        self.ultimo_uso = self.iniciado_em
+        self.falhas_health = 0
+        self.sessoes = None
+
+    def _sinalizar(self, forcar: bool) -> None:
+        if os.name == "nt":
+            self.processo.kill() if forcar else self.processo.terminate()
+            return
+        try:
+            os.killpg(self.processo.pid, signal.SIGKILL if forcar else signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def parar(self, tempo_limite: float = 5.0) -> None:
+        if self.rodando:
+            print(f"Encerrando {self.nome} (pid {self.processo.pid})...")
+            self._sinalizar(forcar=False)
+            try:
+                self.processo.wait(timeout=tempo_limite)
+            except subprocess.TimeoutExpired:
+                self._sinalizar(forcar=True)
+                self.processo.wait()
+        self._fechar_log()
+        self.estado = "parado"
+
+    def _fechar_log(self) -> None:
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def memoria_mb(self) -> Optional[float]:
+        """Memória (RSS) do app e dos processos filhos, em MB; None sem psutil."""
+        if psutil is None or not self.rodando:
+            return None
+        try:
+            processo = psutil.Process(self.processo.pid)
+            total = processo.memory_info().rss
+            for filho in processo.children(recursive=True):
+                total += filho.memory_info().rss
+            return round(total / (1024 * 1024), 1)
+        except psutil.Error:
+            return None
+
+    def conexoes_abertas(self) -> Optional[int]:
+        """Conexões TCP estabelecidas na porta do app (psutil); None se não for possível contar."""
+        if psutil is None or not self.rodando:
+            return None
+        try:
+            processo = psutil.Process(self.processo.pid)
+            listar = getattr(processo, "net_connections", None) or processo.connections
+            return sum(
+                1 for conexao in listar(kind="tcp")
+                if conexao.status == psutil.CONN_ESTABLISHED and conexao.laddr and str(conexao.laddr.port) == self.porta
+            )
+        except psutil.Error:
+            return None
+
+    def status(self) -> Dict[str, object]:
+        agora = time.time()
+        return {
+            "nome": self.nome,
+            "porta": self.porta,
+            "estado": self.estado,
+            "pid": self.processo.pid if self.rodando else None,
+            "sessoes": self.sessoes if self.estado == "pronto" else None,
+            "ocioso_ha_s": round(agora - self.ultimo_uso) if self.estado == "pronto" and self.sessoes == 0 else None,
+            "reinicios": self.reinicios,
+            "memoria_mb": self.memoria_mb(),
+            "ativo_ha_s": round(agora - self.pronto_em) if self.estado == "pronto" else None,
+            "proxima_tentativa_s": max(0, round(self.proxima_tentativa - agora)) if self.estado == "aguardando" else None,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+class Supervisor:
+    """Inicia os apps em paralelo, acompanha o /_stcore/health e reinicia os que caírem."""
+
+    def __init__(
+        self,
+        apps: List[Dict[str, object]],
+        python: str = sys.executable,
+        intervalo: float = config.SUPERVISOR_INTERVALO,
+        tempo_inicio: float = config.SUPERVISOR_TEMPO_INICIO,
+        espera_max: float = config.SUPERVISOR_ESPERA_MAX,
+        ocioso: float = config.SUPERVISOR_OCIOSO_MIN * 60,
+    ):
+        self.servicos = {
+            str(app["nome"]): ServicoApp(app["nome"], app["caminho_app"], app["porta"])
+            for app in apps
+        }
+        self.python = python
+        self.intervalo = intervalo
+        self.tempo_inicio = tempo_inicio
+        self.espera_max = espera_max
+        self.ocioso = ocioso  # segundos sem sessões até encerrar o app (0: nunca)
+
+        self._lock = threading.RLock()
+        self._parar = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+        self._sessao = requests.Session()
+        self._verificadores = ThreadPoolExecutor(max_workers=max(1, len(self.servicos)), thread_name_prefix="health")
+
+    @property
+    def iniciado(self) -> bool:
+        return self._monitor is not None
+
+    def _garantir_monitor(self) -> None:
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitorar, name="supervisor", daemon=True)
+            self._monitor.start()
+
+    def iniciar_todos(self) -> None:
+        with self._lock:
+            for servico in self.servicos.values():
+                if servico.estado == "parado":
+                    servico.iniciar(self.python)
+            self._garantir_monitor()
+
+    def iniciar(self, nome: str) -> Dict[str, object]:
+        """Inicia um app, se ainda não estiver rodando, e retorna o status dele. KeyError se não existir."""
+        with self._lock:
+            servico = self.servicos[nome]
+            servico.ultimo_uso = time.time()  # pedido agora: não conta como ocioso
+            if servico.estado in ("parado", "falhou"):
+                servico.iniciar(self.python)
+            elif servico.estado == "aguardando":
+                servico.proxima_tentativa = 0  # usuário esperando: tenta de novo no próximo ciclo
+            self._garantir_monitor()
+            return servico.status()
+
+    def parar_todos(self) -> None:
+        self._parar.set()
+        with self._lock:
+            for servico in self.servicos.values():
+                servico.parar()
+        self._verificadores.shutdown(wait=False)
+
+    def status(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [servico.status() for servico in self.servicos.values()]
+
+    # ---------------- Monitoramento ----------------
+
+    def _sessoes(self, servico: ServicoApp) -> Optional[int]:
+        """Sessões abertas no app: métrica active_sessions do Streamlit ou, sem ela, conexões na porta."""
+        try:
+            resposta = self._sessao.get(servico.url_metricas, timeout=min(2.0, self.intervalo))
+            if resposta.status_code == 200:
+                for linha in resposta.text.splitlines():
+                    if linha.startswith("active_sessions "):
+                        return int(float(linha.split()[1]))
+        except (requests.RequestException, ValueError):
+            pass
+        return servico.conexoes_abertas()
+
+    def _checar(self, servico: ServicoApp) -> Tuple[bool, Optional[int]]:
+        """(respondeu ao health check, sessões abertas); sessões só são contadas com o encerramento por ociosidade ligado."""
+        try:
+            resposta = self._sessao.get(servico.url_health, timeout=min(2.0, self.intervalo))
+            ok = resposta.status_code == 200
+        except requests.RequestException:
+            ok = False
+        sessoes = self._sessoes(servico) if ok and self.ocioso > 0 else None
+        return ok, sessoes
+
+    def _falhou(self, servico: ServicoApp, motivo: str) -> None:
+        """Encerra o app e agenda uma nova tentativa com espera crescente."""
+        servico.parar()
+        servico.falhas_seguidas += 1
+        espera = min(self.espera_max, 2 ** (servico.falhas_seguidas - 1))
+        servico.estado = "aguardando"
+        servico.ultimo_erro = motivo
+        servico.proxima_tentativa = time.time() + espera
+        print(f"!!! {servico.nome}: {motivo}. Nova tentativa em {espera:.0f}s.")
+
+    def _verificar(self) -> None:
+        with self._lock:
+            acompanhados = [s for s in self.servicos.values() if s.estado in ("iniciando", "pronto")]
+        respostas = dict(zip(
+            [s.nome for s in acompanhados],
+            self._verificadores.map(self._checar, acompanhados),
+        ))
+
+        agora = time.time()
+        with self._lock:
+            if self._parar.is_set():
+                return
+            for servico in self.servicos.values():
+                if servico.estado == "aguardando":
+                    if agora >= servico.proxima_tentativa:
+                        servico.reinicios += 1
+                        servico.iniciar(self.python)
+                    continue
+                if servico.nome not in respostas or servico.estado not in ("iniciando", "pronto"):
+                    continue
+
+                if not servico.rodando:
+                    codigo = servico.processo.returncode if servico.processo else None
+                    self._falhou(servico, f"processo encerrado (código {codigo})")
+                elif respostas[servico.nome][0]:
+                    if servico.estado == "iniciando":
+                        servico.estado = "pronto"
+                        servico.pronto_em = agora
+                        print(f"-> {servico.nome} pronto em {agora - servico.iniciado_em:.1f}s (porta {servico.porta}).")
+                    servico.falhas_health = 0
+                    # Estável por um tempo: a próxima falha volta à espera mínima
+                    if servico.falhas_seguidas and agora - servico.pronto_em > self.espera_max:
+                        servico.falhas_seguidas = 0
+                    self._atualizar_uso(servico, respostas[servico.nome][1], agora)
+                elif servico.estado == "iniciando":
+                    if agora - servico.iniciado_em > self.tempo_inicio:
+                        self._falhou(servico, f"não respondeu em {self.tempo_inicio:.0f}s")
+                else:
+                    servico.falhas_health += 1
+                    if servico.falhas_health >= FALHAS_PARA_REINICIAR:
+                        self._falhou(servico, "parou de responder ao health check")
+
+    def _atualizar_uso(self, servico: ServicoApp, sessoes: Optional[int], agora: float) -> None:
+        """Marca o uso do app e o encerra se ficou sem sessões por mais de `ocioso` segundos."""
+        servico.sessoes = sessoes
+        if sessoes is None or sessoes > 0:
+            # Sem como contar as sessões, o app é tratado como em uso
+            servico.ultimo_uso = agora
+            return
+        if self.ocioso > 0 and agora - servico.ultimo_uso > self.ocioso:
+            print(f"-> {servico.nome} sem uso há {(agora - servico.ultimo_uso) / 60:.0f} min; encerrando.")
+            servico.parar()
+            servico.ultimo_erro = ""
+
+    def _monitorar(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            try:
+                self._verificar()
+            except Exception as e:  # o monitor não pode morrer por um erro pontual
+                print(f"Erro no supervisor: {e}")
@@ -1,17 +1,27 @@
 import streamlit as st
-from gerar_dfd import gerar_dfd_completo
+from gerar_dfd import executar_job_dfd
+from gerar_ia_dfd import TITULOS_SECOES
+from siag_catalogo import normalizar
+from siag_busca import ErroBuscaSIAG, buscar_siag, buscar_siag_online, buscar_varios_siag, ler_lista_itens
 from datetime import datetime
 from PIL import Image
+import pandas as pd
 import os
+import sys
 import locale
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import time
+from pathlib import Path
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum.fila_jobs import obter_fila
+from comum.ui_jobs import lembrar_job, painel_job, usuario_atual
+
+# A geração do documento roda na fila (comum.fila_jobs), fora da execução do script
+fila = obter_fila()
+fila.registrar("dfd", executar_job_dfd)
 
 # ======== set locale e valores em PT BR ===========
 locale.setlocale(locale.LC_ALL, 'C') # Reset para um locale padrão antes de tentar pt_BR
@@ -64,7 +74,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ========== TÍTULO COM LOGO ==========
-logo_path = os.path.join("static", "logo_detran.png")
+logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "logo_detran.png")
 if os.path.exists(logo_path):
     logo = Image.open(logo_path)
     st.markdown('<div class="title-container">', unsafe_allow_html=True)
@@ -80,77 +90,15 @@ else:
 # ====== Função de busca no SIAG ==========
 
 @st.cache_data(show_spinner="Buscando produtos no SIAG...", ttl=3600) # Adicionado cache para evitar re-execuções desnecessárias
-def buscar_siag_selenium(termo_pesquisa):
-    url = "http://aquisicoes.gestao.mt.gov.br/sgc/faces/pub/sgc/central/ItemCompraPageList.jsp"
-    
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    # Para ambientes de deploy (Docker, Streamlit Cloud), pode ser necessário apontar para o Chromedriver ou edge
-    # chrome_options.binary_location = "/usr/bin/google-chrome" # Exemplo para Linux
-    
+def buscar_siag_remoto(termo_pesquisa):
+    # Consulta o SIAG por HTTP (ou pelo navegador, se o HTTP falhar) e guarda os
+    # resultados no espelho local: a próxima busca pelo termo não sai da máquina
     try:
-        driver = webdriver.Chrome(options=chrome_options)
-    except Exception as e:
-        st.error(f"Erro ao inicializar o navegador. Verifique se o Chromedriver está instalado e configurado corretamente. Erro: {e}")
+        return buscar_siag_online(termo_pesquisa)
+    except ErroBuscaSIAG as e:
+        st.error(str(e))
         return []
 
-    driver.get(url)
-
-    wait = WebDriverWait(driver, 30)
-    html = None
-
-    try:
-        opcao_radio = wait.until(EC.element_to_be_clickable(
-            (By.ID, "form_PesquisaItemPageList:procurarPorCombo:2")))
-        opcao_radio.click()
-
-        campo_busca = wait.until(EC.presence_of_element_located(
-            (By.ID, "form_PesquisaItemPageList:palavraChaveInput")))
-
-        campo_busca.clear()
-        campo_busca.send_keys(termo_pesquisa)
-
-        botao_pesquisar = wait.until(EC.element_to_be_clickable(
-            (By.ID, "form_PesquisaItemPageList:pesquisarButton")))
-
-        botao_pesquisar.click()
-
-        time.sleep(5) # Pausa para aguardar o carregamento da página. Pode precisar de ajuste.
-        html = driver.page_source
-
-    except TimeoutException:
-        st.error("Tempo limite excedido ao buscar no SIAG. A página demorou muito para carregar ou os elementos não foram encontrados.")
-        return []
-    except Exception as e:
-        st.error(f"Ocorreu um erro durante a busca no SIAG: {e}")
-        return []
-    finally:
-        driver.quit()
-
-    if html is None:
-        return []
-
-    soup = BeautifulSoup(html, 'html.parser')
-    tabela = soup.find('table', {'id': 'form_PesquisaItemPageList:editalDataTable'})
-
-    if not tabela:
-        return []
-
-    linhas = tabela.find_all('tr')[1:] # Ignora o cabeçalho
-    resultados = []
-
-    for linha in linhas:
-        colunas = linha.find_all('td')
-        if len(colunas) >= 2: # Garante que há colunas suficientes
-            codigo = colunas[0].get_text(strip=True)
-            descricao = colunas[1].get_text(strip=True)
-            if codigo: # Garante que o código não é vazio
-                resultados.append({'codigo': codigo, 'descricao': descricao})
-
-    return resultados
-
 # ====== ESTADO DA SESSÃO PARA PERSISTÊNCIA DE DADOS ==========
 # Inicializar st.session_state para persistir os dados
 if 'opcoes_itens_siag' not in st.session_state:
@@ -165,6 +113,10 @@ if 'unidade_item_adicionar' not in st.session_state:
     st.session_state.unidade_item_adicionar = "UN" # Unidade do item a ser adicionado
 if 'termo_pesquisa' not in st.session_state:
     st.session_state.termo_pesquisa = "" # Termo de pesquisa SIAG
+if 'candidatos_siag' not in st.session_state:
+    st.session_state.candidatos_siag = [] # Candidatos da busca de vários itens de uma vez
+if 'termos_sem_resultado' not in st.session_state:
+    st.session_state.termos_sem_resultado = [] # Termos da lista sem nenhum item no SIAG
 if 'lista_de_itens_dfd' not in st.session_state: # <<--- NOVA LISTA PARA ACUMULAR ITENS DO DFD
     st.session_state.lista_de_itens_dfd = []
 if 'finalidade_geral_dfd' not in st.session_state:
@@ -220,10 +172,11 @@ with st.form("form_adicionar_itens", clear_on_submit=False):
     with col2:
         st.markdown("<br>", unsafe_allow_html=True) 
         buscar_siag_button = st.form_submit_button("🔍 Buscar no SIAG", type="primary")
+    consultar_online = st.checkbox("Consultar direto no SIAG (mais lento; use se o item não aparecer na busca)", key="siag_online")
 
     if buscar_siag_button:
         if termo_pesquisa_input:
-            st.session_state.opcoes_itens_siag = buscar_siag_selenium(termo_pesquisa_input)
+            st.session_state.opcoes_itens_siag = buscar_siag(termo_pesquisa_input, online=consultar_online, consultar_online=buscar_siag_remoto)
             st.session_state.termo_pesquisa = termo_pesquisa_input 
 
             if not st.session_state.opcoes_itens_siag:
@@ -322,6 +275,99 @@ with st.form("form_adicionar_itens", clear_on_submit=False):
             st.error("Por favor, preencha todos os campos do item (Produto selecionado do SIAG, Quantidade, Unidade e Finalidade específica) para adicionar.")
 
 
+# ====================================================================
+# BUSCA DE VÁRIOS ITENS DE UMA VEZ
+# ====================================================================
+UNIDADES = ["UN", "KG", "L", "CX", "M", "M2", "M3", "OUTRO"]
+
+with st.expander("📋 Adicionar vários itens de uma vez"):
+    with st.form("form_varios_itens"):
+        texto_lista_itens = st.text_area(
+            "Cole a lista de itens, um por linha: nome do produto ou código do SIAG e, se quiser, quantidade e unidade separadas por ';' (ex: caneta esferográfica azul; 50; UN). Também aceita colunas copiadas do Excel.",
+            key="lista_itens_siag_input",
+            height=150
+        )
+        buscar_lista_button = st.form_submit_button("🔍 Buscar todos no SIAG", type="primary")
+
+    if buscar_lista_button:
+        linhas_lista = ler_lista_itens(texto_lista_itens)
+        if not linhas_lista:
+            st.warning("Por favor, cole ao menos um item para buscar no SIAG.")
+        else:
+            with st.spinner(f"Buscando {len(linhas_lista)} itens no SIAG..."):
+                resultados_lista = buscar_varios_siag([linha["termo"] for linha in linhas_lista], online=consultar_online)
+
+            candidatos = []
+            sem_resultado = []
+            for numero, linha in enumerate(linhas_lista, start=1):
+                resultado = resultados_lista[normalizar(linha["termo"])]
+                if not resultado["itens"]:
+                    sem_resultado.append(f"{linha['termo']} ({resultado['erro']})" if resultado["erro"] else linha["termo"])
+                for posicao, produto in enumerate(resultado["itens"]):
+                    candidatos.append({
+                        "adicionar": posicao == 0, # Marca o melhor candidato de cada linha
+                        "linha": numero,
+                        "termo": linha["termo"],
+                        "catmat": produto["codigo"],
+                        "descricao": produto["descricao"].upper(),
+                        "qtd": linha["qtd"],
+                        "unidade": linha["unidade"] if linha["unidade"] in UNIDADES else "UN",
+                        "finalidade_especifica": "",
+                    })
+            st.session_state.candidatos_siag = candidatos
+            st.session_state.termos_sem_resultado = sem_resultado
+
+    if st.session_state.termos_sem_resultado:
+        st.error("❌ Nenhum produto encontrado no SIAG para: " + "; ".join(st.session_state.termos_sem_resultado))
+
+    if st.session_state.candidatos_siag:
+        st.caption("Marque em \"Adicionar\" o produto correto de cada linha e complete quantidade, unidade e finalidade.")
+        candidatos_editados = st.data_editor(
+            pd.DataFrame(st.session_state.candidatos_siag),
+            hide_index=True,
+            use_container_width=True,
+            key="editor_candidatos_siag",
+            disabled=["linha", "termo", "catmat", "descricao"],
+            column_config={
+                "adicionar": st.column_config.CheckboxColumn("Adicionar", width="small"),
+                "linha": st.column_config.NumberColumn("Linha", width="small"),
+                "termo": st.column_config.Column("Termo buscado", width="small"),
+                "catmat": st.column_config.Column("Código SIAG", width="small"),
+                "descricao": st.column_config.Column("Descrição do Item", width="large"),
+                "qtd": st.column_config.TextColumn("Quantidade", width="small"),
+                "unidade": st.column_config.SelectboxColumn("Unidade", options=UNIDADES, width="small"),
+                "finalidade_especifica": st.column_config.TextColumn("Finalidade Específica (deste item)", width="medium"),
+            }
+        )
+        finalidade_comum = st.text_input(
+            "Finalidade específica para os itens marcados que ficaram sem finalidade na tabela",
+            key="finalidade_comum_varios_itens"
+        )
+
+        if st.button("➕ Adicionar Itens Marcados ao DFD", key="adicionar_varios_itens_button"):
+            marcados = candidatos_editados[candidatos_editados["adicionar"]].to_dict("records")
+            for candidato in marcados:
+                candidato["finalidade_especifica"] = (candidato["finalidade_especifica"] or "").strip() or finalidade_comum.strip()
+            incompletos = [str(c["linha"]) for c in marcados if not (str(c["qtd"] or "").strip() and c["finalidade_especifica"])]
+
+            if not marcados:
+                st.warning("Nenhum item marcado para adicionar.")
+            elif incompletos:
+                st.error(f"Preencha a quantidade e a finalidade específica dos itens marcados das linhas: {', '.join(incompletos)}.")
+            else:
+                for candidato in marcados:
+                    st.session_state.lista_de_itens_dfd.append({
+                        "item": str(len(st.session_state.lista_de_itens_dfd) + 1).zfill(3),
+                        "catmat": candidato["catmat"],
+                        "unidade": candidato["unidade"] or "UN",
+                        "qtd": str(candidato["qtd"]).strip(),
+                        "descricao": candidato["descricao"],
+                        "finalidade_especifica": candidato["finalidade_especifica"],
+                    })
+                st.session_state.candidatos_siag = []
+                st.session_state.termos_sem_resultado = []
+                st.rerun()
+
 
 st.subheader("2. Itens Adicionados ao Documento")
 if st.session_state.lista_de_itens_dfd:
@@ -501,6 +547,12 @@ with st.form("form_gerar_dfd"):
     # --- FIM DOS NOVOS CAMPOS ---
 
 
+    regenerar_ia = st.checkbox(
+        "🔄 Regenerar textos da IA (ignorar respostas já geradas)",
+        value=False,
+        help="Por padrão, textos já gerados para as mesmas informações são reaproveitados do cache."
+    )
+
     # O botão de gerar documento só é habilitado se houver itens adicionados e a finalidade geral preenchida
     gerar_dfd_button = st.form_submit_button(
         "📥 Gerar Documento DFD Completo",
@@ -517,7 +569,7 @@ if gerar_dfd_button:
         st.error("❌ Por favor, preencha a 'Finalidade GERAL da demanda'. Este campo é crucial para a IA.")
         st.stop()
 
-    with st.spinner("Gerando documento com apoio da IA..."):
+    with st.spinner("Enviando para a fila de geração..."):
         # Prepara os dados gerais do DFD
         dados_gerais = {
             "finalidade": st.session_state.finalidade_geral_dfd, # Agora é a finalidade geral
@@ -554,26 +606,31 @@ if gerar_dfd_button:
         # Adicionei uma verificação para garantir que lista_de_itens_dfd não está vazia
         nome_base_arquivo = st.session_state.lista_de_itens_dfd[0]['descricao'] if st.session_state.lista_de_itens_dfd else "Documento_DFD"
 
-        try:
-            # -------------------------------------------------------------
-            # CORREÇÃO: Passando a lista de itens para a função gerar_dfd_completo
-            # Note que a sua implementação já estava correta.
-            # -------------------------------------------------------------
-            caminho_arquivo = gerar_dfd_completo(dados_gerais, st.session_state.lista_de_itens_dfd)
-
-            with open(caminho_arquivo, "rb") as f:
-                st.success("✅ Documento gerado com sucesso!")
-                st.download_button(
-                    "📥 Baixar Documento DFD",
-                    f,
-                    file_name=os.path.basename(caminho_arquivo),
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-            # Opcional: Limpar a lista após a geração para um novo DFD
-            # st.session_state.lista_de_itens_dfd = [] 
-            # st.session_state.finalidade_geral_dfd = ""
-            # st.rerun() # Se for limpar, também deve reran aqui
-
-        except Exception as e:
-            st.error(f"❌ Erro ao gerar o documento DFD. Por favor, tente novamente. Detalhes: {e}")
-            st.exception(e) # Exibe o traceback para depuração
\ No newline at end of file
+        # O documento é gerado em segundo plano; os textos da IA aparecem no painel
+        # abaixo conforme ficam prontos, mesmo que a página seja recarregada.
+        job_id = fila.enviar("dfd", {
+            "dados_gerais": dados_gerais,
+            "lista_itens": st.session_state.lista_de_itens_dfd,
+            "usar_cache": not regenerar_ia,
+        }, usuario=usuario_atual())
+        lembrar_job("dfd", job_id)
+        # Opcional: Limpar a lista após a geração para um novo DFD
+        # st.session_state.lista_de_itens_dfd = [] 
+        # st.session_state.finalidade_geral_dfd = ""
+        # st.rerun() # Se for limpar, também deve reran aqui
+
+def mostrar_download(resultado):
+    caminho_arquivo = resultado.get("docx")
+    if caminho_arquivo and os.path.exists(caminho_arquivo):
+        with open(caminho_arquivo, "rb") as f:
+            st.success("✅ Documento gerado com sucesso!")
+            st.download_button(
+                "📥 Baixar Documento DFD",
+                f,
+                file_name=os.path.basename(caminho_arquivo),
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
+    else:
+        st.error("❌ O arquivo do DFD não foi encontrado.")
+
+painel_job(fila, "dfd", titulos=TITULOS_SECOES, ao_concluir=mostrar_download)
\ No newline at end of file
@@ -1,10 +1,12 @@
 # gerar_dfd.py
-from docxtpl import DocxTemplate
 from datetime import datetime
-from gerar_ia import gerar_texto_ia
+from gerar_ia_dfd import gerar_textos_ia, gerar_textos_ia_stream, TITULOS_SECOES
+from comum.catalogo import registrar_documento
+from comum.templates_docx import obter_template
 import locale
 import os
 import re
+import uuid
 import json  # <-- ADICIONADO: Import para manipulação de JSON
 from pathlib import Path  # <-- ADICIONADO: Import para manipulação de caminhos
 
@@ -41,9 +43,20 @@ def gerar_opcoes_marcadas(opcao_escolhida, opcoes_dict):
 
     return "\n".join(linhas)
 
-def gerar_dfd_completo(dados_formulario, lista_itens):
+# Seções do DFD preenchidas com textos da IA (ou texto fixo)
+SECOES_IA = ["justificativa", "descricao", "objetivo", "planejamento", "equipe"]
+
+def gerar_dfd_completo(dados_formulario, lista_itens, usar_cache=True, textos_ia=None, pasta_saida=None):
+    """
+    Gera o DFD (.docx) e o .json com o contexto usado.
+
+    Se `textos_ia` ({tipo: texto}) for informado, por exemplo com os textos já
+    exibidos em streaming na interface, o modelo não é chamado de novo.
+    Os arquivos vão para static/arquivos_gerados, ou para `pasta_saida` se informada.
+    """
     template_path = os.path.join(os.path.dirname(__file__), "templates", "modelo_dfd.docx")
-    doc = DocxTemplate(template_path)
+    # Template carregado uma vez por processo (comum.templates_docx); cada documento recebe uma cópia
+    doc = obter_template(template_path)
 
     # Dicionário de contexto para o template, incluindo todos os dados do formulário
     contexto = dados_formulario.copy()
@@ -53,19 +66,24 @@ def gerar_dfd_completo(dados_formulario, lista_itens):
     # Frase a ser removida do texto gerado pela IA
     frase_a_remover = "Aqui está uma justificativa objetiva, convincente e sucinta para a demanda de aquisição/contratação:"
 
-    # Geração dos textos com a IA. Note que `lista_itens` foi adicionado como segundo argumento.
-    justificativa_ia = gerar_texto_ia(dados_formulario, lista_itens, "justificativa")
+    # Geração dos textos com a IA. O contexto dos itens é montado uma vez só e as
+    # seções são pedidas ao modelo em paralelo.
+    if textos_ia is None:
+        textos_ia = gerar_textos_ia(
+            dados_formulario, lista_itens, SECOES_IA,
+            usar_cache=usar_cache
+        )
+
+    justificativa_ia = textos_ia.get("justificativa")
     if justificativa_ia:
         justificativa_limpa = justificativa_ia.replace(frase_a_remover, "").strip()
         contexto["justificativa"] = justificativa_limpa
     else:
         contexto["justificativa"] = dados_formulario.get("justificativa", "")
 
-    # As outras chamadas para a IA também foram corrigidas
-    contexto["descricao"] = gerar_texto_ia(dados_formulario, lista_itens, "descricao") or dados_formulario.get("descricao")
-    contexto["objetivo"] = gerar_texto_ia(dados_formulario, lista_itens, "objetivo") or dados_formulario.get("objetivo")
-    contexto["planejamento"] = gerar_texto_ia(dados_formulario, lista_itens, "planejamento") or dados_formulario.get("planejamento")
-    contexto["equipe"] = gerar_texto_ia(dados_formulario, lista_itens, "equipe") or dados_formulario.get("equipe")
+    # As outras seções seguem o mesmo padrão, com o valor do formulário como reserva
+    for tipo in ("descricao", "objetivo", "planejamento", "equipe"):
+        contexto[tipo] = textos_ia.get(tipo) or dados_formulario.get(tipo)
     
     # --- FIM DA CORREÇÃO ---
 
@@ -128,7 +146,7 @@ def gerar_dfd_completo(dados_formulario, lista_itens):
     # Renderiza o documento com o contexto completo
     doc.render(contexto)
     
-    output_dir = os.path.join(os.path.dirname(__file__), "static", "arquivos_gerados")
+    output_dir = pasta_saida or os.path.join(os.path.dirname(__file__), "static", "arquivos_gerados")
     os.makedirs(output_dir, exist_ok=True)
     
     item_para_nome = "documento"
@@ -136,9 +154,10 @@ def gerar_dfd_completo(dados_formulario, lista_itens):
         item_para_nome = lista_itens[0].get("descricao", "documento")
     
     nome_sanitizado = sanitize_filename(item_para_nome)
-    nome_arquivo_base = f"DFD_{nome_sanitizado}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    if len(nome_arquivo_base) > 100:
-        nome_arquivo_base = nome_arquivo_base[:100]
+    # O nome do item é que é encurtado, para não cortar a data nem o sufixo aleatório, que
+    # evita que jobs da fila (comum.fila_jobs) terminados no mesmo segundo sobrescrevam os arquivos
+    sufixo = f"_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    nome_arquivo_base = f"DFD_{nome_sanitizado}"[:100 - len(sufixo)] + sufixo
     
     # Salva o arquivo .docx
     nome_arquivo_docx = os.path.join(output_dir, f"{nome_arquivo_base}.docx")
@@ -153,4 +172,40 @@ def gerar_dfd_completo(dados_formulario, lista_itens):
         json.dump(contexto, f, indent=4, sort_keys=True, ensure_ascii=False)
     # --- FIM DA INTEGRAÇÃO ---
 
-    return nome_arquivo_docx
\ No newline at end of file
+    # Registra no catálogo para os outros apps (ISFD, GT, ETP) encontrarem o DFD sem varrer a pasta
+    registrar_documento("dfd", nome_arquivo_docx, contexto, json_path)
+
+    return nome_arquivo_docx
+
+
+def executar_job_dfd(parametros, job):
+    """
+    Executa um job "dfd" da fila de geração (comum.fila_jobs).
+
+    Os textos da IA são publicados como resultado parcial à medida que chegam, para
+    a interface exibi-los durante a geração.
+
+    Parâmetros do job: dados_gerais, lista_itens e usar_cache.
+    """
+    dados_gerais = parametros["dados_gerais"]
+    lista_itens = parametros["lista_itens"]
+    fluxos = gerar_textos_ia_stream(
+        dados_gerais, lista_itens, SECOES_IA,
+        usar_cache=parametros.get("usar_cache", True), cancelar=job.evento_cancelar
+    )
+
+    textos_ia = {}
+    total = len(fluxos) + 1
+    job.progresso(0.0, "Gerando textos com IA...")
+    for i, (tipo, fluxo) in enumerate(fluxos.items()):
+        partes = []
+        for fragmento in fluxo:
+            partes.append(fragmento)
+            job.parcial({**textos_ia, tipo: "".join(partes)})
+        textos_ia[tipo] = "".join(partes).strip()
+        job.parcial(textos_ia, forcar=True)
+        job.progresso((i + 1) / total, f"{TITULOS_SECOES.get(tipo, tipo.capitalize())}: concluído")
+
+    job.progresso((total - 1) / total, "Montando o documento DFD...")
+    caminho_docx = gerar_dfd_completo(dados_gerais, lista_itens, textos_ia=textos_ia)
+    return {"docx": caminho_docx}
\ No newline at end of file
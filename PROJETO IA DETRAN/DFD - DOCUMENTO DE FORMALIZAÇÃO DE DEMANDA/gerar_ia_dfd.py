@@ -0,0 +1,461 @@
+# gerar_ia_dfd.py
+import json
+import sys
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+from comum.cliente_ia import estimar_tokens, gerar, gerar_stream, opcoes_modelo, transmitir_em_paralelo
+from comum.instrumentacao import medir, no_contexto_atual
+
+# Modelo e opções vêm da configuração compartilhada (comum.config)
+MODELO = config.IA_MODELO
+OPCOES_MODELO = opcoes_modelo(max_tokens=150)
+
+# Quantidade máxima de prompts enviados ao mesmo tempo para o Ollama.
+# Deve acompanhar o número de slots paralelos do servidor (OLLAMA_NUM_PARALLEL).
+MAX_REQUISICOES_PARALELAS = config.IA_NUM_PARALLEL
+
+# Tempo que o Ollama mantém o modelo carregado após a última requisição.
+# Evita que os pesos (e o cache de prompt de cada slot) sejam descartados entre uma
+# geração e outra.
+KEEP_ALIVE = config.IA_KEEP_ALIVE
+
+# Tamanho máximo (em tokens estimados) da lista de itens no contexto dos prompts.
+# DFDs maiores têm os itens resumidos, para que o tempo de avaliação do prompt não
+# cresça com o número de itens (e o prompt não passe do contexto do modelo).
+ORCAMENTO_ITENS = config.IA_ORCAMENTO_ITENS
+MAX_CARACTERES_RESUMO = 120   # descrições e finalidades encurtadas nos itens resumidos
+EXEMPLOS_POR_GRUPO = 2        # descrições de exemplo em cada grupo de itens semelhantes
+FINALIDADES_POR_GRUPO = 3
+
+# "secoes": um prompt por seção; "json": todas as seções em uma única chamada, com a
+# resposta restrita a um JSON Schema (campo "format" do Ollama). O contexto da demanda
+# é avaliado uma vez só, e as seções que faltarem na resposta voltam ao modo "secoes".
+MODO = config.IA_DFD_MODO
+
+# Instruções específicas de cada seção do DFD. O contexto da demanda (finalidade + itens)
+# vai sempre ANTES da instrução, para que o prefixo seja idêntico em todos os prompts.
+# O cache de prompt do Ollama é de cada slot: um prompt reaproveita a avaliação do
+# prefixo só quando cai em um slot que já o avaliou (ex.: ao gerar de novo uma seção).
+# Prompts enviados ao mesmo tempo vão para slots diferentes e cada um avalia a lista de
+# itens; para avaliá-la uma vez só, use o MODO "json".
+INSTRUCOES = {
+    "descricao": (
+        "Atue como um redator técnico especializado em documentos de contratação pública. "
+        "Escreva uma descrição curta, clara e precisa sobre a demanda de aquisição/contratação "
+        "descrita acima. "
+        "Destaque a relevância da demanda para as operações do órgão. "
+        "Use linguagem formal, objetiva e sem redundâncias. "
+        "Limite a resposta a até 3 frases curtas."
+        "Me retorne o texto sem nenhuma mensagem introdutória."
+    ),
+    "justificativa": (
+        "Você é um analista de compras responsável por redigir justificativas em documentos DFD. "
+        "Redija uma justificativa objetiva, convincente e sucinta "
+        "para a demanda de aquisição/contratação descrita acima. "
+        "Foque na necessidade institucional, custo-benefício e benefícios diretos para o DETRAN-MT. "
+        "Considere que a demanda pode envolver múltiplos itens ou serviços. "
+        "Resuma em até 4-5 frases claras, se necessário."
+        "Me retorne o texto sem nenhuma mensagem introdutória."
+    ),
+    "objetivo": (
+        "Redija de forma clara, concisa e institucional "
+        "o objetivo da demanda de aquisição/contratação descrita acima. "
+        "Explique como essa aquisição atende a missão e as metas do DETRAN-MT. "
+        "Evite termos vagos e prolongamentos desnecessários. "
+        "Limite a resposta a 2 ou 3 frases diretas."
+        "Me retorne o texto sem nenhuma mensagem introdutória."
+    ),
+    "planejamento": (
+        "Explique em 2 ou 3 frases objetivas como a demanda de aquisição/contratação descrita acima "
+        "está alinhada ao planejamento estratégico do DETRAN-MT. "
+        "Relacione a demanda a metas institucionais, melhoria de processos "
+        "ou eficiência administrativa. Use linguagem técnica, impessoal e sucinta. "
+        "Se o planejamento mais recente não for específico, mencione a busca por 'racionalização de recursos', 'otimização de serviços' ou 'modernização da infraestrutura'."
+        "Me retorne o texto sem nenhuma mensagem introdutória."
+    ),
+}
+
+# Seções com texto fixo, que não passam pelo modelo
+TEXTOS_FIXOS = {
+    "equipe": "NÃO SE APLICA.",
+}
+
+# Títulos exibidos na interface enquanto cada seção é gerada
+TITULOS_SECOES = {
+    "justificativa": "Justificativa para aquisição",
+    "descricao": "Descrição da demanda",
+    "objetivo": "Objetivo da contratação",
+    "planejamento": "Alinhamento ao planejamento estratégico",
+}
+
+
+# ---------------- Lista de itens nos prompts ----------------
+
+_PALAVRAS_VAZIAS = {"de", "da", "do", "das", "dos", "para", "com", "sem", "em", "e", "a", "o", "as", "os", "tipo"}
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.lower().split())
+
+
+def _encurtar(texto):
+    texto = " ".join(str(texto or "").split())
+    if len(texto) <= MAX_CARACTERES_RESUMO:
+        return texto
+    return texto[:MAX_CARACTERES_RESUMO - 3].rstrip() + "..."
+
+
+def _palavras_principais(descricao):
+    """Duas primeiras palavras significativas da descrição ("CABO HDMI 2M" e "CABO HDMI 5M" -> CABO HDMI)."""
+    palavras = [
+        palavra for palavra in str(descricao or "").replace("-", " ").replace(",", " ").split()
+        if _normalizar(palavra) not in _PALAVRAS_VAZIAS and not any(c.isdigit() for c in palavra)
+    ]
+    return palavras[:2] or str(descricao or "").split()[:2]
+
+
+def _chave_semelhanca(descricao):
+    return _normalizar(" ".join(_palavras_principais(descricao)))
+
+
+def _somar_quantidades(itens):
+    """Soma das quantidades ("1.000" = mil); se alguma não for número, lista as quantidades."""
+    total = 0.0
+    for item in itens:
+        try:
+            total += float(str(item.get('qtd', '')).strip().replace('.', '').replace(',', '.'))
+        except ValueError:
+            return ", ".join(str(item.get('qtd', '')) for item in itens)
+    return str(int(total)) if total.is_integer() else str(total).replace('.', ',')
+
+
+def _finalidades(itens):
+    unicas = list(dict.fromkeys(_encurtar(item.get('finalidade_especifica')) for item in itens if item.get('finalidade_especifica')))
+    texto = "; ".join(unicas[:FINALIDADES_POR_GRUPO])
+    if len(unicas) > FINALIDADES_POR_GRUPO:
+        texto += f" (e outras {len(unicas) - FINALIDADES_POR_GRUPO})"
+    return texto
+
+
+def _item_detalhado(item):
+    return f"- Descrição: {item['descricao']}\n  Quantidade: {item['qtd']}\n  Finalidade Específica: {item['finalidade_especifica']}"
+
+
+def _item_repetido(itens, encurtar):
+    descricao = itens[0].get('descricao', '')
+    if len(itens) == 1:
+        item = itens[0]
+        if not encurtar:
+            return _item_detalhado(item)
+        return f"- Descrição: {_encurtar(descricao)}\n  Quantidade: {item.get('qtd', '')}\n  Finalidade Específica: {_encurtar(item.get('finalidade_especifica'))}"
+    return (
+        f"- Descrição: {_encurtar(descricao) if encurtar else descricao} ({len(itens)} itens iguais)\n"
+        f"  Quantidade: {_somar_quantidades(itens)}\n  Finalidade Específica: {_finalidades(itens)}"
+    )
+
+
+def _rotulo(itens):
+    return " ".join(_palavras_principais(itens[0].get('descricao'))).upper()
+
+
+def _grupo_semelhantes(itens):
+    if len(itens) == 1:
+        return _item_repetido(itens, encurtar=True)
+    descricoes = list(dict.fromkeys(_encurtar(item.get('descricao')) for item in itens))
+    exemplos = "; ".join(descricoes[:EXEMPLOS_POR_GRUPO])
+    return (
+        f"- {len(itens)} itens do tipo '{_rotulo(itens)}' (ex.: {exemplos})\n"
+        f"  Quantidade total: {_somar_quantidades(itens)}\n  Finalidades: {_finalidades(itens)}"
+    )
+
+
+def _linha_fora(grupos):
+    """Linha que resume os grupos de itens que ficaram de fora do texto."""
+    itens_fora = sum(len(itens) for itens in grupos)
+    if itens_fora == 1:
+        return f"- Outro item, não detalhado: {_encurtar(grupos[0][0].get('descricao'))}."
+    exemplos = ", ".join(_rotulo(itens) for itens in grupos[:5])
+    return f"- Outros {itens_fora} itens, não detalhados (entre eles: {exemplos})."
+
+
+def _agrupar(lista_itens, chave):
+    grupos = {}
+    for item in lista_itens:
+        grupos.setdefault(chave(item), []).append(item)
+    return grupos
+
+
+def _resumir_itens(lista_itens, orcamento):
+    """
+    Texto da lista de itens que cabe em `orcamento` tokens (estimados), do mais ao menos detalhado:
+
+      1. cada item como no formulário (DFDs pequenos: o prompt é o mesmo de sempre);
+      2. itens iguais (mesma descrição) em uma linha, com a quantidade somada;
+      3. itens semelhantes (mesmas duas primeiras palavras da descrição) em grupos,
+         com exemplos, quantidade total e finalidades, e textos longos encurtados;
+      4. os maiores grupos do passo 3 até o orçamento, e uma linha com o que ficou de fora.
+
+    Retorna (texto, nível usado, tokens estimados).
+    """
+    linhas = [_item_detalhado(item) for item in lista_itens]
+    tokens = sum(estimar_tokens(linha) for linha in linhas)
+    if tokens <= orcamento:
+        return "\n".join(linhas), 1, tokens
+
+    iguais = _agrupar(lista_itens, lambda item: _normalizar(item.get('descricao')))
+    if len(iguais) < len(lista_itens):
+        linhas = [_item_repetido(itens, encurtar=False) for itens in iguais.values()]
+        tokens = sum(estimar_tokens(linha) for linha in linhas)
+        if tokens <= orcamento:
+            return "\n".join(linhas), 2, tokens
+
+    semelhantes = _agrupar(lista_itens, lambda item: _chave_semelhanca(item.get('descricao')))
+    linhas = [(itens, _grupo_semelhantes(itens)) for itens in semelhantes.values()]
+    custos = [estimar_tokens(linha) for _, linha in linhas]
+    tokens = sum(custos)
+    if tokens <= orcamento:
+        return "\n".join(linha for _, linha in linhas), 3, tokens
+
+    # Os grupos com mais itens primeiro, até o orçamento; a ordem original é mantida no texto
+    incluidos, tokens = [], 0
+    for indice in sorted(range(len(linhas)), key=lambda i: -len(linhas[i][0])):
+        if tokens + custos[indice] <= orcamento:
+            incluidos.append(indice)
+            tokens += custos[indice]
+
+    def linha_fora():
+        dentro = set(incluidos)
+        return _linha_fora([itens for indice, (itens, _) in enumerate(linhas) if indice not in dentro])
+
+    # A linha do que ficou de fora também conta no orçamento: saem os menores grupos até ela caber
+    fora = linha_fora()
+    while incluidos and tokens + estimar_tokens(fora) > orcamento:
+        tokens -= custos[incluidos.pop()]
+        fora = linha_fora()
+    dentro = set(incluidos)
+    texto = [linha for indice, (_, linha) in enumerate(linhas) if indice in dentro]
+    texto.append(fora)
+    return "\n".join(texto), 4, tokens + estimar_tokens(fora)
+
+
+def montar_contexto_demanda(dados, lista_itens, orcamento_itens=None):
+    """
+    Monta o bloco comum a todos os prompts do DFD (finalidade geral + itens detalhados).
+    Deve ser construído uma única vez por documento e reutilizado em todas as seções.
+
+    A lista de itens ocupa no máximo `orcamento_itens` tokens estimados (padrão:
+    ORCAMENTO_ITENS); listas maiores são resumidas (ver _resumir_itens).
+    """
+    finalidade_geral = dados.get('finalidade', '')
+    orcamento = ORCAMENTO_ITENS if orcamento_itens is None else orcamento_itens
+
+    with medir("dfd.contexto_ia", itens=len(lista_itens)) as span:
+        itens_formatados, nivel, tokens = _resumir_itens(lista_itens, orcamento)
+        span.definir(nivel=nivel, tokens_itens=tokens)
+
+    titulo_itens = "Itens detalhados" if nivel == 1 else f"Itens (resumo de {len(lista_itens)} itens)"
+    return (
+        f"Contexto de uma demanda de aquisição/contratação do DETRAN-MT.\n"
+        f"Finalidade geral: '{finalidade_geral}'.\n"
+        f"{titulo_itens}:\n{itens_formatados}\n\n"
+    )
+
+
+def _chamar_ollama(prompt, usar_cache=True):
+    return gerar(prompt, MODELO, OPCOES_MODELO, keep_alive=KEEP_ALIVE, usar_cache=usar_cache)
+
+
+def _gerar_secao(contexto_demanda, tipo, usar_cache=True):
+    if tipo in TEXTOS_FIXOS:
+        return TEXTOS_FIXOS[tipo]
+    if tipo not in INSTRUCOES:
+        return "[CAMPO INDEFINIDO]"
+    return _chamar_ollama(contexto_demanda + INSTRUCOES[tipo], usar_cache)
+
+
+def _gerar_secao_stream(contexto_demanda, tipo, usar_cache=True, cancelar=None):
+    if tipo in TEXTOS_FIXOS:
+        return iter([TEXTOS_FIXOS[tipo]])
+    if tipo not in INSTRUCOES:
+        return iter(["[CAMPO INDEFINIDO]"])
+    return gerar_stream(
+        contexto_demanda + INSTRUCOES[tipo], MODELO, OPCOES_MODELO,
+        keep_alive=KEEP_ALIVE, usar_cache=usar_cache, cancelar=cancelar
+    )
+
+
+# ---------------- Todas as seções em uma chamada (MODO "json") ----------------
+
+def _esquema(tipos):
+    """JSON Schema da resposta: um texto por seção."""
+    return {
+        "type": "object",
+        "properties": {tipo: {"type": "string"} for tipo in tipos},
+        "required": list(tipos),
+    }
+
+
+def _instrucao_json(tipos):
+    secoes = "\n".join(f'- "{tipo}": {INSTRUCOES[tipo]}' for tipo in tipos)
+    return (
+        "Redija as seções a seguir do DFD para a demanda de aquisição/contratação descrita acima. "
+        "Responda somente com um objeto JSON, com uma chave por seção e o texto da seção como valor, "
+        "sem nenhuma mensagem introdutória.\n"
+        f"{secoes}\n"
+    )
+
+
+def _ler_secoes(texto, tipos):
+    """
+    Textos das seções na resposta em JSON. Seções ausentes, vazias ou que não são
+    texto ficam de fora; resposta inválida (ou mensagem de erro) devolve {}.
+    """
+    inicio, fim = texto.find("{"), texto.rfind("}")
+    if inicio < 0 or fim < inicio:
+        return {}
+    try:
+        resposta = json.loads(texto[inicio:fim + 1])
+    except ValueError:
+        return {}
+    if not isinstance(resposta, dict):
+        return {}
+    return {
+        tipo: resposta[tipo].strip()
+        for tipo in tipos
+        if isinstance(resposta.get(tipo), str) and resposta[tipo].strip()
+    }
+
+
+def _resposta_completa(texto, tipos):
+    return len(_ler_secoes(texto, tipos)) == len(tipos)
+
+
+def _gerar_secoes_json(contexto_demanda, tipos, usar_cache=True, cancelar=None):
+    """
+    Gera as seções `tipos` em uma única chamada ao modelo.
+
+    Retorna {tipo: texto} apenas com as seções válidas; quem chama gera as que faltarem
+    uma a uma. Com `cancelar`, a resposta vem em streaming e pode ser interrompida.
+    Só respostas com todas as seções válidas entram no cache: uma resposta incompleta
+    é pedida de novo na próxima geração, em vez de mandar sempre ao modo "secoes".
+    """
+    prompt = contexto_demanda + _instrucao_json(tipos)
+    opcoes = opcoes_modelo(max_tokens=OPCOES_MODELO["max_tokens"] * len(tipos))
+    formato = _esquema(tipos)
+    completa = partial(_resposta_completa, tipos=tipos)
+    with medir("dfd.secoes_json", secoes=len(tipos)) as span:
+        if cancelar is None:
+            texto = gerar(
+                prompt, MODELO, opcoes, keep_alive=KEEP_ALIVE, usar_cache=usar_cache, formato=formato, validar=completa
+            )
+        else:
+            texto = "".join(gerar_stream(
+                prompt, MODELO, opcoes, keep_alive=KEEP_ALIVE, usar_cache=usar_cache, cancelar=cancelar,
+                formato=formato, validar=completa,
+            ))
+            if cancelar.is_set():
+                span.definir(cancelado=True)
+                return {}
+        secoes = _ler_secoes(texto, tipos)
+        span.definir(validas=len(secoes), refeitas=len(tipos) - len(secoes))
+    if len(secoes) < len(tipos):
+        print(f"Resposta em JSON do DFD incompleta ({len(secoes)} de {len(tipos)} seções); gerando as demais uma a uma.")
+    return secoes
+
+
+def _secoes_do_modelo(tipos, modo):
+    """Seções que vão na chamada única, ou [] se o modo for "secoes" (ou se não compensar)."""
+    if (modo or MODO) != "json":
+        return []
+    secoes = [tipo for tipo in tipos if tipo in INSTRUCOES and tipo not in TEXTOS_FIXOS]
+    return secoes if len(secoes) > 1 else []
+
+
+def gerar_texto_ia(dados, lista_itens, tipo, usar_cache=True):
+    """
+    Gera um texto usando o modelo de IA do Ollama com base no contexto do formulário e na lista de itens.
+    Com usar_cache=False a resposta guardada no cache local é ignorada e o texto é gerado de novo.
+    """
+    return _gerar_secao(montar_contexto_demanda(dados, lista_itens), tipo, usar_cache)
+
+
+def gerar_textos_ia(dados, lista_itens, tipos, max_paralelo=None, usar_cache=True, modo=None):
+    """
+    Gera várias seções do DFD de uma vez.
+
+    O contexto da demanda é montado uma única vez e os prompts são disparados em
+    paralelo (até `max_paralelo`, padrão MAX_REQUISICOES_PARALELAS), cada um em um
+    slot do Ollama, que avalia o contexto por conta própria.
+    usar_cache=False ignora as respostas já guardadas no cache local.
+
+    No modo "json" (`modo`, padrão MODO) as seções do modelo saem de uma única
+    chamada, e só as que faltarem na resposta são geradas em paralelo.
+
+    Retorna:
+        dict: {tipo: texto}, na mesma ordem de `tipos`.
+    """
+    contexto_demanda = montar_contexto_demanda(dados, lista_itens)
+
+    secoes_json = _secoes_do_modelo(tipos, modo)
+    prontos = _gerar_secoes_json(contexto_demanda, secoes_json, usar_cache) if secoes_json else {}
+    pendentes = [tipo for tipo in tipos if tipo not in prontos]
+
+    if max_paralelo is None:
+        max_paralelo = MAX_REQUISICOES_PARALELAS
+    max_paralelo = max(1, min(max_paralelo, len(pendentes)))
+
+    with ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="dfd-ia") as executor:
+        futuros = {tipo: executor.submit(no_contexto_atual(_gerar_secao), contexto_demanda, tipo, usar_cache) for tipo in pendentes}
+        return {tipo: prontos[tipo] if tipo in prontos else futuros[tipo].result() for tipo in tipos}
+
+
+def gerar_textos_ia_stream(dados, lista_itens, tipos, max_paralelo=None, usar_cache=True, cancelar=None, modo=None):
+    """
+    Versão em streaming de gerar_textos_ia, para exibir o texto enquanto é gerado.
+
+    As seções começam todas em paralelo e o retorno é {tipo: iterador de fragmentos},
+    na ordem de `tipos`, pronto para st.write_stream. Sinalizar o threading.Event
+    `cancelar` interrompe as gerações em andamento.
+
+    No modo "json" as seções do modelo aparecem inteiras quando a resposta única
+    termina; as que faltarem nela são então geradas em streaming, uma por seção.
+    """
+    contexto_demanda = montar_contexto_demanda(dados, lista_itens)
+
+    if max_paralelo is None:
+        max_paralelo = MAX_REQUISICOES_PARALELAS
+
+    secoes_json = _secoes_do_modelo(tipos, modo)
+    trava = threading.Lock()
+    resposta_json = {}
+
+    def secoes_prontas():
+        # A primeira seção a chegar aqui faz a chamada única; as outras esperam o resultado
+        with trava:
+            if "secoes" not in resposta_json:
+                resposta_json["secoes"] = _gerar_secoes_json(contexto_demanda, secoes_json, usar_cache, cancelar)
+        return resposta_json["secoes"]
+
+    def fluxo_secao(tipo):
+        if tipo in secoes_json:
+            secoes = secoes_prontas()
+            if tipo in secoes:
+                yield secoes[tipo]
+                return
+            if cancelar is not None and cancelar.is_set():
+                return
+        yield from _gerar_secao_stream(contexto_demanda, tipo, usar_cache, cancelar)
+
+    fluxos = {tipo: partial(fluxo_secao, tipo) for tipo in tipos}
+    return transmitir_em_paralelo(fluxos, max_paralelo, cancelar)
\ No newline at end of file
@@ -0,0 +1,141 @@
+# siag_busca.py
+# Ponto único de busca de itens do SIAG usado pelo formulário do DFD.
+#
+# Ordem das fontes, da mais barata para a mais cara:
+#   1. espelho local (siag_catalogo): milissegundos, sem rede;
+#   2. cliente HTTP (siag_http): um GET e um POST por página de resultados;
+#   3. Chrome headless (siag_navegador): só se o cliente HTTP falhar e
+#      SIAG_NAVEGADOR_RESERVA estiver ligado. O Selenium só é importado nesse caso.
+#
+# Os resultados das consultas online são gravados no espelho local.
+#
+# buscar_varios_siag resolve uma lista inteira de termos (nomes ou códigos colados
+# pelo usuário) de uma vez: termos repetidos são consultados uma só vez, o espelho
+# responde os que já conhece e o restante vai ao SIAG em paralelo, limitado a
+# SIAG_BUSCAS_SIMULTANEAS consultas ao mesmo tempo.
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+from comum.instrumentacao import medir, no_contexto_atual
+from siag_catalogo import normalizar, obter_catalogo_siag
+from siag_http import ErroBuscaSIAG, buscar_siag_http
+
+
+def consultar_siag(termo_pesquisa: str) -> List[Dict[str, str]]:
+    """Consulta o SIAG online (HTTP e, se falhar, o navegador). Levanta ErroBuscaSIAG em caso de falha."""
+    por_codigo = termo_pesquisa.strip().isdigit()
+    with medir("siag.consultar", termo=termo_pesquisa, por_codigo=por_codigo) as span:
+        try:
+            resultados = buscar_siag_http(termo_pesquisa, por_codigo=por_codigo)
+            span.definir(fonte="http", resultados=len(resultados))
+            return resultados
+        except ErroBuscaSIAG as erro_http:
+            if not config.SIAG_NAVEGADOR_RESERVA:
+                raise
+            print(f"Busca HTTP no SIAG falhou ({erro_http}); tentando pelo navegador.")
+
+        try:
+            from siag_navegador import buscar_siag_online
+        except ImportError as e:
+            raise ErroBuscaSIAG(f"Busca HTTP no SIAG falhou e o Selenium não está instalado: {e}") from e
+        resultados = buscar_siag_online(termo_pesquisa)
+        span.definir(fonte="navegador", resultados=len(resultados))
+        return resultados
+
+
+def buscar_siag_online(termo_pesquisa: str) -> List[Dict[str, str]]:
+    """Consulta o SIAG online e grava os resultados no espelho local."""
+    resultados = consultar_siag(termo_pesquisa)
+    obter_catalogo_siag().registrar_consulta(termo_pesquisa, resultados)
+    return resultados
+
+
+def buscar_siag(
+    termo_pesquisa: str,
+    online: bool = False,
+    consultar_online: Callable[[str], List[Dict[str, str]]] = buscar_siag_online,
+) -> List[Dict[str, str]]:
+    """
+    Pesquisa no espelho local e, se não houver resultados (ou online=True), no SIAG
+    com `consultar_online` (a interface passa uma versão com cache da consulta).
+    """
+    if not online:
+        resultados = obter_catalogo_siag().buscar(termo_pesquisa)
+        if resultados:
+            return resultados
+    return consultar_online(termo_pesquisa)
+
+
+# ---------------- Busca de vários itens ----------------
+
+def ler_lista_itens(texto: str) -> List[Dict[str, str]]:
+    """
+    Lê a lista colada pelo usuário: um item por linha, no formato
+    "termo[;quantidade[;unidade]]" (ou separado por tabulação, como ao colar do Excel).
+    Linhas vazias são ignoradas.
+    """
+    itens = []
+    for linha in (texto or "").splitlines():
+        partes = [parte.strip() for parte in re.split(r"[;\t]", linha)]
+        if not partes[0]:
+            continue
+        itens.append({
+            "termo": partes[0],
+            "qtd": partes[1] if len(partes) > 1 else "",
+            "unidade": partes[2].upper() if len(partes) > 2 else "",
+        })
+    return itens
+
+
+def buscar_varios_siag(
+    termos: Iterable[str],
+    online: bool = False,
+    limite: int = 5,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Resolve vários termos de uma vez. Retorna, para cada termo normalizado
+    (siag_catalogo.normalizar), {"termo", "itens" (até `limite` candidatos), "erro"}.
+    Uma falha em um termo não interrompe os demais: fica registrada em "erro".
+    """
+    unicos: Dict[str, str] = {}
+    for termo in termos:
+        chave = normalizar(termo)
+        if chave and chave not in unicos:
+            unicos[chave] = termo.strip()
+
+    with medir("siag.buscar_varios", termos=len(unicos), online=online) as span:
+        resultados: Dict[str, Dict[str, object]] = {}
+        pendentes = []
+        catalogo = obter_catalogo_siag()
+        for chave, termo in unicos.items():
+            itens = [] if online else catalogo.buscar(termo, limite=limite)
+            if itens:
+                resultados[chave] = {"termo": termo, "itens": itens, "erro": None}
+            else:
+                pendentes.append(chave)
+        span.definir(consultas_online=len(pendentes))
+
+        def consultar(chave: str) -> Dict[str, object]:
+            termo = unicos[chave]
+            try:
+                return {"termo": termo, "itens": buscar_siag_online(termo)[:limite], "erro": None}
+            except ErroBuscaSIAG as e:
+                return {"termo": termo, "itens": [], "erro": str(e)}
+
+        if pendentes:
+            trabalhadores = min(max_workers or config.SIAG_BUSCAS_SIMULTANEAS, len(pendentes))
+            with ThreadPoolExecutor(max_workers=max(1, trabalhadores), thread_name_prefix="siag-busca") as executor:
+                for chave, resultado in zip(pendentes, executor.map(no_contexto_atual(consultar), pendentes)):
+                    resultados[chave] = resultado
+
+        return {chave: resultados[chave] for chave in unicos}
@@ -0,0 +1,292 @@
+# siag_catalogo.py
+# Espelho local (SQLite) dos itens do SIAG, com busca textual.
+#
+# Cada consulta ao SIAG pelo navegador leva de 10 a 30 segundos. Os itens (código e
+# descrição) mudam pouco, então ficam guardados aqui e o formulário do DFD pesquisa
+# no espelho em milissegundos; o SIAG só é consultado quando o termo não tem
+# resultados locais (ou quando o usuário pede a consulta online). A ordem das fontes
+# fica em siag_busca.
+#
+# A busca usa um índice FTS5 com tokenizador unicode61 (remove_diacritics 2): não
+# diferencia maiúsculas nem acentos e cada palavra do termo casa com o início das
+# palavras da descrição ("caneta esfero" encontra "CANETA ESFEROGRÁFICA"). Termos
+# só com dígitos pesquisam pelo início do código. Se o SQLite não tiver FTS5, a
+# busca cai para LIKE sobre a descrição sem acentos.
+#
+# O espelho é preenchido de três formas:
+#   - cada consulta online grava os resultados (o espelho cresce com o uso);
+#   - importação de uma exportação do SIAG:  python siag_catalogo.py importar itens.csv
+#   - atualização dos termos já pesquisados: python siag_catalogo.py atualizar [--dias N]
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples (usado nas buscas sem FTS5 e nas consultas guardadas)."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+
+def _palavras(termo: str) -> List[str]:
+    return re.findall(r"\w+", normalizar(termo))
+
+
+class CatalogoSIAG:
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        self._local = threading.local()
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS itens (
+                    codigo        TEXT PRIMARY KEY,
+                    descricao     TEXT NOT NULL,
+                    busca         TEXT NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+                """
+            )
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS consultas (
+                    termo         TEXT PRIMARY KEY,
+                    texto         TEXT NOT NULL,
+                    resultados    INTEGER NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+                """
+            )
+            self.fts = self._criar_fts(con)
+
+    def _criar_fts(self, con: sqlite3.Connection) -> bool:
+        existia = con.execute("SELECT 1 FROM sqlite_master WHERE name = 'itens_fts'").fetchone() is not None
+        try:
+            con.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS itens_fts USING fts5(
+                    codigo, descricao,
+                    content='itens', content_rowid='rowid',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """
+            )
+        except sqlite3.OperationalError as e:
+            print(f"SQLite sem FTS5 ({e}); a busca do SIAG usará LIKE.")
+            return False
+
+        # Gatilhos mantêm o índice igual à tabela de itens
+        con.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS itens_ai AFTER INSERT ON itens BEGIN
+                INSERT INTO itens_fts (rowid, codigo, descricao) VALUES (new.rowid, new.codigo, new.descricao);
+            END;
+            CREATE TRIGGER IF NOT EXISTS itens_ad AFTER DELETE ON itens BEGIN
+                INSERT INTO itens_fts (itens_fts, rowid, codigo, descricao) VALUES ('delete', old.rowid, old.codigo, old.descricao);
+            END;
+            CREATE TRIGGER IF NOT EXISTS itens_au AFTER UPDATE ON itens BEGIN
+                INSERT INTO itens_fts (itens_fts, rowid, codigo, descricao) VALUES ('delete', old.rowid, old.codigo, old.descricao);
+                INSERT INTO itens_fts (rowid, codigo, descricao) VALUES (new.rowid, new.codigo, new.descricao);
+            END;
+            """
+        )
+        if not existia:
+            # Banco criado antes do índice (ou em um SQLite sem FTS5): indexa o que já existe
+            con.execute("INSERT INTO itens_fts (itens_fts) VALUES ('rebuild')")
+        return True
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread: o Streamlit executa cada sessão em uma thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    # ---------------- Gravação ----------------
+
+    def importar(self, itens: Iterable[Dict[str, str]]) -> int:
+        """Grava (ou atualiza) itens {'codigo', 'descricao'}. Retorna quantos foram gravados."""
+        agora = time.time()
+        linhas = []
+        for item in itens:
+            codigo = str(item.get("codigo") or "").strip()
+            descricao = " ".join(str(item.get("descricao") or "").split())
+            if codigo and descricao:
+                linhas.append((codigo, descricao, normalizar(descricao), agora))
+
+        with self._conexao() as con:
+            con.executemany(
+                "INSERT INTO itens (codigo, descricao, busca, atualizado_em) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (codigo) DO UPDATE SET descricao = excluded.descricao, "
+                "busca = excluded.busca, atualizado_em = excluded.atualizado_em",
+                linhas,
+            )
+        return len(linhas)
+
+    def registrar_consulta(self, termo: str, itens: List[Dict[str, str]]) -> None:
+        """Grava o resultado de uma consulta online e o termo, para a atualização periódica."""
+        self.importar(itens)
+        with self._conexao() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO consultas VALUES (?, ?, ?, ?)",
+                (normalizar(termo), termo.strip(), len(itens), time.time()),
+            )
+
+    # ---------------- Consulta ----------------
+
+    def buscar(self, termo: str, limite: int = 100) -> List[Dict[str, str]]:
+        """Itens cujo código começa com o termo (só dígitos) ou cuja descrição tem todas as palavras do termo."""
+        termo = (termo or "").strip()
+        if not termo:
+            return []
+
+        con = self._conexao()
+        if termo.isdigit():
+            linhas = con.execute(
+                "SELECT codigo, descricao FROM itens WHERE codigo LIKE ? ORDER BY length(codigo), codigo LIMIT ?",
+                (f"{termo}%", limite),
+            ).fetchall()
+        else:
+            palavras = _palavras(termo)
+            if not palavras:
+                return []
+            if self.fts:
+                # Cada palavra entre aspas (sem operadores do FTS) e com * para casar pelo prefixo
+                consulta = " ".join(f'"{palavra}"*' for palavra in palavras)
+                linhas = con.execute(
+                    "SELECT i.codigo, i.descricao FROM itens_fts f JOIN itens i ON i.rowid = f.rowid "
+                    "WHERE itens_fts MATCH ? ORDER BY bm25(itens_fts) LIMIT ?",
+                    (f"descricao : ({consulta})", limite),
+                ).fetchall()
+            else:
+                condicoes = " AND ".join("(' ' || busca) LIKE ?" for _ in palavras)
+                linhas = con.execute(
+                    f"SELECT codigo, descricao FROM itens WHERE {condicoes} ORDER BY descricao LIMIT ?",
+                    (*[f"% {palavra}%" for palavra in palavras], limite),
+                ).fetchall()
+
+        return [{"codigo": codigo, "descricao": descricao} for codigo, descricao in linhas]
+
+    def consultas_antigas(self, idade: float) -> List[str]:
+        """Termos pesquisados online cuja última atualização tem mais de `idade` segundos."""
+        linhas = self._conexao().execute(
+            "SELECT texto FROM consultas WHERE atualizado_em < ? ORDER BY atualizado_em",
+            (time.time() - idade,),
+        ).fetchall()
+        return [texto for (texto,) in linhas]
+
+    def estatisticas(self) -> Dict[str, int]:
+        con = self._conexao()
+        return {
+            "itens": con.execute("SELECT COUNT(*) FROM itens").fetchone()[0],
+            "consultas": con.execute("SELECT COUNT(*) FROM consultas").fetchone()[0],
+        }
+
+
+_catalogo: Optional[CatalogoSIAG] = None
+_catalogo_lock = threading.Lock()
+
+
+def obter_catalogo_siag() -> CatalogoSIAG:
+    """Instância única do espelho do SIAG por processo, configurada por comum.config."""
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            _catalogo = CatalogoSIAG(config.SIAG_CATALOGO_ARQUIVO)
+        return _catalogo
+
+
+# ---------------- Importação e atualização ----------------
+
+def ler_arquivo_itens(caminho: Path) -> Iterable[Dict[str, str]]:
+    """
+    Lê itens de um .csv (colunas "codigo" e "descricao"; separador "," ou ";") ou de
+    um .jsonl ({"codigo": ..., "descricao": ...} por linha).
+    """
+    if caminho.suffix.lower() in (".jsonl", ".json"):
+        with caminho.open(encoding="utf-8-sig") as f:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+        return
+
+    with caminho.open(encoding="utf-8-sig", newline="") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;") if amostra else csv.excel
+        for linha in csv.DictReader(f, dialect=dialeto):
+            yield {normalizar(k or ""): v for k, v in linha.items()}
+
+
+def atualizar_consultas(
+    buscar_online: Callable[[str], List[Dict[str, str]]],
+    idade: float,
+    pausa: float = 1.0,
+) -> int:
+    """Refaz no SIAG as consultas mais antigas que `idade` segundos. Retorna quantas foram atualizadas."""
+    catalogo = obter_catalogo_siag()
+    atualizadas = 0
+    for termo in catalogo.consultas_antigas(idade):
+        try:
+            catalogo.registrar_consulta(termo, buscar_online(termo))
+            atualizadas += 1
+            print(f"Atualizado: {termo}")
+        except Exception as e:
+            print(f'Erro ao atualizar "{termo}": {e}')
+        time.sleep(pausa)  # não sobrecarrega o SIAG
+    return atualizadas
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Espelho local dos itens do SIAG.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    importar = comandos.add_parser("importar", help="importa itens de um .csv ou .jsonl")
+    importar.add_argument("arquivo", type=Path)
+
+    atualizar = comandos.add_parser("atualizar", help="refaz no SIAG as consultas já feitas pelo formulário")
+    atualizar.add_argument("--dias", type=float, default=config.SIAG_CATALOGO_VALIDADE_DIAS,
+                           help="atualiza as consultas mais antigas que este número de dias")
+
+    buscar = comandos.add_parser("buscar", help="pesquisa no espelho local")
+    buscar.add_argument("termo")
+
+    args = parser.parse_args(argv)
+    catalogo = obter_catalogo_siag()
+
+    if args.comando == "importar":
+        total = catalogo.importar(ler_arquivo_itens(args.arquivo))
+        print(f"{total} itens importados. {catalogo.estatisticas()}")
+    elif args.comando == "atualizar":
+        from siag_busca import consultar_siag
+        total = atualizar_consultas(consultar_siag, args.dias * 24 * 3600)
+        print(f"{total} consultas atualizadas. {catalogo.estatisticas()}")
+    else:
+        for item in catalogo.buscar(args.termo):
+            print(f"{item['codigo']}\t{item['descricao']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
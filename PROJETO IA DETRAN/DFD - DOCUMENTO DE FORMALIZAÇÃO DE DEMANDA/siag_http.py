@@ -0,0 +1,241 @@
+# siag_http.py
+# Busca de itens no SIAG (Central de Compras do SGC) por HTTP, sem navegador.
+#
+# A página de pesquisa é um formulário JSF (form_PesquisaItemPageList): o estado da
+# tela fica no campo oculto javax.faces.ViewState, e cada ação (pesquisar, trocar de
+# página) é um POST do formulário inteiro com esse campo. Este cliente faz o mesmo
+# que o navegador faria:
+#
+#   1. GET da página, para obter o formulário e o ViewState;
+#   2. POST do formulário com a opção "Palavra-chave", o termo e o botão Pesquisar;
+#   3. enquanto houver link de próxima página na tabela de resultados, POST do
+#      formulário devolvido (com o novo ViewState) acionando esse link.
+#
+# O HTML é lido com lxml. Cada consulta leva poucas centenas de milissegundos e usa
+# alguns MB, contra segundos e centenas de MB do Chrome headless (siag_navegador,
+# que continua como alternativa em siag_busca).
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from lxml import html as lxml_html
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+
+URL_SIAG = config.SIAG_URL
+
+# Elementos da página de pesquisa do SGC
+ID_FORMULARIO = "form_PesquisaItemPageList"
+ID_OPCAO_CODIGO = "form_PesquisaItemPageList:procurarPorCombo:0"
+ID_OPCAO_PALAVRA_CHAVE = "form_PesquisaItemPageList:procurarPorCombo:2"
+ID_CAMPO_BUSCA = "form_PesquisaItemPageList:palavraChaveInput"
+ID_BOTAO_PESQUISAR = "form_PesquisaItemPageList:pesquisarButton"
+ID_TABELA_RESULTADOS = "form_PesquisaItemPageList:editalDataTable"
+
+# Textos (ou fim do id) do controle que leva à próxima página de resultados
+TEXTOS_PROXIMA_PAGINA = {"»", ">", ">>", "próxima", "próximo", "proxima", "proximo", "next"}
+SUFIXOS_ID_PROXIMA_PAGINA = ("next", "proxima", "proximo")
+
+# Parâmetros de um commandLink do JSF RI: jsfcljs(form, {'id':'id', ...}, '')
+_PARAMETROS_ONCLICK = re.compile(r"'([^']+)'\s*:\s*'([^']*)'")
+
+CABECALHOS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) IA-DETRAN/1.0",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "pt-BR,pt;q=0.9",
+}
+
+
+class ErroBuscaSIAG(Exception):
+    """Falha ao consultar o SIAG (navegador, tempo limite ou página inesperada)."""
+
+
+def _documento(conteudo, url: str, encoding: Optional[str] = None):
+    parser = lxml_html.HTMLParser(encoding=encoding) if encoding else None
+    return lxml_html.fromstring(conteudo, parser=parser, base_url=url)
+
+
+def _por_id(documento, id_elemento: str):
+    encontrados = documento.xpath("//*[@id=$id]", id=id_elemento)
+    return encontrados[0] if encontrados else None
+
+
+def _texto(elemento) -> str:
+    return " ".join(elemento.text_content().split())
+
+
+def ler_resultados(html) -> List[Dict[str, str]]:
+    """Extrai [{'codigo', 'descricao'}] da tabela de resultados da página do SIAG (HTML ou documento lxml)."""
+    documento = _documento(html, URL_SIAG) if isinstance(html, (str, bytes)) else html
+    tabela = _por_id(documento, ID_TABELA_RESULTADOS)
+    if tabela is None:
+        return []
+
+    resultados = []
+    for linha in tabela.iter("tr"):
+        colunas = linha.findall("td")  # Linhas só com <th> (cabeçalho) ficam de fora
+        if len(colunas) >= 2:
+            codigo = _texto(colunas[0])
+            if codigo:
+                resultados.append({"codigo": codigo, "descricao": _texto(colunas[1])})
+    return resultados
+
+
+def _campos_formulario(formulario) -> List[Tuple[str, str]]:
+    # form_values() já aplica as regras do navegador: campos sem nome, desabilitados,
+    # botões e rádios/caixas não marcados ficam de fora
+    return [(nome, valor) for nome, valor in formulario.form_values()]
+
+
+def _substituir(campos: List[Tuple[str, str]], novos: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Campos do formulário com os valores de `novos` no lugar dos de mesmo nome."""
+    nomes = {nome for nome, _ in novos}
+    return [(n, v) for n, v in campos if n not in nomes] + novos
+
+
+def _acionar(formulario, elemento) -> List[Tuple[str, str]]:
+    """Parâmetros que o navegador enviaria ao clicar em `elemento` (botão ou commandLink)."""
+    if elemento.tag in ("input", "button"):
+        nome = elemento.get("name")
+        return [(nome, elemento.get("value", ""))] if nome else []
+
+    id_link = elemento.get("id") or ""
+    parametros = _PARAMETROS_ONCLICK.findall(elemento.get("onclick") or "")
+    if parametros:
+        return parametros
+    # MyFaces (oamSubmitForm): o id do link vai no campo oculto <form>:_idcl
+    id_formulario = formulario.get("id") or formulario.get("name") or ID_FORMULARIO
+    return [(id_link, id_link), (f"{id_formulario}:_idcl", id_link)]
+
+
+def _proxima_pagina(formulario):
+    """Controle de "próxima página" da tabela de resultados, ou None na última página."""
+    for elemento in formulario.iter("a", "input", "button"):
+        classes = (elemento.get("class") or "").lower()
+        if elemento.get("disabled") is not None or "disabled" in classes or "inativo" in classes:
+            continue
+        id_elemento = (elemento.get("id") or "").lower()
+        if elemento.tag == "input":
+            texto = (elemento.get("value") or "").strip().lower()
+        else:
+            texto = _texto(elemento).lower()
+        if texto in TEXTOS_PROXIMA_PAGINA or id_elemento.endswith(SUFIXOS_ID_PROXIMA_PAGINA):
+            if elemento.tag == "a" and not (elemento.get("onclick") or elemento.get("href")):
+                continue  # link desenhado sem ação: última página
+            return elemento
+    return None
+
+
+class ClienteSIAG:
+    """Cliente HTTP da pesquisa de itens do SIAG. Uma sessão (cookies e conexão) por thread."""
+
+    def __init__(self, url: str = URL_SIAG, tempo_limite: float = 30, max_paginas: int = 20):
+        self.url = url
+        self.tempo_limite = tempo_limite
+        self.max_paginas = max(1, max_paginas)
+        self._local = threading.local()
+
+    def _sessao(self) -> requests.Session:
+        sessao = getattr(self._local, "sessao", None)
+        if sessao is None:
+            sessao = requests.Session()
+            sessao.headers.update(CABECALHOS)
+            self._local.sessao = sessao
+        return sessao
+
+    def _requisitar(self, metodo: str, url: str, **kwargs):
+        try:
+            resposta = self._sessao().request(metodo, url, timeout=self.tempo_limite, **kwargs)
+            resposta.raise_for_status()
+        except requests.Timeout as e:
+            raise ErroBuscaSIAG("Tempo limite excedido ao buscar no SIAG. A página demorou muito para responder.") from e
+        except requests.RequestException as e:
+            raise ErroBuscaSIAG(f"Ocorreu um erro durante a busca no SIAG: {e}") from e
+
+        # Sem charset no cabeçalho, o lxml usa o <meta charset> da página
+        encoding = resposta.encoding if "charset" in resposta.headers.get("Content-Type", "").lower() else None
+        return _documento(resposta.content, resposta.url, encoding)
+
+    def _formulario(self, documento):
+        formulario = _por_id(documento, ID_FORMULARIO)
+        if formulario is None or formulario.tag != "form":
+            encontrados = documento.xpath("//form[@name=$nome]", nome=ID_FORMULARIO)
+            formulario = encontrados[0] if encontrados else None
+        if formulario is None:
+            raise ErroBuscaSIAG("A página do SIAG não tem o formulário de pesquisa esperado. O layout pode ter mudado.")
+        return formulario
+
+    def _enviar(self, formulario, campos: List[Tuple[str, str]]):
+        destino = urljoin(formulario.base_url or self.url, formulario.get("action") or self.url)
+        return self._requisitar("POST", destino, data=campos)
+
+    def pesquisar(self, termo_pesquisa: str, por_codigo: bool = False) -> List[Dict[str, str]]:
+        """Pesquisa `termo_pesquisa` por palavra-chave (ou código), percorrendo todas as páginas de resultados."""
+        formulario = self._formulario(self._requisitar("GET", self.url))
+
+        opcao = _por_id(formulario, ID_OPCAO_CODIGO if por_codigo else ID_OPCAO_PALAVRA_CHAVE)
+        campo = _por_id(formulario, ID_CAMPO_BUSCA)
+        botao = _por_id(formulario, ID_BOTAO_PESQUISAR)
+        if campo is None or botao is None:
+            raise ErroBuscaSIAG("A página do SIAG não tem o campo de busca esperado. O layout pode ter mudado.")
+
+        novos = [(campo.get("name") or ID_CAMPO_BUSCA, termo_pesquisa)]
+        if opcao is not None and opcao.get("name"):
+            novos.append((opcao.get("name"), opcao.get("value", "")))
+        campos = _substituir(_campos_formulario(formulario), novos + _acionar(formulario, botao))
+        documento = self._enviar(formulario, campos)
+
+        resultados: List[Dict[str, str]] = []
+        vistos = set()
+        for pagina in range(1, self.max_paginas + 1):
+            novos = [item for item in ler_resultados(documento) if item["codigo"] not in vistos]
+            if not novos:
+                break  # página vazia ou repetida: o servidor voltou à primeira página
+            vistos.update(item["codigo"] for item in novos)
+            resultados.extend(novos)
+
+            formulario = self._formulario(documento)
+            proxima = _proxima_pagina(formulario)
+            if proxima is None or pagina == self.max_paginas:
+                break
+            campos = _substituir(_campos_formulario(formulario), _acionar(formulario, proxima))
+            documento = self._enviar(formulario, campos)
+        return resultados
+
+
+_cliente: Optional[ClienteSIAG] = None
+_cliente_lock = threading.Lock()
+
+
+def obter_cliente() -> ClienteSIAG:
+    """Cliente único por processo, configurado por comum.config."""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = ClienteSIAG(URL_SIAG, config.SIAG_TEMPO_LIMITE, config.SIAG_HTTP_MAX_PAGINAS)
+        return _cliente
+
+
+def buscar_siag_http(termo_pesquisa, por_codigo=False) -> List[Dict[str, str]]:
+    """Pesquisa `termo_pesquisa` por palavra-chave (ou código) no SIAG via HTTP. Levanta ErroBuscaSIAG em caso de falha."""
+    return obter_cliente().pesquisar(termo_pesquisa, por_codigo=por_codigo)
+
+
+if __name__ == "__main__":
+    import time
+
+    for termo in sys.argv[1:] or ["caneta"]:
+        inicio = time.perf_counter()
+        itens = buscar_siag_http(termo)
+        print(f"{termo}: {len(itens)} itens em {time.perf_counter() - inicio:.2f}s")
+        for item in itens[:10]:
+            print(f"  {item['codigo']}\t{item['descricao']}")
@@ -0,0 +1,307 @@
+# siag_navegador.py
+# Busca de itens no SIAG (Central de Compras do SGC) com o Chrome headless.
+#
+# É a consulta mais lenta (abre o navegador e espera a página): siag_busca consulta
+# primeiro o espelho local (siag_catalogo) e o cliente HTTP (siag_http), e só chega
+# aqui quando o cliente HTTP falha.
+#
+# Abrir o Chrome custa mais que a própria consulta, então os navegadores ficam em um
+# pool por processo (PoolNavegadores): cada busca pega um navegador livre, e ao
+# devolvê-lo a página de pesquisa já é carregada de novo em segundo plano, deixando-o
+# pronto para a próxima. Navegadores que não respondem são descartados e cada um é
+# reciclado após SIAG_NAVEGADOR_MAX_USOS consultas (o Chrome acumula memória).
+#
+# Em vez de uma pausa fixa depois de pesquisar, a busca espera a tabela de
+# resultados ser (re)desenhada. Para testar sem acessar o SGC, aponte SIAG_URL para
+# a réplica local da página:
+#
+#   SIAG_URL="file:///.../static/siag/ItemCompraPageList.html" python siag_navegador.py caneta
+import atexit
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.chrome.options import Options
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+from siag_http import ErroBuscaSIAG, ler_resultados
+
+URL_SIAG = config.SIAG_URL
+
+# Elementos da página de pesquisa do SGC
+ID_OPCAO_PALAVRA_CHAVE = "form_PesquisaItemPageList:procurarPorCombo:2"
+ID_CAMPO_BUSCA = "form_PesquisaItemPageList:palavraChaveInput"
+ID_BOTAO_PESQUISAR = "form_PesquisaItemPageList:pesquisarButton"
+ID_TABELA_RESULTADOS = "form_PesquisaItemPageList:editalDataTable"
+# Mensagens da página quando a pesquisa não encontra itens (minúsculas)
+TEXTOS_SEM_RESULTADOS = ("nenhum registro", "nenhum item", "não foram encontrados")
+
+
+def criar_driver():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    # Para ambientes de deploy (Docker, Streamlit Cloud), pode ser necessário apontar para o Chromedriver ou edge
+    # chrome_options.binary_location = "/usr/bin/google-chrome" # Exemplo para Linux
+
+    try:
+        return webdriver.Chrome(options=chrome_options)
+    except Exception as e:
+        raise ErroBuscaSIAG(f"Erro ao inicializar o navegador. Verifique se o Chromedriver está instalado e configurado corretamente. Erro: {e}") from e
+
+
+def _obsoleto(elemento) -> bool:
+    try:
+        elemento.is_enabled()
+        return False
+    except StaleElementReferenceException:
+        return True
+
+
+def pesquisar(driver, termo_pesquisa, url=URL_SIAG, tempo_limite=30, pagina_carregada=False):
+    """
+    Faz a pesquisa por palavra-chave em um navegador já aberto e retorna o HTML da página
+    de resultados. Com pagina_carregada=True, usa a página de pesquisa já aberta.
+    """
+    if not pagina_carregada:
+        driver.get(url)
+    wait = WebDriverWait(driver, tempo_limite, poll_frequency=0.1)
+
+    opcao_radio = wait.until(EC.element_to_be_clickable((By.ID, ID_OPCAO_PALAVRA_CHAVE)))
+    opcao_radio.click()
+
+    campo_busca = wait.until(EC.presence_of_element_located((By.ID, ID_CAMPO_BUSCA)))
+    campo_busca.clear()
+    campo_busca.send_keys(termo_pesquisa)
+
+    botao_pesquisar = wait.until(EC.element_to_be_clickable((By.ID, ID_BOTAO_PESQUISAR)))
+
+    # A pesquisa recarrega a página (ou redesenha a tabela): a tabela antiga, se houver,
+    # ou o próprio botão deixam de existir quando a resposta chega
+    tabelas_antigas = driver.find_elements(By.ID, ID_TABELA_RESULTADOS)
+    referencia = tabelas_antigas[0] if tabelas_antigas else botao_pesquisar
+    botao_pesquisar.click()
+
+    def resultado_pronto(d):
+        if tabelas_antigas and not _obsoleto(referencia):
+            return False
+        if d.find_elements(By.ID, ID_TABELA_RESULTADOS):
+            return True
+        texto = d.find_element(By.TAG_NAME, "body").text.lower()
+        return any(mensagem in texto for mensagem in TEXTOS_SEM_RESULTADOS)
+
+    try:
+        wait.until(resultado_pronto)
+    except TimeoutException:
+        # Página respondeu sem tabela: a pesquisa não encontrou itens
+        if _obsoleto(referencia):
+            return driver.page_source
+        raise
+    return driver.page_source
+
+
+class _Navegador:
+    """Um Chrome do pool, com o número de consultas feitas e a página de pesquisa pré-carregada."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.usos = 0
+        self.pronto = False
+        self._preparo: Optional[Future] = None
+
+    def preparar(self, executor: ThreadPoolExecutor, url: str) -> None:
+        self._preparo = executor.submit(self.driver.get, url)
+
+    def pagina_carregada(self, tempo_limite: float) -> bool:
+        """Aguarda o pré-carregamento; False se não houve (ou se falhou)."""
+        if self._preparo is None:
+            return False
+        try:
+            self._preparo.result(timeout=tempo_limite)
+            return True
+        except Exception:
+            return False
+        finally:
+            self._preparo = None
+
+    def saudavel(self) -> bool:
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def fechar(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class PoolNavegadores:
+    def __init__(
+        self,
+        tamanho: int,
+        max_usos: int,
+        url: str = URL_SIAG,
+        tempo_limite: float = 30,
+        criar: Callable[[], object] = criar_driver,
+    ):
+        self.tamanho = max(1, tamanho)
+        self.max_usos = max(1, max_usos)
+        self.url = url
+        self.tempo_limite = tempo_limite
+        self._criar = criar
+
+        self._livres: "queue.LifoQueue[_Navegador]" = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(self.tamanho)  # no máximo `tamanho` buscas ao mesmo tempo
+        self._lock = threading.Lock()
+        self._abertos = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.tamanho, thread_name_prefix="siag-navegador")
+
+    def _abrir(self) -> _Navegador:
+        with self._lock:
+            self._abertos += 1
+        try:
+            return _Navegador(self._criar())
+        except BaseException:
+            with self._lock:
+                self._abertos -= 1
+            raise
+
+    def _descartar(self, navegador: _Navegador) -> None:
+        navegador.fechar()
+        with self._lock:
+            self._abertos -= 1
+
+    def _pegar_livre(self) -> _Navegador:
+        while True:
+            try:
+                navegador = self._livres.get_nowait()
+            except queue.Empty:
+                return self._abrir()
+            pronto = navegador.pagina_carregada(self.tempo_limite)
+            if navegador.saudavel():
+                navegador.pronto = pronto
+                return navegador
+            self._descartar(navegador)
+
+    def _devolver(self, navegador: _Navegador, sucesso: bool) -> None:
+        navegador.usos += 1
+        if not sucesso or navegador.usos >= self.max_usos:
+            self._descartar(navegador)
+            return
+        navegador.preparar(self._executor, self.url)
+        self._livres.put(navegador)
+
+    @contextmanager
+    def emprestar(self) -> Iterator[_Navegador]:
+        """Empresta um navegador (atributo `pronto`: a página de pesquisa já está carregada)."""
+        if not self._vagas.acquire(timeout=self.tempo_limite):
+            raise ErroBuscaSIAG("Todos os navegadores estão ocupados com outras buscas no SIAG. Tente novamente.")
+        try:
+            navegador = self._pegar_livre()
+            sucesso = False
+            try:
+                yield navegador
+                sucesso = True
+            finally:
+                self._devolver(navegador, sucesso)
+        finally:
+            self._vagas.release()
+
+    def aquecer(self, quantidade: int = 1) -> None:
+        """Abre navegadores em segundo plano, já com a página de pesquisa carregada."""
+
+        def abrir():
+            if not self._vagas.acquire(blocking=False):
+                return
+            try:
+                with self._lock:
+                    if self._abertos >= self.tamanho:
+                        return
+                navegador = self._abrir()
+                navegador.preparar(self._executor, self.url)
+                self._livres.put(navegador)
+            except Exception as e:
+                print(f"Erro ao abrir navegador para o SIAG: {e}")
+            finally:
+                self._vagas.release()
+
+        for _ in range(min(quantidade, self.tamanho)):
+            threading.Thread(target=abrir, name="siag-aquecer", daemon=True).start()
+
+    def fechar(self) -> None:
+        while True:
+            try:
+                self._descartar(self._livres.get_nowait())
+            except queue.Empty:
+                break
+        self._executor.shutdown(wait=False)
+
+    def estatisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {"abertos": self._abertos, "livres": self._livres.qsize()}
+
+
+_pool: Optional[PoolNavegadores] = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolNavegadores:
+    """Pool único por processo, configurado por comum.config; fechado ao encerrar o processo."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolNavegadores(
+                config.SIAG_NAVEGADORES,
+                config.SIAG_NAVEGADOR_MAX_USOS,
+                url=URL_SIAG,
+                tempo_limite=config.SIAG_TEMPO_LIMITE,
+            )
+            atexit.register(_pool.fechar)
+        return _pool
+
+
+def buscar_siag_online(termo_pesquisa) -> List[Dict[str, str]]:
+    """Pesquisa `termo_pesquisa` por palavra-chave no SIAG. Levanta ErroBuscaSIAG em caso de falha."""
+    pool = obter_pool()
+    try:
+        with pool.emprestar() as navegador:
+            html = pesquisar(
+                navegador.driver, termo_pesquisa, url=pool.url,
+                tempo_limite=pool.tempo_limite, pagina_carregada=navegador.pronto,
+            )
+    except ErroBuscaSIAG:
+        raise
+    except TimeoutException as e:
+        raise ErroBuscaSIAG("Tempo limite excedido ao buscar no SIAG. A página demorou muito para carregar ou os elementos não foram encontrados.") from e
+    except Exception as e:
+        raise ErroBuscaSIAG(f"Ocorreu um erro durante a busca no SIAG: {e}") from e
+
+    return ler_resultados(html)
+
+
+if __name__ == "__main__":
+    for termo in sys.argv[1:] or ["caneta"]:
+        inicio = time.perf_counter()
+        itens = buscar_siag_online(termo)
+        print(f"{termo}: {len(itens)} itens em {time.perf_counter() - inicio:.2f}s")
+        for item in itens[:10]:
+            print(f"  {item['codigo']}\t{item['descricao']}")
@@ -0,0 +1,264 @@
+# test_gerar_ia_dfd.py
+# Testes da montagem dos prompts do DFD (gerar_ia_dfd), sem o modelo de IA.
+#
+# A lista de itens entra nos prompts resumida até caber no orçamento de tokens
+# (_resumir_itens): cada nível de resumo é testado com uma lista que só cabe nele, e
+# o texto devolvido tem de caber no orçamento em todos.
+#
+# O modo "json" (todas as seções em uma chamada) roda contra o BackendFalso, sem a
+# fila do escalonador e com um cache de respostas em uma pasta temporária. O
+# BackendContado registra as chamadas e pode trocar a resposta em JSON por uma
+# inválida ou incompleta, para testar a volta às chamadas por seção.
+import sys
+from pathlib import Path
+
+import pytest
+
+# Pasta do DFD no path para importar o módulo testado, e a "PROJETO IA DETRAN" para o `comum`
+PASTA_APP = Path(__file__).resolve().parent.parent
+for pasta in (str(PASTA_APP), str(PASTA_APP.parent)):
+    if pasta not in sys.path:
+        sys.path.insert(0, pasta)
+
+from comum import cache_ia, config
+from comum.backend_ia import BackendFalso, definir_backend
+from comum.cliente_ia import estimar_tokens
+from gerar_ia_dfd import (
+    TEXTOS_FIXOS,
+    TITULOS_SECOES,
+    _item_detalhado,
+    _ler_secoes,
+    _resumir_itens,
+    _somar_quantidades,
+    gerar_textos_ia,
+    gerar_textos_ia_stream,
+    montar_contexto_demanda,
+)
+
+PRODUTOS = ["CANETA", "LAPIS", "PAPEL", "CABO", "MOUSE", "TECLADO", "MONITOR", "CADEIRA", "MESA", "ARMARIO"]
+CORES = ["AZUL", "PRETO", "BRANCO", "VERDE", "GRANDE", "PEQUENO"]
+
+
+def item(descricao, qtd="1", finalidade="Uso nas unidades de atendimento"):
+    return {"descricao": descricao, "qtd": qtd, "finalidade_especifica": finalidade}
+
+
+def resumir(lista_itens, orcamento):
+    texto, nivel, tokens = _resumir_itens(lista_itens, orcamento)
+    assert tokens == estimar_tokens(texto)
+    assert tokens <= orcamento, f"nível {nivel}: {tokens} tokens para um orçamento de {orcamento}"
+    return texto, nivel
+
+
+# ---------------- _resumir_itens ----------------
+
+def test_nivel_1_lista_pequena_sai_como_no_formulario():
+    itens = [item("CANETA ESFEROGRÁFICA AZUL", "10"), item("PAPEL A4", "5", "Impressão de processos")]
+
+    texto, nivel = resumir(itens, 1000)
+
+    assert nivel == 1
+    assert texto == "\n".join(_item_detalhado(i) for i in itens)
+
+
+def test_nivel_2_itens_iguais_em_uma_linha():
+    itens = [item("Caneta esferográfica azul", "1.000", f"Setor {n}") for n in range(30)]
+    itens.append(item("PAPEL A4", "5"))
+    detalhado = sum(estimar_tokens(_item_detalhado(i)) for i in itens)
+
+    texto, nivel = resumir(itens, detalhado // 3)
+
+    assert nivel == 2
+    assert "- Descrição: Caneta esferográfica azul (30 itens iguais)\n  Quantidade: 30000\n" in texto
+    assert "- Descrição: PAPEL A4\n  Quantidade: 5\n" in texto
+    assert "(e outras 27)" in texto  # só as primeiras finalidades
+
+
+def test_nivel_3_itens_semelhantes_em_grupos():
+    itens = [item(f"CABO HDMI {n}M, CONECTOR BANHADO A OURO", "2") for n in range(1, 41)]
+    itens.append(item("MOUSE ÓPTICO USB " + "COM FIO " * 40, "3"))
+
+    texto, nivel = resumir(itens, 150)
+
+    assert nivel == 3
+    assert "- 40 itens do tipo 'CABO HDMI' (ex.: CABO HDMI 1M, CONECTOR BANHADO A OURO; CABO HDMI 2M, CONECTOR BANHADO A OURO)" in texto
+    assert "Quantidade total: 80" in texto
+    assert "..." in texto  # descrição longa encurtada
+
+
+def test_nivel_4_maiores_grupos_ate_o_orcamento():
+    itens = [item(f"CANETA AZUL {n}", "1") for n in range(20)]
+    itens += [item(f"{tipo} {cor}", "1") for tipo in PRODUTOS for cor in CORES]
+
+    texto, nivel = resumir(itens, 120)
+
+    assert nivel == 4
+    assert texto.startswith("- 21 itens do tipo 'CANETA AZUL'")
+    assert texto.splitlines()[-1].startswith("- Outros ")
+
+
+@pytest.mark.parametrize("orcamento", [40, 60, 80, 100, 150, 200, 300])
+def test_nivel_4_respeita_o_orcamento(orcamento):
+    itens = [item(f"{tipo} {cor} MODELO {n}", str(n)) for n in range(3) for tipo in PRODUTOS for cor in CORES]
+
+    texto, nivel = resumir(itens, orcamento)
+
+    assert nivel == 4
+    assert "não detalhados" in texto.splitlines()[-1]
+
+
+def test_contexto_usa_o_orcamento_pedido():
+    itens = [item(f"{tipo} {cor}", "1") for tipo in PRODUTOS for cor in CORES]
+
+    contexto = montar_contexto_demanda({"finalidade": "Reposição de estoque"}, itens, orcamento_itens=100)
+
+    assert contexto.startswith("Contexto de uma demanda de aquisição/contratação do DETRAN-MT.\nFinalidade geral: 'Reposição de estoque'.\n")
+    assert "não detalhados" in contexto
+
+
+# ---------------- _somar_quantidades ----------------
+
+@pytest.mark.parametrize("quantidades, esperado", [
+    (["1.000", "500"], "1500"),          # ponto é separador de milhar
+    (["2,5", "1"], "3,5"),               # vírgula é a decimal
+    ([" 10 ", "1.000.000"], "1000010"),
+])
+def test_somar_quantidades(quantidades, esperado):
+    assert _somar_quantidades([{"qtd": qtd} for qtd in quantidades]) == esperado
+
+
+@pytest.mark.parametrize("quantidades, esperado", [
+    (["10", "uma caixa"], "10, uma caixa"),
+    (["10", ""], "10, "),
+])
+def test_somar_quantidades_nao_numericas_sao_listadas(quantidades, esperado):
+    assert _somar_quantidades([{"qtd": qtd} for qtd in quantidades]) == esperado
+
+
+def test_somar_quantidades_sem_o_campo():
+    assert _somar_quantidades([{"qtd": "3"}, {}]) == "3, "
+
+
+# ---------------- _ler_secoes ----------------
+
+SECOES = ["descricao", "objetivo"]
+
+
+@pytest.mark.parametrize("resposta, esperado", [
+    ('{"descricao": " Texto A. ", "objetivo": "Texto B."}', {"descricao": "Texto A.", "objetivo": "Texto B."}),
+    ('Aqui está: {"descricao": "A", "objetivo": "B", "extra": "C"} Fim.', {"descricao": "A", "objetivo": "B"}),
+    ('{"descricao": "A"}', {"descricao": "A"}),                      # seção ausente
+    ('{"descricao": "A", "objetivo": "   "}', {"descricao": "A"}),     # seção vazia
+    ('{"descricao": 3, "objetivo": ["B"]}', {}),                       # valores que não são texto
+    ('{"descricao": null, "objetivo": {"texto": "B"}}', {}),
+    ('{"descricao": "A", "objetivo": "B"', {}),                        # JSON cortado
+    ('{"descricao": "A", "objetivo": B}', {}),                         # JSON inválido
+    ('["A", "B"]', {}),
+    ('[ERRO DE TEMPO LIMITE DA IA]', {}),
+    ('', {}),
+])
+def test_ler_secoes(resposta, esperado):
+    assert _ler_secoes(resposta, SECOES) == esperado
+
+
+# ---------------- Modo "json" contra o BackendFalso ----------------
+
+DADOS = {"finalidade": "Reposição do material de expediente das unidades"}
+ITENS = [item("CANETA ESFEROGRÁFICA AZUL", "1.000"), item("PAPEL A4, RESMA 500 FOLHAS", "50")]
+TIPOS = list(TITULOS_SECOES) + ["equipe"]
+SECOES_DO_MODELO = [tipo for tipo in TIPOS if tipo not in TEXTOS_FIXOS]
+
+
+class BackendContado(BackendFalso):
+    """BackendFalso que conta as chamadas; `resposta_json` substitui a resposta das chamadas em JSON."""
+
+    def __init__(self):
+        super().__init__(tokens_por_segundo=0, latencia=0)
+        self.chamadas_json = 0
+        self.chamadas_secao = 0
+        self.resposta_json = None
+
+    def gerar_stream(self, prompt, modelo, opcoes, keep_alive=None, timeout=120, metricas=None, formato=None):
+        if formato is None:
+            self.chamadas_secao += 1
+        else:
+            self.chamadas_json += 1
+            if self.resposta_json is not None:
+                yield self.resposta_json
+                return
+        yield from super().gerar_stream(prompt, modelo, opcoes, keep_alive, timeout, metricas, formato)
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "ESCALONADOR_IA", False)
+    monkeypatch.setattr(cache_ia, "_cache", cache_ia.CacheIA(tmp_path / "cache_ia.sqlite3", ttl=3600, max_bytes=1024 * 1024))
+    contado = BackendContado()
+    definir_backend(contado)
+    yield contado
+    definir_backend(None)
+
+
+def gerar_em_streaming(**kwargs):
+    return {tipo: "".join(fluxo) for tipo, fluxo in gerar_textos_ia_stream(DADOS, ITENS, TIPOS, **kwargs).items()}
+
+
+def test_modo_json_gera_as_secoes_em_uma_chamada(backend):
+    textos = gerar_textos_ia(DADOS, ITENS, TIPOS, modo="json")
+
+    assert list(textos) == TIPOS
+    assert textos["equipe"] == TEXTOS_FIXOS["equipe"]
+    assert all(textos[tipo] and not textos[tipo].startswith("[") for tipo in SECOES_DO_MODELO)
+    assert (backend.chamadas_json, backend.chamadas_secao) == (1, 0)
+
+
+def test_modo_secoes_faz_uma_chamada_por_secao(backend):
+    gerar_textos_ia(DADOS, ITENS, TIPOS, modo="secoes")
+
+    assert (backend.chamadas_json, backend.chamadas_secao) == (0, len(SECOES_DO_MODELO))
+
+
+def test_modo_json_em_streaming_da_os_mesmos_textos(backend):
+    textos = gerar_textos_ia(DADOS, ITENS, TIPOS, modo="json", usar_cache=False)
+
+    assert gerar_em_streaming(modo="json", usar_cache=False) == textos
+    assert (backend.chamadas_json, backend.chamadas_secao) == (2, 0)
+
+
+@pytest.mark.parametrize("resposta", [
+    '{"descricao": "Texto da descrição.", "objetivo": "Texto',          # cortada
+    'O modelo respondeu sem JSON.',
+    '{"descricao": 1, "justificativa": [], "objetivo": null, "planejamento": {}}',
+    '[ERRO DE TEMPO LIMITE DA IA]',
+])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_resposta_json_invalida_volta_as_chamadas_por_secao(backend, resposta, streaming):
+    backend.resposta_json = resposta
+
+    textos = gerar_em_streaming(modo="json") if streaming else gerar_textos_ia(DADOS, ITENS, TIPOS, modo="json")
+
+    assert all(textos[tipo] and not textos[tipo].startswith("[") for tipo in SECOES_DO_MODELO)
+    assert (backend.chamadas_json, backend.chamadas_secao) == (1, len(SECOES_DO_MODELO))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_resposta_json_parcial_usa_as_secoes_validas(backend, streaming):
+    backend.resposta_json = '{"descricao": "Texto da descrição.", "objetivo": 3}'
+
+    textos = gerar_em_streaming(modo="json") if streaming else gerar_textos_ia(DADOS, ITENS, TIPOS, modo="json")
+
+    assert textos["descricao"] == "Texto da descrição."
+    assert (backend.chamadas_json, backend.chamadas_secao) == (1, len(SECOES_DO_MODELO) - 1)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_so_a_resposta_json_completa_fica_no_cache(backend, streaming):
+    gerar = (lambda: gerar_em_streaming(modo="json")) if streaming else (lambda: gerar_textos_ia(DADOS, ITENS, TIPOS, modo="json"))
+
+    backend.resposta_json = '{"descricao": "Texto da descrição."}'
+    gerar()
+    backend.resposta_json = None
+    completos = gerar()    # a resposta incompleta não ficou no cache: pede de novo
+    assert gerar() == completos
+
+    assert backend.chamadas_json == 2
@@ -0,0 +1,263 @@
+# test_siag_http.py
+# Testes do cliente HTTP do SIAG (siag_http) contra páginas JSF gravadas.
+#
+# As páginas ficam em fixtures/siag/ e são servidas por um http.server local que
+# faz o papel do SGC: cada POST só é aceito com o ViewState de uma página já
+# entregue (como no servidor real, que responde ViewExpiredException), e a página
+# devolvida depende desse ViewState. Assim os testes verificam que o cliente
+# devolve o estado da tela a cada ação e aciona os links de paginação do jeito
+# que o navegador faria, nos dois estilos de commandLink:
+#
+#   - MyFaces: oamSubmitForm(form, id), com o id do link no campo oculto <form>:_idcl;
+#   - JSF RI: jsfcljs(form, {'id': 'id', ...}, ''), com os parâmetros no onclick.
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+import pytest
+
+# Pasta do DFD no path para importar o módulo testado
+PASTA_APP = str(Path(__file__).resolve().parent.parent)
+if PASTA_APP not in sys.path:
+    sys.path.insert(0, PASTA_APP)
+
+import siag_http
+from siag_http import ClienteSIAG, ErroBuscaSIAG, ler_resultados
+
+PASTA_FIXTURES = Path(__file__).resolve().parent / "fixtures" / "siag"
+
+CAMINHO_PESQUISA = "/sgc/faces/pub/sgc/central/ItemCompraPageList.jsp"
+FORM = "form_PesquisaItemPageList"
+VIEWSTATE = "javax.faces.ViewState"
+
+VS_INICIAL = "H4sIAAAAAAAAAK1W-inicial"
+VS_MYFACES_1 = "H4sIAAAAAAAAAK1W-myfaces-1"
+VS_JSFRI_1 = "j_id3:j_id4"
+
+LINK_PROXIMA_MYFACES = f"{FORM}:editalDataTable:scroll_1next"
+LINK_PROXIMA_JSFRI = f"{FORM}:editalDataTable:j_id45"
+
+ITENS_PAGINA_1 = [
+    {"codigo": "000123456", "descricao": "CANETA ESFEROGRÁFICA, TINTA AZUL, PONTA MÉDIA"},
+    {"codigo": "000123457", "descricao": "CANETA ESFEROGRÁFICA, TINTA PRETA, PONTA FINA"},
+]
+ITENS_PAGINA_2 = [{"codigo": "000123999", "descricao": "CANETA MARCA-TEXTO, COR AMARELA"}]
+
+
+def fixture(nome: str) -> bytes:
+    return (PASTA_FIXTURES / nome).read_bytes()
+
+
+class ServidorSIAG:
+    """
+    SGC de mentira: `paginas` liga o ViewState recebido (None no GET) ao arquivo
+    devolvido; ViewState desconhecido recebe o erro 500 do JSF.
+    """
+
+    def __init__(self):
+        self.paginas = {}
+        self.pedidos = []   # (método, caminho, [(campo, valor)])
+        self.status = 200
+        self.atraso = 0.0
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, campos):
+                servidor.pedidos.append((self.command, self.path, campos))
+                if servidor.atraso:
+                    time.sleep(servidor.atraso)
+                nome = servidor.paginas.get(dict(campos).get(VIEWSTATE) if self.command == "POST" else None)
+                if servidor.status != 200 or nome is None:
+                    corpo = b"<html><body>javax.faces.application.ViewExpiredException</body></html>"
+                    status = servidor.status if servidor.status != 200 else 500
+                else:
+                    corpo, status = fixture(nome), 200
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")  # sem charset: vale o <meta> da página
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def do_GET(self):
+                self._responder([])
+
+            def do_POST(self):
+                corpo = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                self._responder(parse_qsl(corpo, keep_blank_values=True))
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self._http.server_port}{CAMINHO_PESQUISA}"
+        self._thread = threading.Thread(target=self._http.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def posts(self):
+        return [dict(campos) for metodo, _, campos in self.pedidos if metodo == "POST"]
+
+    def encerrar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorSIAG()
+    servidor.paginas[None] = "pesquisa_inicial.html"
+    yield servidor
+    servidor.encerrar()
+
+
+@pytest.fixture
+def cliente(servidor):
+    return ClienteSIAG(servidor.url, tempo_limite=5)
+
+
+# ---------------- Leitura das páginas ----------------
+
+def test_ler_resultados_ignora_cabecalho_e_normaliza_espacos():
+    assert ler_resultados(fixture("myfaces_pagina1.html")) == ITENS_PAGINA_1
+
+
+def test_ler_resultados_sem_tabela_ou_sem_registros():
+    assert ler_resultados(fixture("pesquisa_inicial.html")) == []
+    assert ler_resultados(fixture("resultados_vazios.html")) == []
+
+
+def test_proxima_pagina_nos_dois_estilos():
+    for nome, esperado in (
+        ("myfaces_pagina1.html", LINK_PROXIMA_MYFACES),
+        ("jsfri_pagina1.html", LINK_PROXIMA_JSFRI),
+        ("myfaces_pagina2.html", None),
+        ("jsfri_pagina2.html", None),
+    ):
+        documento = siag_http._documento(fixture(nome), "http://siag.local/")
+        proxima = siag_http._proxima_pagina(siag_http._por_id(documento, FORM))
+        assert (proxima.get("id") if proxima is not None else None) == esperado, nome
+
+
+# ---------------- Pesquisa e ViewState ----------------
+
+def test_pesquisa_envia_formulario_com_viewstate_da_pagina(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "resultados_vazios.html"
+
+    cliente.pesquisar("caneta")
+
+    (metodo_get, caminho_get, _), (metodo_post, caminho_post, campos) = servidor.pedidos
+    assert (metodo_get, metodo_post) == ("GET", "POST")
+    assert caminho_post == CAMINHO_PESQUISA  # action do formulário
+    enviados = dict(campos)
+    assert enviados[VIEWSTATE] == VS_INICIAL
+    assert enviados[f"{FORM}:palavraChaveInput"] == "caneta"
+    assert enviados[f"{FORM}:pesquisarButton"] == "Pesquisar"
+    assert enviados[f"{FORM}_SUBMIT"] == "1"
+    # Só o botão clicado vai no POST, e a opção marcada na página é trocada pela pedida
+    assert f"{FORM}:limparButton" not in enviados
+    assert f"{FORM}:situacaoCombo" not in enviados  # campo desabilitado
+    assert [valor for nome, valor in campos if nome == f"{FORM}:procurarPorCombo"] == ["2"]
+
+
+def test_pesquisa_por_codigo_marca_a_opcao_codigo(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "resultados_vazios.html"
+
+    cliente.pesquisar("000123456", por_codigo=True)
+
+    assert servidor.posts()[0][f"{FORM}:procurarPorCombo"] == "0"
+
+
+def test_pesquisa_sem_resultados(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "resultados_vazios.html"
+
+    assert cliente.pesquisar("inexistente") == []
+    assert len(servidor.posts()) == 1
+
+
+# ---------------- Paginação ----------------
+
+def test_paginacao_myfaces(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "myfaces_pagina1.html"
+    servidor.paginas[VS_MYFACES_1] = "myfaces_pagina2.html"
+
+    assert cliente.pesquisar("caneta") == ITENS_PAGINA_1 + ITENS_PAGINA_2
+
+    pesquisa, proxima = servidor.posts()
+    assert proxima[VIEWSTATE] == VS_MYFACES_1
+    assert proxima[f"{FORM}:_idcl"] == LINK_PROXIMA_MYFACES
+    assert proxima[LINK_PROXIMA_MYFACES] == LINK_PROXIMA_MYFACES
+    assert f"{FORM}:pesquisarButton" not in proxima
+    # O formulário devolvido já vem com o termo e a opção da pesquisa
+    assert proxima[f"{FORM}:palavraChaveInput"] == "caneta"
+    assert proxima[f"{FORM}:procurarPorCombo"] == "2"
+
+
+def test_paginacao_jsf_ri(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "jsfri_pagina1.html"
+    servidor.paginas[VS_JSFRI_1] = "jsfri_pagina2.html"
+
+    assert cliente.pesquisar("caneta") == ITENS_PAGINA_1 + ITENS_PAGINA_2
+
+    pesquisa, proxima = servidor.posts()
+    assert proxima[VIEWSTATE] == VS_JSFRI_1
+    assert proxima[LINK_PROXIMA_JSFRI] == LINK_PROXIMA_JSFRI
+    assert proxima["pagina"] == "2"
+    assert proxima[FORM] == FORM
+    assert f"{FORM}:_idcl" not in proxima
+
+
+def test_paginacao_para_quando_o_servidor_repete_a_pagina(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "myfaces_pagina1.html"
+    servidor.paginas[VS_MYFACES_1] = "myfaces_pagina1.html"
+
+    assert cliente.pesquisar("caneta") == ITENS_PAGINA_1
+    assert len(servidor.posts()) == 2
+
+
+def test_paginacao_respeita_max_paginas(servidor):
+    servidor.paginas[VS_INICIAL] = "myfaces_pagina1.html"
+    servidor.paginas[VS_MYFACES_1] = "myfaces_pagina2.html"
+
+    assert ClienteSIAG(servidor.url, tempo_limite=5, max_paginas=1).pesquisar("caneta") == ITENS_PAGINA_1
+    assert len(servidor.posts()) == 1
+
+
+# ---------------- Falhas ----------------
+
+def test_erro_http(servidor, cliente):
+    servidor.status = 503
+    with pytest.raises(ErroBuscaSIAG, match="erro durante a busca"):
+        cliente.pesquisar("caneta")
+
+
+def test_viewstate_expirado_na_paginacao(servidor, cliente):
+    servidor.paginas[VS_INICIAL] = "myfaces_pagina1.html"  # a página 2 não é servida: 500
+    with pytest.raises(ErroBuscaSIAG, match="500"):
+        cliente.pesquisar("caneta")
+
+
+def test_tempo_limite(servidor):
+    servidor.atraso = 1.0
+    with pytest.raises(ErroBuscaSIAG, match="Tempo limite"):
+        ClienteSIAG(servidor.url, tempo_limite=0.2).pesquisar("caneta")
+
+
+def test_servidor_fora_do_ar(servidor):
+    url = servidor.url
+    servidor.encerrar()
+    with pytest.raises(ErroBuscaSIAG, match="erro durante a busca"):
+        ClienteSIAG(url, tempo_limite=2).pesquisar("caneta")
+
+
+def test_pagina_sem_formulario(servidor, cliente):
+    servidor.paginas[None] = "manutencao.html"
+    with pytest.raises(ErroBuscaSIAG, match="formulário de pesquisa"):
+        cliente.pesquisar("caneta")
+
+
+def test_formulario_sem_campo_de_busca(servidor, cliente):
+    servidor.paginas[None] = "sem_campo_busca.html"
+    with pytest.raises(ErroBuscaSIAG, match="campo de busca"):
+        cliente.pesquisar("caneta")
@@ -0,0 +1,316 @@
+# test_siag_navegador.py
+# Testes da busca no SIAG pelo navegador (siag_navegador), sem Chrome.
+#
+# NavegadorFalso faz o papel do WebDriver: carrega a réplica local da pesquisa
+# (static/siag/ItemCompraPageList.html) e reproduz o script dela em Python. O clique
+# em Pesquisar redesenha a tabela de resultados depois de um atraso, trocando o
+# elemento da tabela (o antigo fica obsoleto, como no navegador), ou escreve a
+# mensagem de "nenhum registro". Assim os testes verificam que pesquisar() espera a
+# resposta da pesquisa atual em vez de ler a tabela da pesquisa anterior.
+#
+# O pool (PoolNavegadores) recebe o mesmo NavegadorFalso pela função `criar`.
+import copy
+import re
+import sys
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import pytest
+from lxml import etree, html as lxml_html
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+# Pasta do DFD no path para importar o módulo testado
+PASTA_APP = Path(__file__).resolve().parent.parent
+if str(PASTA_APP) not in sys.path:
+    sys.path.insert(0, str(PASTA_APP))
+
+import siag_navegador
+from siag_http import ErroBuscaSIAG, ler_resultados
+from siag_navegador import ID_BOTAO_PESQUISAR, ID_CAMPO_BUSCA, ID_TABELA_RESULTADOS, PoolNavegadores, pesquisar
+
+REPLICA = PASTA_APP / "static" / "siag" / "ItemCompraPageList.html"
+URL_REPLICA = REPLICA.as_uri()
+ITENS_REPLICA = re.findall(r'\["([^"]*)", "([^"]*)"\]', REPLICA.read_text(encoding="utf-8"))
+
+
+def _sem_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c)).lower()
+
+
+class ElementoFalso:
+    def __init__(self, navegador: "NavegadorFalso", no):
+        self._navegador = navegador
+        self._no = no
+
+    def _verificar(self) -> None:
+        raiz = self._no
+        while raiz.getparent() is not None:
+            raiz = raiz.getparent()
+        if raiz is not self._navegador.documento:
+            raise StaleElementReferenceException("elemento fora da página")
+
+    def is_displayed(self) -> bool:
+        self._verificar()
+        return True
+
+    def is_enabled(self) -> bool:
+        self._verificar()
+        return True
+
+    def click(self) -> None:
+        self._verificar()
+        if self._no.get("id") == ID_BOTAO_PESQUISAR:
+            self._navegador.cliques += 1
+            self._navegador._responder(self._navegador.documento.get_element_by_id(ID_CAMPO_BUSCA).get("value", ""))
+        elif self._no.get("type") == "radio":
+            for opcao in self._navegador.documento.xpath("//input[@name=$nome]", nome=self._no.get("name")):
+                opcao.attrib.pop("checked", None)
+            self._no.set("checked", "checked")
+
+    def clear(self) -> None:
+        self._verificar()
+        self._no.set("value", "")
+
+    def send_keys(self, texto: str) -> None:
+        self._verificar()
+        self._no.set("value", self._no.get("value", "") + texto)
+
+    @property
+    def text(self) -> str:
+        self._verificar()
+        with self._navegador.lock:
+            no = copy.deepcopy(self._no)
+        etree.strip_elements(no, "script", with_tail=False)
+        return no.text_content()
+
+
+class NavegadorFalso:
+    """
+    WebDriver de mentira com a réplica da pesquisa do SGC. `atraso` é o tempo até a
+    resposta da pesquisa (None: nunca responde); `vivo=False` simula um Chrome que caiu.
+    """
+
+    def __init__(self, atraso=0.05):
+        self.atraso = atraso
+        self.vivo = True
+        self.fechado = False
+        self.urls = []
+        self.cliques = 0
+        self.lock = threading.Lock()
+        self.documento = None
+
+    # ---------------- WebDriver ----------------
+
+    def get(self, url: str) -> None:
+        self._exigir_vivo()
+        self.urls.append(url)
+        with self.lock:
+            self.documento = lxml_html.fromstring(REPLICA.read_bytes())
+
+    def find_element(self, por: str, valor: str) -> ElementoFalso:
+        elementos = self.find_elements(por, valor)
+        if not elementos:
+            raise NoSuchElementException(valor)
+        return elementos[0]
+
+    def find_elements(self, por: str, valor: str):
+        self._exigir_vivo()
+        with self.lock:
+            if por == By.ID:
+                nos = self.documento.xpath("//*[@id=$id]", id=valor)
+            elif por == By.TAG_NAME:
+                nos = list(self.documento.iter(valor))
+            else:
+                raise NotImplementedError(por)
+        return [ElementoFalso(self, no) for no in nos]
+
+    @property
+    def page_source(self) -> str:
+        with self.lock:
+            return lxml_html.tostring(self.documento, encoding="unicode")
+
+    def execute_script(self, script: str):
+        self._exigir_vivo()
+        return 1
+
+    def quit(self) -> None:
+        self.fechado = True
+
+    # ---------------- Réplica ----------------
+
+    def _exigir_vivo(self) -> None:
+        if not self.vivo:
+            raise WebDriverException("chrome not reachable")
+
+    def _responder(self, termo: str) -> None:
+        if self.atraso is None:
+            return
+        documento = self.documento
+        threading.Timer(self.atraso, self._redesenhar, args=(documento, termo)).start()
+
+    def _redesenhar(self, documento, termo: str) -> None:
+        palavras = _sem_acentos(termo).split()
+        encontrados = [item for item in ITENS_REPLICA if all(p in _sem_acentos(item[1]) for p in palavras)]
+        with self.lock:
+            resultado = documento.get_element_by_id("resultado")
+            for filho in list(resultado):
+                resultado.remove(filho)
+            resultado.text = None
+            if not encontrados:
+                resultado.text = "Nenhum registro encontrado."
+                return
+            tabela = etree.SubElement(resultado, "table", id=ID_TABELA_RESULTADOS)
+            cabecalho = etree.SubElement(tabela, "tr")
+            for titulo in ("Código", "Descrição"):
+                etree.SubElement(cabecalho, "th").text = titulo
+            for codigo, descricao in encontrados:
+                linha = etree.SubElement(tabela, "tr")
+                etree.SubElement(linha, "td").text = codigo
+                etree.SubElement(linha, "td").text = descricao
+
+
+def itens_da_replica(*codigos):
+    return [{"codigo": codigo, "descricao": descricao} for codigo, descricao in ITENS_REPLICA if codigo in codigos]
+
+
+# ---------------- pesquisar ----------------
+
+def test_pesquisa_espera_a_tabela_ser_desenhada():
+    navegador = NavegadorFalso(atraso=0.3)
+
+    inicio = time.perf_counter()
+    html = pesquisar(navegador, "caneta", url=URL_REPLICA, tempo_limite=5)
+
+    assert time.perf_counter() - inicio >= 0.3
+    assert navegador.urls == [URL_REPLICA]
+    assert ler_resultados(html) == itens_da_replica("100200", "100201")
+
+
+def test_pesquisa_com_pagina_carregada_nao_le_a_tabela_anterior():
+    navegador = NavegadorFalso(atraso=0.2)
+    pesquisar(navegador, "caneta", url=URL_REPLICA, tempo_limite=5)
+
+    # A tabela da busca anterior continua na página até a resposta chegar
+    html = pesquisar(navegador, "papel", url=URL_REPLICA, tempo_limite=5, pagina_carregada=True)
+
+    assert navegador.urls == [URL_REPLICA]
+    assert ler_resultados(html) == itens_da_replica("300")
+
+
+def test_pesquisa_sem_resultados_espera_a_mensagem():
+    navegador = NavegadorFalso(atraso=0.2)
+
+    html = pesquisar(navegador, "inexistente", url=URL_REPLICA, tempo_limite=5)
+
+    assert "Nenhum registro encontrado." in html
+    assert ler_resultados(html) == []
+
+
+def test_pesquisa_sem_resposta_estoura_o_tempo_limite():
+    navegador = NavegadorFalso(atraso=None)
+    with pytest.raises(TimeoutException):
+        pesquisar(navegador, "caneta", url=URL_REPLICA, tempo_limite=0.3)
+
+
+# ---------------- PoolNavegadores ----------------
+
+@pytest.fixture
+def criados():
+    return []
+
+
+@pytest.fixture
+def pool_de(criados):
+    pools = []
+
+    def criar_pool(tamanho=1, max_usos=10, tempo_limite=2):
+        def criar():
+            navegador = NavegadorFalso()
+            criados.append(navegador)
+            return navegador
+
+        pool = PoolNavegadores(tamanho, max_usos, url=URL_REPLICA, tempo_limite=tempo_limite, criar=criar)
+        pools.append(pool)
+        return pool
+
+    yield criar_pool
+    for pool in pools:
+        pool.fechar()
+
+
+def test_pool_reaproveita_e_preaquece_o_navegador(pool_de, criados):
+    pool = pool_de()
+
+    with pool.emprestar() as navegador:
+        assert not navegador.pronto
+    with pool.emprestar() as navegador:
+        # Ao ser devolvido, o navegador já carregou a página de pesquisa de novo
+        assert navegador.pronto
+        assert navegador.driver.urls == [URL_REPLICA]
+
+    assert len(criados) == 1
+    assert pool.estatisticas() == {"abertos": 1, "livres": 1}
+
+
+def test_pool_recicla_apos_max_usos(pool_de, criados):
+    pool = pool_de(max_usos=2)
+
+    drivers = []
+    for _ in range(3):
+        with pool.emprestar() as navegador:
+            drivers.append(navegador.driver)
+
+    assert drivers[0] is drivers[1] is criados[0]
+    assert drivers[2] is criados[1]
+    assert criados[0].fechado and not criados[1].fechado
+    assert pool.estatisticas() == {"abertos": 1, "livres": 1}
+
+
+def test_pool_descarta_navegador_que_caiu(pool_de, criados):
+    pool = pool_de()
+    with pool.emprestar():
+        pass
+    criados[0].vivo = False
+
+    with pool.emprestar() as navegador:
+        assert navegador.driver is criados[1]
+        assert not navegador.pronto
+
+    assert criados[0].fechado
+    assert pool.estatisticas() == {"abertos": 1, "livres": 1}
+
+
+def test_pool_descarta_navegador_de_busca_que_falhou(pool_de, criados):
+    pool = pool_de()
+    with pytest.raises(RuntimeError):
+        with pool.emprestar():
+            raise RuntimeError("falha na busca")
+
+    assert criados[0].fechado
+    assert pool.estatisticas() == {"abertos": 0, "livres": 0}
+
+
+def test_pool_ocupado_estoura_o_tempo_limite(pool_de):
+    pool = pool_de(tamanho=1, tempo_limite=0.2)
+
+    with pool.emprestar():
+        inicio = time.perf_counter()
+        with pytest.raises(ErroBuscaSIAG, match="Todos os navegadores estão ocupados"):
+            with pool.emprestar():
+                pass
+        assert time.perf_counter() - inicio >= 0.2
+
+    with pool.emprestar():  # a vaga volta quando a busca termina
+        pass
+
+
+def test_buscar_siag_online_usa_o_pool(monkeypatch, pool_de, criados):
+    monkeypatch.setattr(siag_navegador, "_pool", pool_de())
+
+    assert siag_navegador.buscar_siag_online("gel condutor") == itens_da_replica("6507276800001")
+    assert siag_navegador.buscar_siag_online("caneta azul") == itens_da_replica("100200")
+    assert len(criados) == 1
+    assert criados[0].cliques == 2
@@ -1,16 +1,30 @@
 # app.py
 
 import streamlit as st
-from gerar_etp import gerar_etp_completo
+from gerar_etp import executar_job_etp
+from gerar_ia_etp import TITULOS_SECOES
 from datetime import datetime
 import os
-from docx import Document
-import io
+import sys
 from pathlib import Path
 
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum.catalogo import documentos_para_selecao
+from comum.extrator_docx import extrair_dfd
+from comum.fila_jobs import obter_fila
+from comum.ui_jobs import lembrar_job, painel_job, usuario_atual
+
 # ========= ESTILO VISUAL =========
 st.set_page_config(layout="wide", page_title="Gerador de ETP - DETRAN-MT")
 
+# A geração do documento roda na fila (comum.fila_jobs), fora da execução do script
+fila = obter_fila()
+fila.registrar("etp", executar_job_etp)
+
 st.markdown("""
     <style>
         .stApp { background-color: #0a2540 !important; }
@@ -32,12 +46,10 @@ st.markdown("---")
 def extract_data_from_dfd(doc_file_content):
     """
     Extrai dados de MÚLTIPLAS tabelas: uma para dados gerais e outra para a lista de itens.
+
+    A leitura é feita em uma única passada pelo XML do documento (comum.extrator_docx).
     """
     try:
-        doc = Document(io.BytesIO(doc_file_content))
-        items_list = []
-        general_data = {}
-
         # Mapeia os rótulos da tabela do DFD para as chaves do session_state
         # Adicionando variações para garantir a captura
         labels_map = {
@@ -49,55 +61,7 @@ def extract_data_from_dfd(doc_file_content):
             "fonte": "fonte"
         }
 
-        for table in doc.tables:
-            # --- LÓGICA PARA EXTRAIR DADOS GERAIS DA TABELA DE ORÇAMENTO ---
-            # Itera nas linhas da tabela, que contêm pares de chave/valor
-            for row in table.rows:
-                if len(row.cells) >= 2:
-                    # Processa o primeiro par de células (ex: Programa | 036)
-                    label_1 = row.cells[0].text.replace(":", "").strip()
-                    clean_label_1 = "".join(label_1.lower().split())
-                    if clean_label_1 in labels_map:
-                        key = labels_map[clean_label_1]
-                        general_data[key] = row.cells[1].text.strip()
-
-                    # Processa o segundo par de células se a linha tiver 4 células
-                    if len(row.cells) >= 4:
-                        label_2 = row.cells[2].text.replace(":", "").strip()
-                        clean_label_2 = "".join(label_2.lower().split())
-                        if clean_label_2 in labels_map:
-                            key = labels_map[clean_label_2]
-                            general_data[key] = row.cells[3].text.strip()
-
-            # --- LÓGICA PARA EXTRAIR A LISTA DE ITENS DA TABELA DE ITENS ---
-            header_row_index = -1
-            for i, row in enumerate(table.rows):
-                row_text = " ".join([cell.text.strip().upper() for cell in row.cells])
-                if "SIAGO/TCE" in row_text and "UN." in row_text and "QTDE" in row_text and "ESPECIFICAÇÃO DO PRODUTO" in row_text:
-                    header_row_index = i
-                    break
-            
-            if header_row_index != -1:
-                header_row = table.rows[header_row_index]
-                header_texts = [cell.text.strip().upper() for cell in header_row.cells]
-                
-                catmat_idx, desc_idx, un_idx, qtd_idx = -1, -1, -1, -1
-                
-                for i, text in enumerate(header_texts):
-                    if "SIAGO/TCE" in text: catmat_idx = i
-                    elif "ESPECIFICAÇÃO" in text or "PRODUTO" in text: desc_idx = i
-                    elif "UN." in text: un_idx = i
-                    elif "QTDE" in text: qtd_idx = i
-
-                if desc_idx != -1 and un_idx != -1 and qtd_idx != -1:
-                    # Limpa a lista de itens para garantir que estamos pegando da tabela correta
-                    items_list.clear()
-                    for row in table.rows[header_row_index + 1:]:
-                        cells = row.cells
-                        if len(cells) > max(catmat_idx, desc_idx, un_idx, qtd_idx):
-                            item_data = { "catmat": cells[catmat_idx].text.strip() if catmat_idx != -1 else "", "descricao": cells[desc_idx].text.strip(), "unidade": cells[un_idx].text.strip(), "qtd": cells[qtd_idx].text.strip(), "valor_unitario": "" }
-                            if item_data["descricao"].strip(): items_list.append(item_data)
-        
+        items_list, general_data = extrair_dfd(doc_file_content, labels_map)
         return items_list, general_data
     except Exception as e:
         st.error(f"❌ Erro ao ler o documento: '{e}'")
@@ -120,14 +84,17 @@ st.markdown("---")
 st.markdown("<h3 class='white-text'>Importar Dados do DFD</h3>", unsafe_allow_html=True)
 st.markdown("<p class='white-text'>Selecione um DFD (.docx) para importar a lista de itens e os dados de orçamento.</p>", unsafe_allow_html=True)
 
-DFD_FOLDER = Path(r"C:\Users\pedrosilva\Desktop\PROJETO IA DETRAN\DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA\static\arquivos_gerados")
-DFD_FILE_LIST = [f.name for f in DFD_FOLDER.glob("*.docx")] if DFD_FOLDER.exists() else []
+# DFDs registrados no catálogo (comum.catalogo), do mais novo ao mais antigo
+DFD_DOCUMENTOS = documentos_para_selecao("dfd")
 
-if DFD_FILE_LIST:
-    selected_file = st.selectbox("Selecione um arquivo DFD:", DFD_FILE_LIST, index=0, key="selected_dfd_file")
+if DFD_DOCUMENTOS:
+    selected_file = st.selectbox(
+        "Selecione um arquivo DFD:", list(DFD_DOCUMENTOS), index=0, key="selected_dfd_file",
+        format_func=lambda caminho: DFD_DOCUMENTOS.get(caminho, Path(caminho).name),
+    )
 
     if st.button("✅ Carregar dados do DFD"):
-        file_path = DFD_FOLDER / selected_file
+        file_path = Path(selected_file)
         try:
             with open(file_path, "rb") as f:
                 imported_items, imported_data = extract_data_from_dfd(f.read())
@@ -216,6 +183,7 @@ with st.form("form_etp"):
     elaborador_matricula = st.text_input("Matrícula do Elaborador", value="XXXXXX")
     data_final = st.date_input("Data de Término", value=datetime.now().date())
     
+    regenerar_ia = st.checkbox("🔄 Regenerar textos da IA (ignorar respostas já geradas)", value=False)
     gerar_etp_button = st.form_submit_button("📥 Gerar ETP Completo", type="primary")
 
 # ====== PROCESSAMENTO E GERAÇÃO DO ETP ========
@@ -240,21 +208,30 @@ if gerar_etp_button:
     if not st.session_state.lista_de_itens_etp:
         st.error("❌ Por favor, adicione ao menos um item à tabela do ETP.")
         st.stop()
-        
-    with st.spinner("Gerando documentos com apoio da IA..."):
-        try:
-            caminho_docx, dados_json = gerar_etp_completo(dados_gerais, st.session_state.lista_de_itens_etp)
 
-            if caminho_docx and os.path.exists(caminho_docx):
-                st.success("✅ Documentos gerados com sucesso!")
-                col1, col2 = st.columns(2)
-                with col1:
-                    with open(caminho_docx, "rb") as f:
-                        st.download_button("📥 Baixar ETP (.docx)", f, file_name=os.path.basename(caminho_docx), mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
-                with col2:
-                    st.download_button("📄 Baixar Dados (.json)", data=dados_json, file_name=os.path.basename(caminho_docx).replace(".docx", "_DATA.json"), mime="application/json", use_container_width=True)
-            else:
-                st.error("❌ O arquivo não foi gerado ou o caminho retornado é inválido.")
-        except Exception as e:
-            st.error(f"❌ Erro ao gerar o documento ETP. Detalhes: {e}")
-            st.exception(e)
\ No newline at end of file
+    # O documento é gerado em segundo plano; os textos da IA aparecem no painel
+    # abaixo conforme ficam prontos, mesmo que a página seja recarregada.
+    job_id = fila.enviar("etp", {
+        "dados_gerais": dados_gerais,
+        "lista_de_itens": st.session_state.lista_de_itens_etp,
+        "usar_cache": not regenerar_ia,
+    }, usuario=usuario_atual())
+    lembrar_job("etp", job_id)
+
+def mostrar_downloads(resultado):
+    caminho_docx = resultado.get("docx")
+    caminho_json = resultado.get("json")
+    if caminho_docx and os.path.exists(caminho_docx):
+        st.success("✅ Documentos gerados com sucesso!")
+        col1, col2 = st.columns(2)
+        with col1:
+            with open(caminho_docx, "rb") as f:
+                st.download_button("📥 Baixar ETP (.docx)", f, file_name=os.path.basename(caminho_docx), mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
+        if caminho_json and os.path.exists(caminho_json):
+            with col2:
+                with open(caminho_json, "rb") as f:
+                    st.download_button("📄 Baixar Dados (.json)", data=f, file_name=os.path.basename(caminho_json), mime="application/json", use_container_width=True)
+    else:
+        st.error("❌ O arquivo não foi gerado ou o caminho retornado é inválido.")
+
+painel_job(fila, "etp", titulos=TITULOS_SECOES, ao_concluir=mostrar_downloads)
\ No newline at end of file
@@ -1,39 +1,72 @@
 # gerar_etp.py
-from docxtpl import DocxTemplate
 from datetime import datetime
-from gerar_ia_etp import (
-    gerar_justificativa_necessidade_ia,
-    gerar_analise_mercado_ia,
-    gerar_requisitos_tecnicos_ia,
-    gerar_resultados_pretendidos_ia,
-    gerar_impactos_ambientais_ia
-)
+import hashlib
+from gerar_ia_etp import entradas_ia, gerar_secoes_ia, gerar_secoes_ia_stream, secoes_reaproveitaveis, TITULOS_SECOES
+from comum.catalogo import obter_catalogo, registrar_documento
+from comum.instrumentacao import span_atual
+from comum.templates_docx import obter_template
 import os
 import json
+import uuid
 
-def gerar_etp_completo(dados_gerais, lista_de_itens):
+# ETPs mais recentes do catálogo examinados à procura do último gerado pelo mesmo usuário
+CANDIDATOS_REAPROVEITAMENTO = 50
+
+def identificar_autor(usuario):
+    """Identificação de quem gerou o ETP, salva no _DATA.json (hash, para não gravar o IP no documento)."""
+    return hashlib.sha256(str(usuario).encode("utf-8")).hexdigest()[:16] if usuario else None
+
+def textos_reaproveitaveis(dados_gerais, usuario=None):
+    """
+    Textos de IA do último ETP gerado por `usuario` (o _DATA.json mais recente dele no
+    catálogo) que podem ser reaproveitados: os das seções cujos campos de entrada e
+    prompt não mudaram desde então. Sem usuário (ex.: lote) nada é reaproveitado, para
+    não misturar textos de outras pessoas.
+    """
+    autor = identificar_autor(usuario)
+    if autor is None:
+        return {}
+    catalogo = obter_catalogo()
+    catalogo.sincronizar("etp")
+    for documento in catalogo.listar("etp", com_dados=True, limite=CANDIDATOS_REAPROVEITAMENTO):
+        anterior = catalogo.obter(documento["caminho"])
+        if anterior is not None and (anterior["dados"] or {}).get("gerado_por") == autor:
+            return secoes_reaproveitaveis(dados_gerais, anterior["dados"])
+    return {}
+
+def gerar_etp_completo(dados_gerais, lista_de_itens, max_paralelo=None, usar_cache=True, textos_ia=None, pasta_saida=None, reaproveitar=True, usuario=None):
     """
     Gera o Estudo Técnico Preliminar completo e um arquivo .json com os dados.
+
+    As seções de IA são geradas em paralelo; `max_paralelo` limita quantos prompts
+    vão ao Ollama ao mesmo tempo (None usa MAX_REQUISICOES_PARALELAS de gerar_ia_etp).
+    Com usar_cache=False os textos são gerados de novo mesmo que já estejam no cache.
+    Se `textos_ia` for informado (ex.: textos já exibidos em streaming na interface),
+    ele é usado no lugar de uma nova chamada ao modelo.
+    Com reaproveitar=True (e usar_cache=True), só as seções cujos campos mudaram desde
+    o último ETP gerado por `usuario` vão ao modelo; as demais usam o texto daquele ETP.
+    `usuario` também é salvo (como hash) no .json, para as próximas gerações dele.
+    Os arquivos são salvos na pasta do ETP, ou em `pasta_saida` se informada.
     
     Retorna:
         tuple: Uma tupla contendo o caminho para o arquivo .docx gerado (str)
                e os dados de contexto em formato de string JSON (str).
     """
-    caminho_template = r"C:\Users\pedrosilva\Desktop\PROJETO IA DETRAN\ETP - ESTUDO TÉCNICO PRELIMINAR\templates\template ETP.docx"
+    caminho_template = os.path.join(os.path.dirname(__file__), "templates", "template ETP.docx")
 
     try:
-        doc = DocxTemplate(caminho_template)
+        # Template carregado uma vez por processo (comum.templates_docx); cada documento recebe uma cópia
+        doc = obter_template(caminho_template)
     except Exception as e:
         print(f"Erro ao carregar o template '{caminho_template}': {e}")
         raise
 
     # 1. Gera todos os textos complexos e processa os dados primeiro
     # ... (toda a sua lógica de geração de IA e formatação de itens permanece igual)
-    justificativa_necessidade_ia = gerar_justificativa_necessidade_ia(dados_gerais['finalidade_geral'])
-    analise_mercado_ia = gerar_analise_mercado_ia(dados_gerais['solucoes_alternativas'], dados_gerais['solucao_escolhida'])
-    requisitos_tecnicos_ia = gerar_requisitos_tecnicos_ia(dados_gerais['requisitos_tecnicos'])
-    resultados_pretendidos_ia = gerar_resultados_pretendidos_ia(dados_gerais['finalidade_geral'])
-    impactos_ambientais_ia = gerar_impactos_ambientais_ia(dados_gerais['impactos_ambientais'])
+    # As seções de IA são independentes e vão ao modelo ao mesmo tempo
+    if textos_ia is None:
+        reaproveitadas = textos_reaproveitaveis(dados_gerais, usuario) if reaproveitar and usar_cache else {}
+        textos_ia = gerar_secoes_ia(dados_gerais, max_paralelo, usar_cache, reaproveitadas)
     
     for item in lista_de_itens:
         try:
@@ -65,11 +98,7 @@ def gerar_etp_completo(dados_gerais, lista_de_itens):
         'descricao_solucao_ia': dados_gerais['descricao_solucao'],
         'projetoatividade': dados_gerais.get('projetoatividade'),
         'programa': dados_gerais.get('programa'),
-        'justificativa_necessidade_ia': justificativa_necessidade_ia,
-        'analise_mercado_ia': analise_mercado_ia,
-        'requisitos_tecnicos_ia': requisitos_tecnicos_ia,
-        'resultados_pretendidos_ia': resultados_pretendidos_ia,
-        'impactos_ambientais_ia': impactos_ambientais_ia,
+        **textos_ia,
     }
 
     # 3. Obtém as variáveis do template e cria o contexto final dinamicamente
@@ -82,11 +111,22 @@ def gerar_etp_completo(dados_gerais, lista_de_itens):
     # Renderiza o documento com o contexto criado dinamicamente
     doc.render(context)
 
-    # Define os nomes dos arquivos
+    # Entradas das seções de IA, para a próxima geração saber o que mudou (fora do template)
+    context['entradas_ia'] = entradas_ia(dados_gerais)
+    context['gerado_por'] = identificar_autor(usuario)
+
+    # Define os nomes dos arquivos. O sufixo aleatório evita que jobs da fila
+    # (comum.fila_jobs) terminados no mesmo segundo sobrescrevam os arquivos um do outro
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    nome_base_arquivo = f"ETP_Gerado_{timestamp}"
+    nome_base_arquivo = f"ETP_Gerado_{timestamp}_{uuid.uuid4().hex[:8]}"
     nome_arquivo_docx = f"{nome_base_arquivo}.docx"
     nome_arquivo_json = f"{nome_base_arquivo}_DATA.json" 
+    # A pasta do próprio ETP, e não a pasta atual: no portal único (0.INTERFACE_INICIAL/portal.py)
+    # o processo roda fora da pasta do app
+    pasta_saida = pasta_saida or os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(pasta_saida, exist_ok=True)
+    nome_arquivo_docx = os.path.join(pasta_saida, nome_arquivo_docx)
+    nome_arquivo_json = os.path.join(pasta_saida, nome_arquivo_json)
 
     # --- INÍCIO DAS MODIFICAÇÕES ---
 
@@ -103,8 +143,48 @@ def gerar_etp_completo(dados_gerais, lista_de_itens):
 
     # Salva o arquivo DOCX
     doc.save(nome_arquivo_docx)
+    registrar_documento("etp", nome_arquivo_docx, context, nome_arquivo_json)
 
     # ALTERADO: Retorna tanto o caminho do DOCX quanto a string JSON
     return nome_arquivo_docx, json_string_output
     
-    # --- FIM DAS MODIFICAÇÕES ---
\ No newline at end of file
+    # --- FIM DAS MODIFICAÇÕES ---
+
+def executar_job_etp(parametros, job):
+    """
+    Executa um job "etp" da fila de geração (comum.fila_jobs).
+
+    Os textos da IA são publicados como resultado parcial à medida que chegam, para
+    a interface exibi-los durante a geração. Seções cujos campos não mudaram desde o
+    último ETP gerado pelo mesmo usuário não vão ao modelo (ver textos_reaproveitaveis).
+
+    Parâmetros do job: dados_gerais, lista_de_itens e usar_cache.
+    """
+    dados_gerais = parametros["dados_gerais"]
+    usar_cache = parametros.get("usar_cache", True)
+    # "Regenerar textos da IA" (usar_cache=False) gera todas as seções de novo
+    reaproveitadas = textos_reaproveitaveis(dados_gerais, job.usuario) if usar_cache else {}
+    span = span_atual()
+    if span is not None:
+        span.definir(secoes_reaproveitadas=len(reaproveitadas))
+    fluxos = gerar_secoes_ia_stream(
+        dados_gerais, usar_cache=usar_cache, cancelar=job.evento_cancelar, reaproveitar=reaproveitadas
+    )
+
+    textos_ia = {}
+    total = len(fluxos) + 1
+    job.progresso(0.0, "Gerando textos com IA...")
+    for i, (chave, fluxo) in enumerate(fluxos.items()):
+        partes = []
+        for fragmento in fluxo:
+            partes.append(fragmento)
+            job.parcial({**textos_ia, chave: "".join(partes)})
+        textos_ia[chave] = "".join(partes).strip()
+        job.parcial(textos_ia, forcar=True)
+        situacao = "reaproveitado do último ETP" if chave in reaproveitadas else "concluído"
+        job.progresso((i + 1) / total, f"{TITULOS_SECOES[chave]}: {situacao}")
+
+    job.progresso((total - 1) / total, "Montando o documento ETP...")
+    caminho_docx, _ = gerar_etp_completo(dados_gerais, parametros["lista_de_itens"], textos_ia=textos_ia, usuario=job.usuario)
+    caminho_docx = os.path.abspath(caminho_docx)
+    return {"docx": caminho_docx, "json": caminho_docx.replace(".docx", "_DATA.json")}
\ No newline at end of file
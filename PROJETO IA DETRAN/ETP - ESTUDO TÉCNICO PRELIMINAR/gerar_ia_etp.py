@@ -1,61 +1,74 @@
 # gerar_ia_etp.py
-import requests
+import hashlib
 import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
 
-def _chamar_ollama(prompt_texto, modelo="llama3:8b", max_tokens=500):
-    """Função para gerar texto com o modelo local Ollama."""
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum import config
+from comum.cliente_ia import gerar, gerar_stream, opcoes_modelo, transmitir_em_paralelo
+from comum.instrumentacao import no_contexto_atual
+
+# Quantidade máxima de prompts enviados ao mesmo tempo para o Ollama.
+# Deve acompanhar o número de slots paralelos do servidor (OLLAMA_NUM_PARALLEL);
+# acima disso as requisições apenas esperam na fila do próprio Ollama.
+MAX_REQUISICOES_PARALELAS = config.IA_NUM_PARALLEL
+
+# Modelo e opções vêm da configuração compartilhada (comum.config)
+MODELO = config.IA_MODELO
+
+def _chamar_ollama(prompt_texto, modelo=None, max_tokens=500, usar_cache=True):
+    """
+    Função para gerar texto com o modelo local (backend configurado em comum.config).
+
+    Respostas válidas ficam no cache local (comum.cache_ia); usar_cache=False
+    ignora o que estiver guardado e gera o texto de novo ("regenerar").
+    """
     if not prompt_texto or prompt_texto.strip() == "":
         return "Texto gerado pela IA."
-    
-    try:
-        response = requests.post("http://localhost:11434/api/generate", json={
-            "model": modelo,
-            "prompt": prompt_texto,
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "top_p": 0.9,
-                "max_tokens": max_tokens
-            }
-        }, timeout=120)  # Aumenta o timeout para 120 segundos
-        
-        if response.status_code == 200:
-            return response.json().get("response", "").strip()
-        else:
-            print(f"Erro na resposta do modelo Ollama: {response.status_code} - {response.text}")
-            return f"[FALHA NA RESPOSTA DO MODELO: {response.status_code}]"
-    except requests.exceptions.ConnectionError:
-        print("Erro de conexão com o Ollama. Certifique-se de que o servidor está rodando em http://localhost:11434.")
-        return "[ERRO DE CONEXÃO COM O MODELO IA]"
-    except requests.exceptions.Timeout:
-        print("A solicitação ao Ollama excedeu o tempo limite. Tente novamente.")
-        return "[ERRO DE TEMPO LIMITE DA IA]"
-    except Exception as e:
-        print(f"Erro ao consultar modelo Ollama: {e}")
-        return "[FALHA AO GERAR TEXTO COM IA]"
-
-def gerar_justificativa_necessidade_ia(finalidade_geral):
-    """Gera o texto para o item 3 do ETP."""
-    prompt = f"""
+
+    # Sessão compartilhada (comum.cliente_ia): conexões reaproveitadas, novas
+    # tentativas em falhas transitórias e timeout de 120 segundos
+    return gerar(prompt_texto, modelo or MODELO, opcoes_modelo(max_tokens), usar_cache=usar_cache, timeout=120)
+
+def _responder(prompt_texto, usar_cache=True, stream=False, cancelar=None):
+    """Retorna o texto pronto ou, com stream=True, um gerador com os fragmentos do texto."""
+    if stream:
+        return gerar_stream(prompt_texto, MODELO, opcoes_modelo(500), usar_cache=usar_cache, cancelar=cancelar)
+    return _chamar_ollama(prompt_texto, usar_cache=usar_cache)
+
+# Modelos dos prompts de cada seção. Ficam fora das funções para que a versão de cada
+# um (versao_prompt) seja salva com o ETP: texto gerado com um prompt antigo não é reaproveitado.
+PROMPT_JUSTIFICATIVA_NECESSIDADE = """
     Com base na seguinte finalidade geral para a contratação: '{finalidade_geral}',
     elabore um texto detalhado para a seção 'Descrição da Necessidade da Contratação'
     de um ETP (Estudo Técnico Preliminar). O texto deve ser formal, técnico e
     justificar a contratação em termos de eficiência e interesse público.
     """
-    return _chamar_ollama(prompt)
 
-def gerar_requisitos_tecnicos_ia(requisitos_base):
-    """Gera o texto para o item 5 do ETP."""
-    prompt = f"""
+def gerar_justificativa_necessidade_ia(finalidade_geral, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 3 do ETP."""
+    prompt = PROMPT_JUSTIFICATIVA_NECESSIDADE.format(finalidade_geral=finalidade_geral)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+PROMPT_REQUISITOS_TECNICOS = """
     Com base nos requisitos técnicos e de sustentabilidade fornecidos: '{requisitos_base}',
     elabore um texto formal e completo para a seção 'Descrição dos Requisitos da Contratação',
     incluindo critérios de qualidade, garantia e sustentabilidade.
     """
-    return _chamar_ollama(prompt)
 
-def gerar_analise_mercado_ia(solucoes_alternativas, solucao_escolhida):
-    """Gera o texto para o item 7 do ETP."""
-    prompt = f"""
+def gerar_requisitos_tecnicos_ia(requisitos_base, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 5 do ETP."""
+    prompt = PROMPT_REQUISITOS_TECNICOS.format(requisitos_base=requisitos_base)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+PROMPT_ANALISE_MERCADO = """
     A solução escolhida para um ETP é: '{solucao_escolhida}'.
     As soluções alternativas consideradas no mercado foram: '{solucoes_alternativas}'.
     
@@ -63,29 +76,172 @@ def gerar_analise_mercado_ia(solucoes_alternativas, solucao_escolhida):
     apresentando as opções consideradas, suas vantagens e desvantagens, e
     justificando tecnicamente a escolha da solução selecionada.
     """
-    return _chamar_ollama(prompt)
 
-def gerar_resultados_pretendidos_ia(finalidade_geral):
-    """Gera o texto para o item 11 do ETP."""
-    prompt = f"""
+def gerar_analise_mercado_ia(solucoes_alternativas, solucao_escolhida, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 7 do ETP."""
+    prompt = PROMPT_ANALISE_MERCADO.format(solucao_escolhida=solucao_escolhida, solucoes_alternativas=solucoes_alternativas)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+PROMPT_RESULTADOS_PRETENDIDOS = """
     Com base na finalidade geral: '{finalidade_geral}', descreva os resultados
     pretendidos para o ETP, em termos de economicidade e de melhor aproveitamento
     dos recursos humanos, materiais e financeiros disponíveis.
     """
-    return _chamar_ollama(prompt)
 
-def gerar_impactos_ambientais_ia(impactos_base):
-    """Gera o texto para o item 14 do ETP."""
-    prompt = f"""
+def gerar_resultados_pretendidos_ia(finalidade_geral, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 11 do ETP."""
+    prompt = PROMPT_RESULTADOS_PRETENDIDOS.format(finalidade_geral=finalidade_geral)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+PROMPT_IMPACTOS_AMBIENTAIS = """
     Com base nas informações sobre impactos ambientais: '{impactos_base}', gere um texto
     para a seção 'Descrição de Possíveis Impactos Ambientais' do ETP, incluindo
     medidas mitigadoras, requisitos de baixo consumo e logística reversa.
     """
-    return _chamar_ollama(prompt)
 
-def gerar_descricao_solucao_ia(descricao_base):
-    """Gera o texto para o item 9 do ETP."""
-    prompt = f"""
+def gerar_impactos_ambientais_ia(impactos_base, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 14 do ETP."""
+    prompt = PROMPT_IMPACTOS_AMBIENTAIS.format(impactos_base=impactos_base)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+PROMPT_DESCRICAO_SOLUCAO = """
     Com base na descrição da solução fornecida: '{descricao_base}', elabore um texto formal e completo para a seção 'Descrição da Solução como um todo', incluindo exigências relacionadas à garantia, manutenção e assistência técnica.
     """
-    return _chamar_ollama(prompt)
\ No newline at end of file
+
+def gerar_descricao_solucao_ia(descricao_base, usar_cache=True, stream=False, cancelar=None):
+    """Gera o texto para o item 9 do ETP."""
+    prompt = PROMPT_DESCRICAO_SOLUCAO.format(descricao_base=descricao_base)
+    return _responder(prompt, usar_cache, stream, cancelar)
+
+# Seções do ETP geradas pela IA: chave no contexto do template -> (função geradora, campos de dados_gerais usados)
+SECOES_IA = {
+    "justificativa_necessidade_ia": (gerar_justificativa_necessidade_ia, ("finalidade_geral",)),
+    "analise_mercado_ia": (gerar_analise_mercado_ia, ("solucoes_alternativas", "solucao_escolhida")),
+    "requisitos_tecnicos_ia": (gerar_requisitos_tecnicos_ia, ("requisitos_tecnicos",)),
+    "resultados_pretendidos_ia": (gerar_resultados_pretendidos_ia, ("finalidade_geral",)),
+    "impactos_ambientais_ia": (gerar_impactos_ambientais_ia, ("impactos_ambientais",)),
+}
+
+# Modelo do prompt de cada seção de SECOES_IA
+PROMPTS_SECOES = {
+    "justificativa_necessidade_ia": PROMPT_JUSTIFICATIVA_NECESSIDADE,
+    "analise_mercado_ia": PROMPT_ANALISE_MERCADO,
+    "requisitos_tecnicos_ia": PROMPT_REQUISITOS_TECNICOS,
+    "resultados_pretendidos_ia": PROMPT_RESULTADOS_PRETENDIDOS,
+    "impactos_ambientais_ia": PROMPT_IMPACTOS_AMBIENTAIS,
+}
+
+# Títulos exibidos na interface enquanto cada seção é gerada
+TITULOS_SECOES = {
+    "justificativa_necessidade_ia": "3. Descrição da Necessidade da Contratação",
+    "analise_mercado_ia": "7. Análise das Soluções Alternativas de Mercado",
+    "requisitos_tecnicos_ia": "5. Descrição dos Requisitos da Contratação",
+    "resultados_pretendidos_ia": "11. Resultados Pretendidos",
+    "impactos_ambientais_ia": "14. Descrição de Possíveis Impactos Ambientais",
+}
+
+# Campos do formulário usados por alguma seção de IA (salvos no _DATA.json como "entradas_ia")
+CAMPOS_IA = tuple(dict.fromkeys(campo for _, campos in SECOES_IA.values() for campo in campos))
+
+def versao_prompt(chave):
+    """Hash do modelo do prompt e das opções de geração da seção `chave`: muda quando o prompt é alterado."""
+    conteudo = json.dumps([PROMPTS_SECOES[chave], opcoes_modelo(500)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+def entradas_ia(dados_gerais):
+    """Entradas das seções de IA (campos do formulário, modelo e versão dos prompts), para comparar com a próxima geração."""
+    return {
+        "modelo": MODELO,
+        "prompts": {chave: versao_prompt(chave) for chave in SECOES_IA},
+        **{campo: dados_gerais.get(campo) for campo in CAMPOS_IA},
+    }
+
+def secoes_reaproveitaveis(dados_gerais, anterior):
+    """
+    Textos de IA de um ETP anterior que podem ser reaproveitados sem chamar o modelo.
+
+    `anterior` é o contexto salvo de um ETP (o _DATA.json). Uma seção é reaproveitada
+    quando o modelo, a versão do prompt (versao_prompt) e todos os campos que ela usa
+    (SECOES_IA) são iguais aos daquela geração e o texto salvo não é uma mensagem de
+    falha. ETPs salvos antes de "entradas_ia" (ou da versão dos prompts) existir não
+    têm o que reaproveitar.
+
+    Retorna:
+        dict: {chave_da_secao: texto} apenas das seções reaproveitadas.
+    """
+    entradas_anteriores = (anterior or {}).get("entradas_ia")
+    if not isinstance(entradas_anteriores, dict) or entradas_anteriores.get("modelo") != MODELO:
+        return {}
+
+    prompts_anteriores = entradas_anteriores.get("prompts")
+    if not isinstance(prompts_anteriores, dict):
+        return {}
+
+    reaproveitadas = {}
+    for chave, (_, campos) in SECOES_IA.items():
+        if prompts_anteriores.get(chave) != versao_prompt(chave):
+            continue
+        texto = anterior.get(chave)
+        if not isinstance(texto, str) or not texto.strip():
+            continue
+        if texto.startswith("[") and texto.endswith("]"):  # [FALHA AO GERAR TEXTO COM IA], [ERRO ...]
+            continue
+        if all(campo in entradas_anteriores and entradas_anteriores[campo] == dados_gerais.get(campo) for campo in campos):
+            reaproveitadas[chave] = texto
+    return reaproveitadas
+
+def gerar_secoes_ia(dados_gerais, max_paralelo=None, usar_cache=True, reaproveitar=None):
+    """
+    Gera todas as seções de IA do ETP enviando os prompts em paralelo.
+
+    As seções são independentes entre si, então são disparadas juntas em um pool
+    limitado a `max_paralelo` threads (padrão: MAX_REQUISICOES_PARALELAS). Com
+    max_paralelo=1 o comportamento é o mesmo da geração sequencial.
+    usar_cache=False força uma nova geração de todas as seções.
+    As seções em `reaproveitar` ({chave_da_secao: texto}, ver secoes_reaproveitaveis)
+    não vão ao modelo: o texto informado é usado como está.
+
+    Retorna:
+        dict: {chave_da_secao: texto}, sempre na ordem de SECOES_IA,
+              independente da ordem em que as respostas chegam.
+    """
+    reaproveitar = reaproveitar or {}
+    pendentes = {chave: secao for chave, secao in SECOES_IA.items() if chave not in reaproveitar}
+    if max_paralelo is None:
+        max_paralelo = MAX_REQUISICOES_PARALELAS
+    max_paralelo = max(1, min(max_paralelo, len(pendentes)))
+
+    with ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="etp-ia") as executor:
+        futuros = {
+            chave: executor.submit(no_contexto_atual(funcao), *(dados_gerais[campo] for campo in campos), usar_cache=usar_cache)
+            for chave, (funcao, campos) in pendentes.items()
+        }
+        return {
+            chave: reaproveitar[chave] if chave in reaproveitar else futuros[chave].result()
+            for chave in SECOES_IA
+        }
+
+def gerar_secoes_ia_stream(dados_gerais, max_paralelo=None, usar_cache=True, cancelar=None, reaproveitar=None):
+    """
+    Versão em streaming de gerar_secoes_ia, para exibir o texto enquanto é gerado.
+
+    Todas as seções começam a ser geradas em paralelo (até `max_paralelo`), mas o
+    retorno é um dicionário {chave_da_secao: iterador de fragmentos} na ordem de
+    SECOES_IA, pronto para ser passado a st.write_stream seção por seção.
+    Sinalizar o threading.Event `cancelar` interrompe as gerações em andamento.
+    As seções em `reaproveitar` viram um único fragmento com o texto já pronto.
+    """
+    reaproveitar = reaproveitar or {}
+    if max_paralelo is None:
+        max_paralelo = MAX_REQUISICOES_PARALELAS
+
+    fluxos = {
+        chave: partial(funcao, *(dados_gerais[campo] for campo in campos), usar_cache=usar_cache, stream=True, cancelar=cancelar)
+        for chave, (funcao, campos) in SECOES_IA.items()
+        if chave not in reaproveitar
+    }
+    gerados = transmitir_em_paralelo(fluxos, max_paralelo, cancelar) if fluxos else {}
+    return {
+        chave: iter([reaproveitar[chave]]) if chave in reaproveitar else gerados[chave]
+        for chave in SECOES_IA
+    }
\ No newline at end of file
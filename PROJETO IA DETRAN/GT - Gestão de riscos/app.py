@@ -1,4 +1,5 @@
 import locale as lc
+import sys
 from pathlib import Path
 from datetime import datetime
 import json
@@ -36,6 +37,13 @@ class CustomEncoder(json.JSONEncoder):
 DATE = datetime.now()
 cwd = Path(__file__).resolve().parent
 
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+if str(cwd.parent) not in sys.path:
+    sys.path.append(str(cwd.parent))
+
+from comum.catalogo import documentos_para_selecao, obter_catalogo
+from comum.instrumentacao import medir, requisicao
+
 # ========== TÍTULO COM LOGO ==========
 logo_path = cwd.parent / "DFD" / "static" / "logo_detran.png"
 
@@ -241,13 +249,14 @@ if "riscos_usados" not in st.session_state:
 with st.container(border=True):
     st.subheader("Carregar Dados do DFD (Opcional)", anchor=False)
 
-    dfd_path = cwd.parent / "DFD" / "static" / "arquivos_gerados"
-    dfd_path.mkdir(parents=True, exist_ok=True)
+    # DFDs registrados no catálogo (comum.catalogo), sem varrer a pasta a cada execução
+    dfds = documentos_para_selecao("dfd", com_dados=True)
 
     with st.form("doc_inputs", border=False, clear_on_submit=False):
         st.selectbox(
             label="DFD",
-            options=[x for x in dfd_path.iterdir() if x.suffix == ".json"],
+            options=list(dfds),
+            format_func=lambda caminho: dfds.get(caminho, Path(caminho).name),
             accept_new_options=False,
             index=None,
             placeholder="DFD",
@@ -261,10 +270,10 @@ with st.container(border=True):
             use_container_width=True,
         )
 
-        dfd: Path = st.session_state.dfd_path
+        dfd: str = st.session_state.dfd_path
         if bt_load and dfd:
-            with dfd.open(mode="r", encoding="utf-8") as f:
-                dfd_dados = json.load(f)
+            documento = obter_catalogo().obter(dfd)
+            dfd_dados = documento["dados"] if documento else None
 
             if dfd_dados:
                 st.session_state.obj_sint = dfd_dados["objetivo"].strip()
@@ -773,10 +782,14 @@ if btn_submit:
     docx_path = output_path / f"{output_name}.docx"
     json_path = output_path / f"{output_name}.json"
 
-    tpl.render(context)
-    tpl.save(docx_path)
+    with requisicao("gt.gerar_documento", riscos=len(context["riscos"])):
+        with medir("docx.renderizar", template=input_path.name):
+            tpl.render(context)
+        with medir("docx.salvar", template=input_path.name) as span:
+            tpl.save(docx_path)
+            span.definir(bytes=docx_path.stat().st_size)
 
-    with json_path.open(mode="w", encoding="utf-8") as f:
-        json.dump(context, f, indent=4, sort_keys=True, ensure_ascii=False, cls=CustomEncoder)
+        with json_path.open(mode="w", encoding="utf-8") as f:
+            json.dump(context, f, indent=4, sort_keys=True, ensure_ascii=False, cls=CustomEncoder)
 
     st.info(f'Arquivo salvo em "{docx_path.resolve()}"')
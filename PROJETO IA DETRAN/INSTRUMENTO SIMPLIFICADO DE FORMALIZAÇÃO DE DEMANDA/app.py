@@ -1,37 +1,30 @@
 import json
-import locale as lc
+import sys
 from datetime import datetime
 from pathlib import Path
 import uuid
 from pprint import pprint
 
-import jinja2
-from docxtpl import DocxTemplate
 import streamlit as st
 from PIL import Image
 import pandas as pd
 
-from padroes import TD, CustomEncoder, Itens, int_para_string, dinheiro_para_string, format_by, fmt_real
+from padroes import TD, CustomEncoder, Itens, dinheiro_para_string
 from utils import LogLevel, log
+from gerar_isfd import LOCAL_ENTREGA, configurar_locale, executar_job_isfd, variaveis_template
 
-lc.setlocale(lc.LC_ALL, "C")  # Reset para um locale padrão antes de tentar pt_BR
-
-try:
-    lc.setlocale(lc.LC_TIME, "pt_BR.UTF-8")
-    lc.setlocale(lc.LC_CTYPE, "pt_BR.UTF-8")
-    lc.setlocale(lc.LC_MONETARY, "pt_BR.UTF-8")
-except lc.Error:
-    try:
-        lc.setlocale(lc.LC_TIME, "pt_BR")
-        lc.setlocale(lc.LC_CTYPE, "pt_BR")
-        lc.setlocale(lc.LC_MONETARY, "pt_BR")
-    except lc.Error:
-        lc.setlocale(lc.LC_TIME, "")  # Fallback para o padrão do sistema
-        lc.setlocale(lc.LC_CTYPE, "")
-        lc.setlocale(lc.LC_MONETARY, "")
+configurar_locale()
 
 cwd = Path(__file__).resolve().parent
 
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+if str(cwd.parent) not in sys.path:
+    sys.path.append(str(cwd.parent))
+
+from comum.catalogo import documentos_para_selecao, obter_catalogo
+from comum.fila_jobs import obter_fila
+from comum.ui_jobs import lembrar_job, painel_job
+
 
 def group_str(text: str, by: int):
     rev = text[::-1]
@@ -75,23 +68,11 @@ if "etp_key" not in st.session_state:
 if "lista_itens" not in st.session_state:
     st.session_state.lista_itens = []
 
-input_path = cwd / "template" / "Template-ISFD.docx"
-output_path = cwd / "output"
-
-output_path.mkdir(parents=True, exist_ok=True)
-
-if not input_path.exists():
-    raise FileNotFoundError(f'Arquivo de template nao encontrado em "{input_path}"')
-
-jinja_env = jinja2.Environment()
-jinja_env.globals["TD"] = TD
-jinja_env.globals["int_para_string"] = int_para_string
-jinja_env.globals["fmt_real"] = fmt_real
-jinja_env.filters["format_by"] = format_by
-
-tpl = DocxTemplate(input_path)
+# A renderização roda na fila de geração (comum.fila_jobs), fora da execução do script
+fila = obter_fila()
+fila.registrar("isfd", executar_job_isfd)
 
-context: dict = dict.fromkeys(tpl.get_undeclared_template_variables(jinja_env))
+context: dict = dict.fromkeys(variaveis_template())
 
 
 tipos_despesa = [
@@ -104,25 +85,21 @@ tipos_despesa = [
     "Obras / Reformas / Serviços de Engenharia",
 ]
 
-docx_path: Path = None
-
 with st.container(border=True):
     st.subheader("Carregar Dados do DFD/ETP (Opcional)", anchor=False)
 
-    # DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA\static\arquivos_gerados
-    dfd_path = cwd.parent / "DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA" / "static" / "arquivos_gerados"
-    dfd_path.mkdir(parents=True, exist_ok=True)
-
-    etp_path = cwd.parent / "ETP - ESTUDO TÉCNICO PRELIMINAR"  # / "static" / "arquivos_gerados"
-    etp_path.mkdir(parents=True, exist_ok=True)
+    # DFDs e ETPs registrados no catálogo (comum.catalogo), sem varrer as pastas a cada execução
+    dfds = documentos_para_selecao("dfd", com_dados=True)
+    etps = documentos_para_selecao("etp", com_dados=True)
 
     with st.form("doc_inputs", border=False, clear_on_submit=False):
         col1, col2 = st.columns(2)
 
         with col1:
-            dfd: Path = st.selectbox(
+            dfd: str = st.selectbox(
                 label="DFD",
-                options=[x for x in dfd_path.iterdir() if x.suffix == ".json"],
+                options=list(dfds),
+                format_func=lambda caminho: dfds.get(caminho, Path(caminho).name),
                 accept_new_options=False,
                 index=None,
                 placeholder="DFD",
@@ -130,9 +107,10 @@ with st.container(border=True):
             )
 
         with col2:
-            etp: Path = st.selectbox(
+            etp: str = st.selectbox(
                 label="ETP",
-                options=[x for x in etp_path.iterdir() if x.suffix == ".json"],
+                options=list(etps),
+                format_func=lambda caminho: etps.get(caminho, Path(caminho).name),
                 accept_new_options=False,
                 index=None,
                 placeholder="ETP",
@@ -171,14 +149,14 @@ with st.container(border=True):
             if dfd:
                 st.info(f"DFD: {dfd}")
 
-                with dfd.open(mode="r", encoding="utf-8") as f:
-                    dfd_dados = json.load(f)
+                documento = obter_catalogo().obter(dfd)
+                dfd_dados = documento["dados"] if documento else None
 
             if etp:
                 st.info(f"ETP: {etp}")
 
-                with etp.open(mode="r", encoding="utf-8") as f:
-                    etp_dados = json.load(f)
+                documento = obter_catalogo().obter(etp)
+                etp_dados = documento["dados"] if documento else None
 
             if dfd_dados:
                 uo = "".join([c for c in dfd_dados["unidade_orcamentaria"] if c.isdecimal()])
@@ -651,13 +629,7 @@ with st.container(border=True):
             context["total_aquisicao"] = total_aquisicao
             context["total_aquisicao_escrito"] = dinheiro_para_string(total_aquisicao).upper()
 
-            context["local_entrega"] = (
-                "O objeto deverá ser entregue, mediante agendamento de data e hora, nos "
-                "dias e horários de expediente desta Autarquia (segunda à sexta-feira das 08h00min às 16h00min), com "
-                "comunicação antecipada de 24 (vinte e quatro) horas, na Gerência de Material e Mobiliário do Detran/MT, "
-                "situado na Av. Dr. Hélio Ribeiro Torquato da Silva, nº 1000 - Centro Político Administrativo - "
-                "CEP 78.048-910 - Cuiabá/MT;"
-            )
+            context["local_entrega"] = LOCAL_ENTREGA
 
             context["prazo_entrega"] = st.session_state.prazo_entrega if st.session_state.prazo_entrega else 0
             context["prazo_correcao"] = st.session_state.prazo_correcao if st.session_state.prazo_correcao else 0
@@ -714,26 +686,9 @@ with st.container(border=True):
                 if v is None:
                     log(LogLevel.WARN, f'Key "{k}" is None')
 
-            output_name = f"ISFD_{context['numero_ISFD']}-{context['ano']}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-
-            docx_path = output_path / f"{output_name}.docx"
-            json_path = output_path / f"{output_name}.json"
-
-            tpl.render(context, jinja_env)
-            tpl.save(docx_path)
-
-            if tpl.is_saved and docx_path.exists() and docx_path.is_file():
-                log(LogLevel.INFO, f'Arquivo "{docx_path}" Salvo com sucesso...')
-            else:
-                log(LogLevel.ERROR, f'Erro ao salvar arquivo "{docx_path}"')
-
-            with json_path.open(mode="w", encoding="utf-8") as f:
-                json.dump(context, f, indent=4, sort_keys=True, ensure_ascii=False, cls=CustomEncoder)
-
-            if json_path.exists() and json_path.is_file():
-                log(LogLevel.INFO, f'Arquivo "{json_path}" Salvo com sucesso...')
-            else:
-                log(LogLevel.ERROR, f'Erro ao salvar arquivo "{json_path}"')
+            # Os parâmetros do job precisam ser JSON: os itens viram dicionários
+            job_id = fila.enviar("isfd", {"context": json.loads(json.dumps(context, cls=CustomEncoder))})
+            lembrar_job("isfd", job_id)
 
 # with st.form("itens_siag"):
 #     st.text_input(
@@ -750,14 +705,23 @@ with st.container(border=True):
 #             rst = buscar_siag_selenium(termo)
 #             st.dataframe(rst)
 
-if docx_path and docx_path.exists():
-    with docx_path.open("rb") as f:
-        st.download_button(
-            "📥 Baixar Documento ISFD",
-            data=f,
-            file_name=docx_path.name,
-            mime=r"application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        )
+
+
+def mostrar_download(resultado: dict):
+    docx_path = Path(resultado.get("docx", ""))
+    if docx_path.is_file():
+        with docx_path.open("rb") as f:
+            st.download_button(
+                "📥 Baixar Documento ISFD",
+                data=f,
+                file_name=docx_path.name,
+                mime=r"application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            )
+    else:
+        st.error(f'Arquivo "{docx_path}" não encontrado.')
+
+
+painel_job(fila, "isfd", ao_concluir=mostrar_download)
 
 # with st.container(border=True):
 #     itens: list[Itens] = []
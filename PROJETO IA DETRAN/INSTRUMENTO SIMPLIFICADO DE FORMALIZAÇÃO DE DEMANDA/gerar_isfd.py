@@ -0,0 +1,156 @@
+import json
+import locale as lc
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from padroes import TD, CustomEncoder, int_para_string, dinheiro_para_string, format_by, fmt_real
+from utils import LogLevel, log
+
+cwd = Path(__file__).resolve().parent
+
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+if str(cwd.parent) not in sys.path:
+    sys.path.append(str(cwd.parent))
+
+from comum.catalogo import registrar_documento
+from comum.templates_docx import AmbienteJinja, obter_template
+
+input_path = cwd / "template" / "Template-ISFD.docx"
+output_path = cwd / "output"
+
+LOCAL_ENTREGA = (
+    "O objeto deverá ser entregue, mediante agendamento de data e hora, nos "
+    "dias e horários de expediente desta Autarquia (segunda à sexta-feira das 08h00min às 16h00min), com "
+    "comunicação antecipada de 24 (vinte e quatro) horas, na Gerência de Material e Mobiliário do Detran/MT, "
+    "situado na Av. Dr. Hélio Ribeiro Torquato da Silva, nº 1000 - Centro Político Administrativo - "
+    "CEP 78.048-910 - Cuiabá/MT;"
+)
+
+
+def configurar_locale():
+    lc.setlocale(lc.LC_ALL, "C")  # Reset para um locale padrão antes de tentar pt_BR
+
+    try:
+        lc.setlocale(lc.LC_TIME, "pt_BR.UTF-8")
+        lc.setlocale(lc.LC_CTYPE, "pt_BR.UTF-8")
+        lc.setlocale(lc.LC_MONETARY, "pt_BR.UTF-8")
+    except lc.Error:
+        try:
+            lc.setlocale(lc.LC_TIME, "pt_BR")
+            lc.setlocale(lc.LC_CTYPE, "pt_BR")
+            lc.setlocale(lc.LC_MONETARY, "pt_BR")
+        except lc.Error:
+            lc.setlocale(lc.LC_TIME, "")  # Fallback para o padrão do sistema
+            lc.setlocale(lc.LC_CTYPE, "")
+            lc.setlocale(lc.LC_MONETARY, "")
+
+
+def criar_jinja_env() -> AmbienteJinja:
+    jinja_env = AmbienteJinja()
+    jinja_env.globals["TD"] = TD
+    jinja_env.globals["int_para_string"] = int_para_string
+    jinja_env.globals["fmt_real"] = fmt_real
+    jinja_env.filters["format_by"] = format_by
+    return jinja_env
+
+
+# Criado uma vez por processo: guarda o template Jinja compilado entre um documento e outro
+jinja_env = criar_jinja_env()
+
+
+def variaveis_template() -> set[str]:
+    if not input_path.exists():
+        raise FileNotFoundError(f'Arquivo de template nao encontrado em "{input_path}"')
+    return obter_template(input_path).get_undeclared_template_variables(jinja_env)
+
+
+def completar_contexto(context: dict) -> dict:
+    """
+    Prepara um contexto vindo de fora do formulário (ex.: geração em lote a partir de CSV).
+
+    Converte os campos numéricos que chegam como texto e preenche os campos calculados
+    que o app monta sozinho (totais, local de entrega e data), quando não informados.
+    """
+    context = dict(context)
+
+    for campo in ("numero_ISFD", "ano", "prazo_entrega", "prazo_correcao", "vigencia_meses", "execucao_meses"):
+        if isinstance(context.get(campo), str) and context[campo].strip().isdecimal():
+            context[campo] = int(context[campo])
+
+    td = context.get("td")
+    if isinstance(td, str):
+        td = td.strip()
+        context["td"] = int(td) if td.isdecimal() else TD[td.upper()]
+
+    itens = []
+    for i, item in enumerate(context.get("lista_itens") or [], start=1):
+        item = dict(item)
+        item["item"] = int(item.get("item") or i)
+        item["cod_siag"] = int(item.get("cod_siag") or 0)
+        item["qtd"] = int(item.get("qtd") or 0)
+        valor_un = item.get("valor_un") or 0
+        if isinstance(valor_un, str):
+            valor_un = float(valor_un.replace("R$", "").strip().replace(".", "").replace(",", "."))
+        item["valor_un"] = float(valor_un)
+        itens.append(item)
+    context["lista_itens"] = itens
+
+    if context.get("total_aquisicao") in (None, ""):
+        context["total_aquisicao"] = sum(x["valor_un"] * x["qtd"] for x in itens)
+    if not context.get("total_aquisicao_escrito"):
+        context["total_aquisicao_escrito"] = dinheiro_para_string(context["total_aquisicao"]).upper()
+    if not context.get("local_entrega"):
+        context["local_entrega"] = LOCAL_ENTREGA
+    if not context.get("data_isfd"):
+        context["data_isfd"] = datetime.now().strftime("Cuiabá-MT, %d de %B de %Y.")
+    return context
+
+
+def renderizar_isfd(context: dict, pasta_saida: Path = None) -> Path:
+    """Renderiza o ISFD com o contexto e salva o .docx e o .json em output/ (ou `pasta_saida`). Retorna o caminho do .docx."""
+    pasta_saida = Path(pasta_saida) if pasta_saida else output_path
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+
+    # Sufixo aleatório: jobs da fila terminados no mesmo segundo não sobrescrevem os arquivos
+    output_name = (
+        f"ISFD_{context['numero_ISFD']}-{context['ano']}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        f"_{uuid.uuid4().hex[:8]}"
+    )
+
+    docx_path = pasta_saida / f"{output_name}.docx"
+    json_path = pasta_saida / f"{output_name}.json"
+
+    tpl = obter_template(input_path)
+    tpl.render(context, jinja_env)
+    tpl.save(docx_path)
+
+    if tpl.is_saved and docx_path.exists() and docx_path.is_file():
+        log(LogLevel.INFO, f'Arquivo "{docx_path}" Salvo com sucesso...')
+    else:
+        log(LogLevel.ERROR, f'Erro ao salvar arquivo "{docx_path}"')
+
+    with json_path.open(mode="w", encoding="utf-8") as f:
+        json.dump(context, f, indent=4, sort_keys=True, ensure_ascii=False, cls=CustomEncoder)
+
+    if json_path.exists() and json_path.is_file():
+        log(LogLevel.INFO, f'Arquivo "{json_path}" Salvo com sucesso...')
+    else:
+        log(LogLevel.ERROR, f'Erro ao salvar arquivo "{json_path}"')
+
+    # O contexto tem objetos (itens, enums): o catálogo lê a versão serializada do .json
+    registrar_documento("isfd", docx_path, caminho_json=json_path)
+    return docx_path
+
+
+def executar_job_isfd(parametros: dict, job) -> dict:
+    """
+    Executa um job "isfd" da fila de geração (comum.fila_jobs).
+
+    Parâmetros do job: context (serializado com CustomEncoder; os itens chegam como
+    dicionários e o tipo de despesa como inteiro, o que o template aceita igualmente).
+    """
+    job.progresso(0.0, "Montando o documento ISFD...")
+    docx_path = renderizar_isfd(parametros["context"])
+    return {"docx": str(docx_path)}
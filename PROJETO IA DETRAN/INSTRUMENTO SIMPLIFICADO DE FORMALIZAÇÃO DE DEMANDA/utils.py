@@ -1,23 +1,32 @@
 import io
 import os
 import sys
-import inspect
+import logging
 import functools
 from pathlib import Path
 from enum import IntEnum, auto
 from docx import Document
 
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum.extrator_docx import iterar_itens_dfd
+from comum.instrumentacao import medir
+from comum.logs import local_do_codigo, obter_logger, registrar
+
 
 def with_file_line(func):
     @functools.wraps(func)
     def wrapper(*msg, **kwargs):
-        frame = inspect.currentframe().f_back
+        frame = sys._getframe(1)
         line_no = kwargs.get("line_no", None)
         if line_no is None:
             line_no = frame.f_lineno
         file_name = kwargs.get("file_name", None)
         if file_name is None:
-            file_name = Path(inspect.getframeinfo(frame).filename).relative_to(os.getcwd())
+            file_name = local_do_codigo(frame.f_code)[1]
         return func(*msg, file_name=file_name, line_no=line_no)
 
     return wrapper
@@ -63,10 +72,20 @@ class LogLevel(IntEnum):
 # Valor Padrao
 minLogLevel = LogLevel.INFO
 
+# As mensagens vão para o logger "ia_detran.isfd" (comum.logs): JSON em dados/logs.jsonl e texto no stderr
+_logger = obter_logger("isfd")
+_NIVEIS = {
+    LogLevel.INFO: logging.INFO,
+    LogLevel.WARN: logging.WARNING,
+    LogLevel.ERROR: logging.ERROR,
+    LogLevel.NONE: logging.CRITICAL + 1,
+}
+
 
 def setLogLevel(level: LogLevel):
     global minLogLevel
     minLogLevel = level
+    _logger.setLevel(_NIVEIS[level])
 
 
 def getLogLevel():
@@ -83,17 +102,27 @@ def getLogLevel():
 
 
 def log(level: LogLevel, *msg, **kwargs):
+    # Nível primeiro: mensagens filtradas não olham o frame de quem chamou
     if level is None:
         return
 
-    if level < getLogLevel():
+    if level < minLogLevel or level == LogLevel.NONE:
         return
 
     output = kwargs.get("file", None)
 
-    frame = inspect.currentframe().f_back
+    if output is None:
+        nivel = _NIVEIS.get(level)
+        if nivel is None:
+            frame = sys._getframe(1)
+            UNREACHABLE("Invalid Log Level", file_name=local_do_codigo(frame.f_code)[1], line_no=frame.f_lineno)
+        registrar(_logger, nivel, kwargs.get("sep", " ").join(map(str, msg)), profundidade=2)
+        return
+
+    # Destino explícito (file=...): escreve direto nele, como antes
+    frame = sys._getframe(1)
     line_no = frame.f_lineno
-    file_name = Path(inspect.getframeinfo(frame).filename).relative_to(os.getcwd())
+    file_name = local_do_codigo(frame.f_code)[1]
 
     if output is sys.stdin:
         UNREACHABLE("Nao se pode escrever no stdin", file_name=file_name, line_no=line_no)
@@ -149,56 +178,11 @@ def extract_gentext_from_dfd(file_bytes):
 
 def extract_items_from_dfd(file_bytes):
     try:
-        doc = Document(io.BytesIO(file_bytes))
-
-        for table in doc.tables:
-            header_row_index = -1
-
-            # Encontra o índice da linha de cabeçalho
-            for i, row in enumerate(table.rows):
-                row_text = " ".join([cell.text.strip().upper() for cell in row.cells])
-                if "SIAGO/TCE" in row_text and "UN." in row_text and "QTDE" in row_text and "ESPECIFICAÇÃO DO PRODUTO" in row_text:
-                    header_row_index = i
-                    break
-
-            if header_row_index != -1:
-                header_row = table.rows[header_row_index]
-                header_texts = [cell.text.strip().upper() for cell in header_row.cells]
-
-                catmat_idx = -1
-                desc_idx = -1
-                un_idx = -1
-                qtd_idx = -1
-
-                for i, text in enumerate(header_texts):
-                    if "SIAGO/TCE" in text:
-                        catmat_idx = i
-                    elif "ESPECIFICAÇÃO" in text or "PRODUTO" in text:
-                        desc_idx = i
-                    elif "UN." in text:
-                        un_idx = i
-                    elif "QTDE" in text:
-                        qtd_idx = i
-
-                if desc_idx != -1 and un_idx != -1 and qtd_idx != -1:
-                    items_list = []
-
-                    # Itera sobre as linhas de dados a partir da linha seguinte ao cabeçalho
-                    for row in table.rows[header_row_index + 1 :]:
-                        cells = row.cells
-                        if len(cells) > max(catmat_idx, desc_idx, un_idx, qtd_idx):
-                            item_data = {
-                                "catmat": cells[catmat_idx].text.strip() if catmat_idx != -1 else "",
-                                "descricao": cells[desc_idx].text.strip(),
-                                "unidade": cells[un_idx].text.strip(),
-                                "qtd": cells[qtd_idx].text.strip(),
-                                "valor_unitario": "",
-                            }
-                            # Adiciona o item somente se a descrição não estiver vazia
-                            if item_data["descricao"].strip():
-                                items_list.append(item_data)
-                    return items_list
-        return []
+        # Lê só a tabela de itens, direto do XML do documento (comum.extrator_docx)
+        with medir("docx.extrair_itens", bytes=len(file_bytes)) as span:
+            itens = list(iterar_itens_dfd(file_bytes))
+            span.definir(itens=len(itens))
+            return itens
     except Exception as e:
         # Se houver um erro, exibe a mensagem detalhada e retorna None para tratamento na interface
         log(LogLevel.ERROR, f"❌ Erro ao ler o documento: '{e}'")
@@ -6,20 +6,20 @@ import re
 
 # --- IMPORTAÇÃO DA SUA CLASSE ---
 try:
-    from gerar_doc import GeradorRelatorioWord
+    from gerar_doc_pts import GeradorRelatorioWord
 except ImportError:
-    st.error("Erro Crítico: O arquivo 'gerar_doc.py' não foi encontrado.")
+    st.error("Erro Crítico: O arquivo 'gerar_doc_pts.py' não foi encontrado.")
     st.error("Por favor, verifique se o arquivo da sua classe está na mesma pasta que este script.")
     st.stop()
 
 st.set_page_config(
     page_title="Parecer Técnico Setorial",
     layout="centered",
-    page_icon="ico.png",
+    page_icon=os.path.join(os.path.dirname(os.path.abspath(__file__)), "ico.png"),
     initial_sidebar_state="auto"
 )
 
-OUTPUT_DIR = "output"
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 def validar_numero(numero: str) -> bool:
@@ -122,7 +122,7 @@ if submit_button:
                     json.dump(dados_finais, f, ensure_ascii=False, indent=4)
 
                 st.info("⚙️ Gerando documento... por favor, aguarde.")
-                caminho_template = 'templates/template_word.docx'
+                caminho_template = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'template_word.docx')
 
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 caminho_saida = os.path.join(OUTPUT_DIR, f'relatorio_{timestamp}.docx')
@@ -1,12 +1,21 @@
-# Em seu arquivo: gerar_doc.py
+# Em seu arquivo: gerar_doc_pts.py
 # Versão Final com Configuração no Topo
 
 import json
 import os
+import sys
 import locale as lc
-from docxtpl import DocxTemplate
+from pathlib import Path
 from typing import Dict, Any, Optional
 
+# Pasta "PROJETO IA DETRAN" no path para importar o pacote compartilhado `comum`
+RAIZ_PROJETO = str(Path(__file__).resolve().parent.parent)
+if RAIZ_PROJETO not in sys.path:
+    sys.path.append(RAIZ_PROJETO)
+
+from comum.instrumentacao import requisicao
+from comum.templates_docx import obter_template
+
 lc.setlocale(lc.LC_ALL, "C")  # Reset para um locale padrão antes de tentar pt_BR
 
 try:
@@ -63,7 +72,8 @@ class GeradorRelatorioWord:
             raise FileNotFoundError(f"Template não encontrado: {self.caminho_template}")
         
         try:
-            self.template = DocxTemplate(self.caminho_template)
+            # Template carregado uma vez por processo (comum.templates_docx); cada gerador recebe uma cópia
+            self.template = obter_template(self.caminho_template)
             print(f"✓ Template '{self.caminho_template}' carregado com sucesso.")
         except Exception as e:
             print(f"✗ ERRO ao carregar o template Word: {e}")
@@ -129,6 +139,13 @@ class GeradorRelatorioWord:
         """
         Orquestra a geração do relatório.
         """
+        # Medido como uma requisição da instrumentação (comum.instrumentacao)
+        with requisicao("pts.gerar_documento") as span:
+            sucesso = self._gerar_documento(caminho_json, caminho_saida)
+            span.definir(sucesso=sucesso)
+            return sucesso
+
+    def _gerar_documento(self, caminho_json: str, caminho_saida: str) -> bool:
         print(f"🔄 Iniciando geração do documento...")
         contexto = self._carregar_json(caminho_json)
         if contexto is None:
@@ -137,6 +154,9 @@ class GeradorRelatorioWord:
 
         try:
             print("🔄 Preenchendo o documento com os dados...")
+            if self.template.is_rendered:
+                # Cada render precisa de uma cópia limpa do template
+                self.template = obter_template(self.caminho_template)
             self.template.render(contexto)
             print("✓ Template renderizado com sucesso")
         except Exception as e:
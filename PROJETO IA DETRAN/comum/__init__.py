@@ -0,0 +1,2 @@
+# Pacote com os módulos compartilhados pelos geradores de documentos (DFD, ETP, ISFD, PTS, GT).
+# Os apps adicionam a pasta "PROJETO IA DETRAN" ao sys.path para importá-lo.
@@ -0,0 +1,304 @@
+# backend_ia.py
+# Backends de geração de texto usados por comum.cliente_ia.
+#
+#   - BackendOllama: servidor Ollama (/api/generate), padrão.
+#   - BackendFalso: roda no próprio processo e devolve um texto fixo, derivado do
+#     prompt, em um ritmo configurável de tokens por segundo. Serve para testar a
+#     interface e medir os pipelines de geração em máquinas sem o modelo.
+#
+# Quem passa um dicionário em `metricas` recebe nele os números da geração informados
+# pelo backend (tokens do prompt e da resposta e, no Ollama, onde o tempo foi gasto),
+# usados pela instrumentação (comum.instrumentacao).
+#
+# `formato` pede a resposta em JSON: "json" ou um JSON Schema (campo "format" do
+# /api/generate); o Ollama restringe a geração para seguir o esquema.
+#
+# O backend é escolhido por config.IA_BACKEND (variável de ambiente IA_BACKEND).
+# Cache, mensagens de erro inseridas no documento e paralelismo ficam em
+# comum.cliente_ia; aqui fica só a conversa com o "modelo".
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Iterator, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from comum import config
+
+
+class ErroBackendIA(Exception):
+    """Falha na geração. `texto` é a mensagem que vai para o documento no lugar da resposta."""
+
+    def __init__(self, texto: str):
+        super().__init__(texto)
+        self.texto = texto
+
+
+class ErroTempoLimiteIA(ErroBackendIA):
+    """O modelo não respondeu dentro do tempo limite (sinal de sobrecarga para comum.escalonador_ia)."""
+
+    def __init__(self):
+        super().__init__("[ERRO DE TEMPO LIMITE DA IA]")
+
+
+class BackendIA:
+    """Interface comum dos backends de geração de texto."""
+
+    nome = "base"
+
+    def gerar(
+        self, prompt: str, modelo: str, opcoes: dict, keep_alive: Optional[str] = None, timeout: int = 120,
+        metricas: Optional[dict] = None, formato: Union[str, dict, None] = None,
+    ) -> str:
+        """Devolve a resposta completa. Levanta ErroBackendIA em caso de falha."""
+        return "".join(self.gerar_stream(prompt, modelo, opcoes, keep_alive, timeout, metricas, formato))
+
+    def gerar_stream(
+        self, prompt: str, modelo: str, opcoes: dict, keep_alive: Optional[str] = None, timeout: int = 120,
+        metricas: Optional[dict] = None, formato: Union[str, dict, None] = None,
+    ) -> Iterator[str]:
+        """Produz a resposta em fragmentos. Fechar o gerador interrompe a geração."""
+        raise NotImplementedError
+
+    def aquecer(self, modelo: str, keep_alive: Optional[str] = None) -> bool:
+        """Deixa o modelo pronto para a primeira geração. Retorna False se não conseguir."""
+        return True
+
+
+class BackendOllama(BackendIA):
+    """
+    Servidor Ollama acessado por HTTP.
+
+    Todas as chamadas usam a mesma requests.Session, que mantém um pool de conexões
+    abertas com o servidor e repete automaticamente as requisições que falham por
+    conexão recusada ou 502/503/504 (por exemplo, com o Ollama ainda subindo).
+    Toda requisição envia "keep_alive" para o modelo não ser descarregado entre uma
+    seção e outra.
+    """
+
+    nome = "ollama"
+
+    def __init__(self, url: str = None):
+        self.url = (url or config.OLLAMA_URL).rstrip("/")
+        self.url_generate = f"{self.url}/api/generate"
+        self._sessao = None
+        self._trava = threading.Lock()
+
+    def sessao(self) -> requests.Session:
+        if self._sessao is None:
+            with self._trava:
+                if self._sessao is None:
+                    # read=0: uma geração que estourou o tempo não é repetida,
+                    # senão o usuário esperaria o timeout duas vezes.
+                    tentativas = Retry(
+                        total=config.OLLAMA_TENTATIVAS,
+                        connect=config.OLLAMA_TENTATIVAS,
+                        read=0,
+                        status=config.OLLAMA_TENTATIVAS,
+                        status_forcelist=(502, 503, 504),
+                        allowed_methods=frozenset({"POST"}),
+                        backoff_factor=0.5,
+                        raise_on_status=False,
+                    )
+                    adaptador = HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=max(config.IA_NUM_PARALLEL * 2, 4),
+                        max_retries=tentativas,
+                    )
+                    sessao = requests.Session()
+                    sessao.mount("http://", adaptador)
+                    sessao.mount("https://", adaptador)
+                    self._sessao = sessao
+        return self._sessao
+
+    def _corpo(self, prompt, modelo, opcoes, stream, keep_alive, formato=None):
+        corpo = {
+            "model": modelo,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": keep_alive if keep_alive is not None else config.IA_KEEP_ALIVE,
+            "options": opcoes,
+        }
+        if formato is not None:
+            corpo["format"] = formato
+        return corpo
+
+    def _post(self, corpo, timeout, stream=False):
+        try:
+            # timeout=(conexão, leitura); no streaming a leitura é o intervalo entre fragmentos
+            return self.sessao().post(self.url_generate, json=corpo, stream=stream, timeout=(10, timeout))
+        except requests.exceptions.ConnectionError:
+            print(f"Erro de conexão com o Ollama. Certifique-se de que o servidor está rodando em {self.url}.")
+            raise ErroBackendIA("[ERRO DE CONEXÃO COM O MODELO IA]")
+        except requests.exceptions.Timeout:
+            print("A solicitação ao Ollama excedeu o tempo limite. Tente novamente.")
+            raise ErroTempoLimiteIA()
+
+    @staticmethod
+    def _ler_metricas(dados, metricas):
+        # Contagens e durações (em nanossegundos) da última mensagem do /api/generate
+        if metricas is None:
+            return
+        for campo, chave in (("prompt_eval_count", "tokens_prompt"), ("eval_count", "tokens_resposta")):
+            if campo in dados:
+                metricas[chave] = dados[campo]
+        for campo, chave in (
+            ("load_duration", "ollama_carga_s"),
+            ("prompt_eval_duration", "ollama_prompt_s"),
+            ("eval_duration", "ollama_geracao_s"),
+        ):
+            if campo in dados:
+                metricas[chave] = round(dados[campo] / 1e9, 3)
+
+    @staticmethod
+    def _verificar_status(response):
+        if response.status_code != 200:
+            print(f"Erro na resposta do modelo Ollama: {response.status_code} - {response.text}")
+            raise ErroBackendIA(f"[FALHA NA RESPOSTA DO MODELO: {response.status_code}]")
+
+    def gerar(self, prompt, modelo, opcoes, keep_alive=None, timeout=120, metricas=None, formato=None):
+        response = self._post(self._corpo(prompt, modelo, opcoes, False, keep_alive, formato), timeout)
+        self._verificar_status(response)
+        dados = response.json()
+        self._ler_metricas(dados, metricas)
+        return dados.get("response", "")
+
+    def gerar_stream(self, prompt, modelo, opcoes, keep_alive=None, timeout=120, metricas=None, formato=None):
+        response = self._post(self._corpo(prompt, modelo, opcoes, True, keep_alive, formato), timeout, stream=True)
+        with response:
+            self._verificar_status(response)
+            try:
+                for linha in response.iter_lines():
+                    if not linha:
+                        continue
+
+                    dados = json.loads(linha)
+                    if "error" in dados:
+                        print(f"Erro retornado pelo Ollama: {dados['error']}")
+                        raise ErroBackendIA("[FALHA AO GERAR TEXTO COM IA]")
+
+                    fragmento = dados.get("response", "")
+                    if fragmento:
+                        yield fragmento
+                    if dados.get("done"):
+                        self._ler_metricas(dados, metricas)
+                        return
+            except requests.exceptions.ConnectionError:
+                print("A conexão com o Ollama foi interrompida durante a geração.")
+                raise ErroBackendIA("[ERRO DE CONEXÃO COM O MODELO IA]")
+            except requests.exceptions.Timeout:
+                print("A solicitação ao Ollama excedeu o tempo limite. Tente novamente.")
+                raise ErroTempoLimiteIA()
+        # O fluxo terminou sem "done": resposta incompleta
+        raise ErroBackendIA("[FALHA AO GERAR TEXTO COM IA]")
+
+    def aquecer(self, modelo, keep_alive=None):
+        # Requisição sem prompt: o Ollama apenas carrega o modelo na memória
+        corpo = {"model": modelo, "keep_alive": keep_alive if keep_alive is not None else config.IA_KEEP_ALIVE}
+        try:
+            response = self.sessao().post(self.url_generate, json=corpo, timeout=(10, 300))
+            if response.status_code == 200:
+                print(f"Modelo '{modelo}' carregado no Ollama.")
+                return True
+            print(f"Não foi possível carregar o modelo '{modelo}': {response.status_code} - {response.text}")
+        except requests.exceptions.RequestException as e:
+            print(f"Não foi possível aquecer o modelo '{modelo}' no Ollama: {e}")
+        return False
+
+
+class BackendFalso(BackendIA):
+    """
+    Backend de teste: não chama modelo nenhum.
+
+    O texto é sorteado de um vocabulário fixo com semente derivada do prompt, então o
+    mesmo prompt sempre produz a mesma resposta. Os tokens saem a `tokens_por_segundo`,
+    depois de `latencia` segundos (o "tempo até o primeiro token"), o que permite
+    simular a carga do servidor real de forma reproduzível.
+    """
+
+    nome = "falso"
+
+    VOCABULARIO = (
+        "a aquisição demanda contratação DETRAN-MT atendimento serviço público eficiência "
+        "gestão recursos necessidade institucional modernização infraestrutura melhoria "
+        "processos continuidade atividades órgão objetivo planejamento estratégico "
+        "economicidade qualidade segurança usuários sistema equipamentos operação"
+    ).split()
+
+    def __init__(self, tokens_por_segundo: float = None, latencia: float = None, tokens: int = None):
+        self.tokens_por_segundo = tokens_por_segundo if tokens_por_segundo is not None else config.IA_FALSO_TOKENS_POR_SEGUNDO
+        self.latencia = latencia if latencia is not None else config.IA_FALSO_LATENCIA
+        self.tokens = tokens if tokens is not None else config.IA_FALSO_TOKENS
+
+    def _palavras(self, prompt, modelo, opcoes):
+        semente = hashlib.sha256(f"{modelo}\n{prompt}".encode("utf-8")).digest()
+        sorteio = random.Random(semente)
+        quantidade = min(self.tokens, int(opcoes.get("max_tokens", self.tokens)))
+        return [sorteio.choice(self.VOCABULARIO) for _ in range(max(quantidade, 1))]
+
+    def _frase(self, prompt, modelo, opcoes):
+        palavras = self._palavras(prompt, modelo, opcoes)
+        fragmentos = [palavra.capitalize() if i == 0 else f" {palavra}" for i, palavra in enumerate(palavras)]
+        fragmentos[-1] += "."
+        return fragmentos
+
+    def _fragmentos(self, prompt, modelo, opcoes, formato):
+        if formato is None:
+            return self._frase(prompt, modelo, opcoes)
+        # JSON: uma frase por propriedade do esquema (ou {"texto": ...}), dividindo o limite de tokens
+        propriedades = formato.get("properties") if isinstance(formato, dict) else None
+        chaves = list(propriedades or ["texto"])
+        quantidade = max(1, min(self.tokens, int(opcoes.get("max_tokens", self.tokens))) // len(chaves))
+        resposta = {
+            chave: "".join(self._frase(f"{prompt}\n{chave}", modelo, {**opcoes, "max_tokens": quantidade}))
+            for chave in chaves
+        }
+        texto = json.dumps(resposta, ensure_ascii=False)
+        return [texto[i:i + 6] for i in range(0, len(texto), 6)]
+
+    def gerar_stream(self, prompt, modelo, opcoes, keep_alive=None, timeout=120, metricas=None, formato=None):
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+        intervalo = 1 / self.tokens_por_segundo if self.tokens_por_segundo > 0 else 0
+        fragmentos = self._fragmentos(prompt, modelo, opcoes, formato)
+        if metricas is not None:
+            # Um fragmento por "token", como no ritmo da resposta
+            metricas.update(tokens_prompt=len(prompt.split()), tokens_resposta=len(fragmentos))
+        for fragmento in fragmentos:
+            if intervalo:
+                time.sleep(intervalo)
+            yield fragmento
+
+
+BACKENDS = {
+    BackendOllama.nome: BackendOllama,
+    BackendFalso.nome: BackendFalso,
+}
+
+_backend = None
+_trava_backend = threading.Lock()
+
+
+def obter_backend() -> BackendIA:
+    """Retorna o backend configurado em config.IA_BACKEND (instância única por processo)."""
+    global _backend
+    if _backend is None:
+        with _trava_backend:
+            if _backend is None:
+                if config.IA_BACKEND not in BACKENDS:
+                    raise ValueError(
+                        f"Backend de IA desconhecido: '{config.IA_BACKEND}'. Opções: {', '.join(BACKENDS)}"
+                    )
+                _backend = BACKENDS[config.IA_BACKEND]()
+    return _backend
+
+
+def definir_backend(backend: Optional[BackendIA]):
+    """Substitui o backend do processo (por exemplo, um BackendFalso em um benchmark). None volta ao configurado."""
+    global _backend
+    with _trava_backend:
+        _backend = backend
@@ -0,0 +1,380 @@
+# benchmark.py
+# Benchmark dos geradores de documentos (DFD, ETP, ISFD e PTS), sem a interface.
+#
+# Uso (a partir da pasta "PROJETO IA DETRAN"):
+#
+#   python -m comum.benchmark                          # todos, com 1, 10, 100 e 1000 itens
+#   python -m comum.benchmark dfd isfd --itens 1,100   # só alguns geradores e tamanhos
+#   python -m comum.benchmark --salvar-referencia      # grava os números como referência
+#
+# Os documentos são gerados pelas mesmas funções dos apps (gerar_dfd_completo,
+# gerar_etp_completo, renderizar_isfd e GeradorRelatorioWord.gerar_documento), com
+# entradas sintéticas do tamanho pedido. O modelo de IA é o BackendFalso sem latência
+# e sem ritmo de tokens (nem a fila do comum.escalonador_ia): o tempo medido é o dos
+# geradores, não o do modelo. Cada gerador roda em um processo novo, com a pasta de
+# dados (cache, catálogo, fila) em uma pasta temporária, para não misturar os
+# documentos do benchmark com os reais.
+#
+# Para cada gerador e quantidade de itens:
+#
+#   segundos         mediana do tempo total de geração em --repeticoes execuções
+#   render_s         mediana do tempo de render do template (span docx.renderizar)
+#   salvar_s         mediana do tempo de gravação do .docx (span docx.salvar)
+#   extracao_s       mediana da leitura de volta da lista de itens (extrair_dfd; só DFD)
+#   memoria_pico_mb  pico de memória alocada pelo Python durante uma geração (tracemalloc)
+#   bytes            tamanho do .docx gerado
+#
+# Um gerador que falha (ex.: sem o locale pt_BR no sistema) vira uma linha com o "erro"
+# no lugar dos números, e os demais continuam sendo medidos.
+#
+# Com uma referência gravada (BENCHMARK_REFERENCIA, por padrão
+# comum/benchmark_referencia.json, versionado), cada número é comparado com ela e
+# o comando termina com código 1 se algum piorou mais que --tolerancia (ou se algum
+# gerador falhou).
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from comum import config
+
+# Gerador -> pasta do app
+GERADORES = {
+    "dfd": "DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA",
+    "etp": "ETP - ESTUDO TÉCNICO PRELIMINAR",
+    "isfd": "INSTRUMENTO SIMPLIFICADO DE FORMALIZAÇÃO DE DEMANDA",
+    "pts": "PARECER TÉCNICO SETORIAL - MTI",
+}
+
+QUANTIDADES_PADRAO = (1, 10, 100, 1000)
+
+# Números comparados com a referência e a diferença mínima para contar como piora
+# (abaixo disso é ruído de medição)
+LIMIARES = {
+    "segundos": 0.02,
+    "render_s": 0.02,
+    "salvar_s": 0.02,
+    "extracao_s": 0.02,
+    "memoria_pico_mb": 1.0,
+    "bytes": 4096,
+}
+
+
+# ---------------- Entradas sintéticas ----------------
+
+def _itens_dfd(quantidade: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "item": str(i).zfill(3),
+            "catmat": str(400000 + i),
+            "unidade": "UN",
+            "qtd": str(i % 50 + 1),
+            "descricao": f"ITEM DE TESTE {i} - CADEIRA GIRATÓRIA COM BRAÇOS REGULÁVEIS, ENCOSTO EM TELA E BASE CROMADA",
+            "finalidade_especifica": f"Substituição do mobiliário do setor {i % 12 + 1}",
+            "valor_unitario": f"R$ {i % 900 + 100},50",
+        }
+        for i in range(1, quantidade + 1)
+    ]
+
+
+def _dados_dfd() -> Dict[str, str]:
+    return {
+        "setor_requisitante": "Coordenadoria de Tecnologia da Informação",
+        "responsavel": "Servidor de Teste",
+        "finalidade": "Modernizar o atendimento ao público nas unidades do DETRAN-MT.",
+        "tipo_objeto": "Material permanente",
+        "forma_contratacao": "Modalidades da Lei nº 14.133/21",
+        "necessidade_etp": "SIM",
+        "previsao_pca": "SIM",
+        "programa": "036",
+        "subacao": "02",
+        "elemento_despesa": "4490.5200",
+        "projeto_atividade": "2009",
+        "etapa": "01",
+        "fonte": "15010000",
+        "data_pretendida": "01/12/2025",
+        "fiscal_nome": "Fiscal de Teste",
+        "fiscal_matricula": "123456",
+    }
+
+
+def _dados_etp() -> Dict[str, str]:
+    campos = (
+        "etp_numero area_requisitante responsavel subacao etapa elemento_despesa fonte justificativa_parcelamento "
+        "providencias correlatas viabilidade data_final elaborador_nome elaborador_matricula descricao_solucao "
+        "finalidade_geral solucoes_alternativas solucao_escolhida requisitos_tecnicos impactos_ambientais"
+    ).split()
+    return {campo: f"Texto de teste para o campo {campo.replace('_', ' ')}." for campo in campos}
+
+
+def _contexto_isfd(quantidade: int) -> Dict[str, Any]:
+    # O exemplo de ISFD salvo no PTS tem todos os campos do formulário
+    with (config.RAIZ_PROJETO / GERADORES["pts"] / "ISFD.json").open(encoding="utf-8") as f:
+        contexto = json.load(f)
+    modelo = contexto["lista_itens"][0]
+    contexto["lista_itens"] = [
+        {**modelo, "item": i, "cod_siag": 7090042700000 + i, "qtd": i % 50 + 1, "descricao": f"{modelo['descricao']} ({i})"}
+        for i in range(1, quantidade + 1)
+    ]
+    for campo in ("total_aquisicao", "total_aquisicao_escrito"):
+        contexto.pop(campo, None)  # recalculados por completar_contexto
+    return contexto
+
+
+# ---------------- Geradores ----------------
+
+def _preparar_gerador(tipo: str, pasta: Path) -> Callable[[int, Path], Path]:
+    """Importa o gerador `tipo` (neste processo) e devolve gerar(quantidade de itens, pasta) -> .docx."""
+    pasta_app = config.RAIZ_PROJETO / GERADORES[tipo]
+    for caminho in (str(config.RAIZ_PROJETO), str(pasta_app)):
+        if caminho not in sys.path:
+            sys.path.insert(0, caminho)
+    os.chdir(pasta)
+
+    from comum.backend_ia import BackendFalso, definir_backend
+    definir_backend(BackendFalso(tokens_por_segundo=0, latencia=0))
+
+    if tipo == "dfd":
+        from gerar_dfd import gerar_dfd_completo
+
+        def gerar(quantidade, pasta_saida):
+            return Path(gerar_dfd_completo(_dados_dfd(), _itens_dfd(quantidade), usar_cache=False, pasta_saida=str(pasta_saida)))
+
+    elif tipo == "etp":
+        from gerar_etp import gerar_etp_completo
+
+        def gerar(quantidade, pasta_saida):
+            caminho_docx, _ = gerar_etp_completo(_dados_etp(), _itens_dfd(quantidade), usar_cache=False, pasta_saida=str(pasta_saida))
+            return Path(caminho_docx)
+
+    elif tipo == "isfd":
+        from gerar_isfd import completar_contexto, configurar_locale, renderizar_isfd
+        configurar_locale()
+
+        def gerar(quantidade, pasta_saida):
+            return renderizar_isfd(completar_contexto(_contexto_isfd(quantidade)), pasta_saida)
+
+    else:
+        from gerar_doc_pts import GeradorRelatorioWord
+        gerador = GeradorRelatorioWord(str(pasta_app / "templates" / "template_word.docx"))
+
+        def gerar(quantidade, pasta_saida):
+            pasta_saida.mkdir(parents=True, exist_ok=True)
+            caminho_json = pasta_saida / "dados.json"
+            caminho_json.write_text(json.dumps(_contexto_isfd(quantidade), ensure_ascii=False), encoding="utf-8")
+            caminho_docx = pasta_saida / "relatorio.docx"
+            if not gerador.gerar_documento(str(caminho_json), str(caminho_docx)):
+                raise RuntimeError("GeradorRelatorioWord.gerar_documento falhou")
+            return caminho_docx
+
+    return gerar
+
+
+def _mediana_span(spans: List[Dict[str, Any]], nome: str) -> Optional[float]:
+    duracoes = [span["duracao_s"] for span in spans if span["nome"] == nome]
+    return statistics.median(duracoes) if duracoes else None
+
+
+def _linha_erro(tipo: str, quantidade: int, erro: BaseException) -> Dict[str, Any]:
+    return {"gerador": tipo, "itens": quantidade, "erro": f"{type(erro).__name__}: {erro}", **{metrica: None for metrica in LIMIARES}}
+
+
+def _medir_gerador(tipo: str, quantidades: List[int], repeticoes: int, pasta: str) -> List[Dict[str, Any]]:
+    """Roda no processo do gerador: mede cada quantidade de itens e devolve uma linha por quantidade."""
+    pasta = Path(pasta)
+    gerar = _preparar_gerador(tipo, pasta)
+    # Aquecimento: leitura do template e compilação do Jinja ficam fora da medição,
+    # como acontece a partir do segundo documento de um app
+    gerar(1, pasta / "aquecimento")
+
+    linhas = []
+    for quantidade in quantidades:
+        try:
+            linhas.append(_medir_quantidade(tipo, gerar, quantidade, repeticoes, pasta))
+            print(f"  {tipo} {quantidade:>5} itens: {linhas[-1]['segundos']:.3f}s", flush=True)
+        except Exception as e:
+            linhas.append(_linha_erro(tipo, quantidade, e))
+            print(f"  {tipo} {quantidade:>5} itens: {linhas[-1]['erro']}", flush=True)
+    return linhas
+
+
+def _medir_quantidade(tipo: str, gerar: Callable[[int, Path], Path], quantidade: int, repeticoes: int, pasta: Path) -> Dict[str, Any]:
+    from comum.extrator_docx import extrair_dfd
+    from comum.instrumentacao import coletar
+
+    tempos, extracoes = [], []
+    with coletar() as spans:
+        for repeticao in range(repeticoes):
+            inicio = time.perf_counter()
+            caminho_docx = gerar(quantidade, pasta / f"{quantidade}_{repeticao}")
+            tempos.append(time.perf_counter() - inicio)
+            if tipo == "dfd":
+                conteudo = caminho_docx.read_bytes()
+                inicio = time.perf_counter()
+                itens, _ = extrair_dfd(conteudo, {})
+                extracoes.append(time.perf_counter() - inicio)
+                if len(itens) != quantidade:
+                    raise RuntimeError(f"extrair_dfd leu {len(itens)} de {quantidade} itens")
+
+    tracemalloc.start()
+    try:
+        gerar(quantidade, pasta / f"{quantidade}_memoria")
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "gerador": tipo,
+        "itens": quantidade,
+        "segundos": round(statistics.median(tempos), 4),
+        "render_s": _arredondar(_mediana_span(spans, "docx.renderizar")),
+        "salvar_s": _arredondar(_mediana_span(spans, "docx.salvar")),
+        "extracao_s": _arredondar(statistics.median(extracoes) if extracoes else None),
+        "memoria_pico_mb": round(pico / (1024 * 1024), 2),
+        "bytes": caminho_docx.stat().st_size,
+    }
+
+
+def _arredondar(valor: Optional[float]) -> Optional[float]:
+    return round(valor, 4) if valor is not None else None
+
+
+@contextmanager
+def _ambiente(**variaveis):
+    # Lidas pelo comum.config dos processos dos geradores, que começam do zero (spawn)
+    anteriores = {chave: os.environ.get(chave) for chave in variaveis}
+    os.environ.update(variaveis)
+    try:
+        yield
+    finally:
+        for chave, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(chave, None)
+            else:
+                os.environ[chave] = valor
+
+
+def executar_benchmark(geradores: List[str], quantidades: List[int], repeticoes: int = 3) -> List[Dict[str, Any]]:
+    """Mede os geradores pedidos, cada um em um processo novo. Retorna uma linha por gerador e quantidade."""
+    linhas = []
+    pasta = Path(tempfile.mkdtemp(prefix="benchmark_ia_detran_"))
+    try:
+        for tipo in geradores:
+            pasta_gerador = pasta / tipo
+            pasta_gerador.mkdir()
+            with _ambiente(IA_DETRAN_DADOS=str(pasta_gerador / "dados"), IA_CACHE="0", ESCALONADOR_IA="0", INSTRUMENTACAO="0", INSTRUMENTACAO_PERFIL=""):
+                contexto = multiprocessing.get_context("spawn")
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                        linhas.extend(executor.submit(_medir_gerador, tipo, quantidades, repeticoes, str(pasta_gerador)).result())
+                except Exception as e:
+                    # Falha ao importar ou aquecer o gerador (ou o processo morreu): uma linha de erro por quantidade
+                    print(f"  {tipo}: {type(e).__name__}: {e}", flush=True)
+                    linhas.extend(_linha_erro(tipo, quantidade, e) for quantidade in quantidades)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return linhas
+
+
+# ---------------- Referência ----------------
+
+def _chave(linha: Dict[str, Any]) -> str:
+    return f"{linha['gerador']}/{linha['itens']}"
+
+
+def comparar(linhas: List[Dict[str, Any]], referencia: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Pioras em relação à referência: mais que `tolerancia` (fração) e acima do limiar de ruído da métrica."""
+    por_chave = {_chave(linha): linha for linha in referencia.get("resultados", [])}
+    pioras = []
+    for linha in linhas:
+        anterior = por_chave.get(_chave(linha))
+        if anterior is None:
+            continue
+        for metrica, limiar in LIMIARES.items():
+            atual, antes = linha.get(metrica), anterior.get(metrica)
+            if atual is None or antes is None:
+                continue
+            if atual > antes * (1 + tolerancia) and atual - antes > limiar:
+                pioras.append(f"{_chave(linha)} {metrica}: {antes} -> {atual} (+{(atual / antes - 1) * 100 if antes else 100:.0f}%)")
+    return pioras
+
+
+def _imprimir(linhas: List[Dict[str, Any]]) -> None:
+    print(f"{'gerador':<8}{'itens':>6}{'total':>10}{'render':>10}{'salvar':>10}{'extração':>10}{'memória':>11}{'docx':>11}")
+    for linha in linhas:
+        if linha.get("erro"):
+            print(f"{linha['gerador']:<8}{linha['itens']:>6}  erro: {linha['erro']}")
+            continue
+
+        def segundos(metrica):
+            return f"{linha[metrica]:.3f}s" if linha[metrica] is not None else "-"
+        print(
+            f"{linha['gerador']:<8}{linha['itens']:>6}{segundos('segundos'):>10}{segundos('render_s'):>10}"
+            f"{segundos('salvar_s'):>10}{segundos('extracao_s'):>10}{linha['memoria_pico_mb']:>8.1f} MB"
+            f"{linha['bytes'] / 1024:>8.0f} KB"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m comum.benchmark", description="Mede o custo dos geradores de documentos.")
+    parser.add_argument("geradores", nargs="*", help=f"geradores a medir (padrão: todos; opções: {', '.join(GERADORES)})")
+    parser.add_argument("--itens", default=",".join(map(str, QUANTIDADES_PADRAO)),
+                        help="quantidades de itens, separadas por vírgula (padrão: %(default)s)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções por medição (padrão: %(default)s)")
+    parser.add_argument("--referencia", type=Path, default=config.BENCHMARK_REFERENCIA,
+                        help="arquivo de referência (padrão: %(default)s)")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="piora aceita em relação à referência, em fração (padrão: %(default)s)")
+    parser.add_argument("--salvar-referencia", action="store_true", help="grava os resultados como a nova referência")
+    args = parser.parse_args(argv)
+
+    try:
+        quantidades = [int(parte) for parte in args.itens.split(",") if parte.strip()]
+    except ValueError:
+        parser.error(f"--itens inválido: {args.itens}")
+    desconhecidos = [tipo for tipo in args.geradores if tipo not in GERADORES]
+    if desconhecidos:
+        parser.error(f"gerador desconhecido: {', '.join(desconhecidos)} (opções: {', '.join(GERADORES)})")
+    geradores = args.geradores or list(GERADORES)
+
+    linhas = executar_benchmark(geradores, quantidades, max(1, args.repeticoes))
+    _imprimir(linhas)
+    falhas = sum(1 for linha in linhas if linha.get("erro"))
+    if falhas:
+        print(f"{falhas} medição(ões) falharam; veja a coluna de erro acima.")
+
+    if args.salvar_referencia:
+        args.referencia.parent.mkdir(parents=True, exist_ok=True)
+        with args.referencia.open("w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(timespec="seconds"), "resultados": linhas}, f, indent=4, ensure_ascii=False)
+        print(f"Referência gravada em {args.referencia}")
+        return 1 if falhas else 0
+
+    if not args.referencia.exists():
+        print(f"Sem referência em {args.referencia}; use --salvar-referencia para gravar uma.")
+        return 1 if falhas else 0
+    with args.referencia.open(encoding="utf-8") as f:
+        referencia = json.load(f)
+    pioras = comparar(linhas, referencia, args.tolerancia)
+    if pioras:
+        print(f"Pioras em relação à referência de {referencia.get('gerado_em')}:")
+        for piora in pioras:
+            print(f"  {piora}")
+        return 1
+    print(f"Nenhuma piora acima de {args.tolerancia:.0%} em relação à referência de {referencia.get('gerado_em')}.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# cache_ia.py
+# Cache persistente (SQLite) das respostas do modelo de IA.
+#
+# A chave é o hash de (modelo, prompt, opções), então a mesma entrada devolve o
+# mesmo texto em milissegundos, mesmo após reiniciar o Streamlit. Entradas expiram
+# após CACHE_IA_TTL e, quando o banco passa de CACHE_IA_MAX_BYTES, as menos
+# usadas recentemente são removidas (LRU).
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from comum import config
+
+
+class CacheIA:
+    def __init__(self, caminho: Path, ttl: int, max_bytes: int, ativo: bool = True):
+        self.caminho = Path(caminho)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.ativo = ativo
+
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if self.ativo:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            with self._conexao() as con:
+                con.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS respostas (
+                        chave       TEXT PRIMARY KEY,
+                        modelo      TEXT NOT NULL,
+                        resposta    TEXT NOT NULL,
+                        tamanho     INTEGER NOT NULL,
+                        criado_em   REAL NOT NULL,
+                        acessado_em REAL NOT NULL
+                    )
+                    """
+                )
+                con.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread: as seções são geradas em paralelo
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def chave(modelo: str, prompt: str, opcoes: Optional[Dict[str, Any]] = None) -> str:
+        bruto = json.dumps([modelo, prompt, opcoes or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+    def obter(self, modelo: str, prompt: str, opcoes: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Retorna a resposta guardada ou None se não houver (ou estiver expirada)."""
+        if not self.ativo:
+            return None
+
+        chave = self.chave(modelo, prompt, opcoes)
+        agora = time.time()
+        try:
+            with self._conexao() as con:
+                linha = con.execute(
+                    "SELECT resposta, criado_em FROM respostas WHERE chave = ?", (chave,)
+                ).fetchone()
+                if linha is not None and agora - linha[1] <= self.ttl:
+                    con.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+                else:
+                    linha = None
+        except sqlite3.Error as e:
+            print(f"Erro ao consultar o cache da IA: {e}")
+            linha = None
+
+        with self._lock:
+            if linha is None:
+                self.falhas += 1
+                return None
+            self.acertos += 1
+        return linha[0]
+
+    def guardar(self, modelo: str, prompt: str, opcoes: Optional[Dict[str, Any]], resposta: str) -> None:
+        if not self.ativo:
+            return
+
+        agora = time.time()
+        try:
+            with self._conexao() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.chave(modelo, prompt, opcoes), modelo, resposta, len(resposta.encode("utf-8")), agora, agora),
+                )
+                self._despejar(con, agora)
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar no cache da IA: {e}")
+
+    def _despejar(self, con: sqlite3.Connection, agora: float) -> None:
+        con.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.ttl,))
+
+        total = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Remove as menos acessadas até caber no limite
+        excesso = total - self.max_bytes
+        removidas = []
+        for chave, tamanho in con.execute("SELECT chave, tamanho FROM respostas ORDER BY acessado_em"):
+            removidas.append((chave,))
+            excesso -= tamanho
+            if excesso <= 0:
+                break
+        con.executemany("DELETE FROM respostas WHERE chave = ?", removidas)
+
+    def limpar(self) -> None:
+        if self.ativo:
+            with self._conexao() as con:
+                con.execute("DELETE FROM respostas")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        entradas, tamanho = 0, 0
+        if self.ativo:
+            with self._conexao() as con:
+                entradas, tamanho = con.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "entradas": entradas,
+                "bytes": tamanho,
+            }
+
+
+_cache: Optional[CacheIA] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache() -> CacheIA:
+    """Instância única do cache por processo, configurada por comum.config."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheIA(
+                config.CACHE_IA_ARQUIVO,
+                ttl=config.CACHE_IA_TTL,
+                max_bytes=config.CACHE_IA_MAX_BYTES,
+                ativo=config.CACHE_IA_ATIVO,
+            )
+        return _cache
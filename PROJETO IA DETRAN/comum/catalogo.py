@@ -0,0 +1,342 @@
+# catalogo.py
+# Catálogo local (SQLite) dos documentos gerados: DFD, ETP e ISFD.
+#
+# Os geradores registram cada documento ao salvá-lo, com o tipo, número, data,
+# itens, valor total, caminhos e o contexto usado no template (o mesmo do .json
+# salvo ao lado do .docx). As listas de seleção dos apps e as importações entre
+# documentos (ex.: o ISFD carregando os dados de um DFD) passam a ser consultas
+# indexadas, sem percorrer as pastas nem reabrir o .json a cada execução do script.
+#
+# Documentos gerados antes do catálogo existir entram pela sincronização, feita
+# uma vez por processo para cada tipo (sincronizar), que lê apenas os arquivos que
+# ainda não estão no catálogo.
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from comum import config
+
+# Tipo de documento -> (pasta onde o gerador salva, padrão dos .docx, sufixo do .json ao lado)
+PASTAS: Dict[str, Tuple[Path, str, str]] = {
+    "dfd": (config.RAIZ_PROJETO / "DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA" / "static" / "arquivos_gerados", "DFD_*.docx", ".json"),
+    "etp": (config.RAIZ_PROJETO / "ETP - ESTUDO TÉCNICO PRELIMINAR", "ETP_*.docx", "_DATA.json"),
+    "isfd": (config.RAIZ_PROJETO / "INSTRUMENTO SIMPLIFICADO DE FORMALIZAÇÃO DE DEMANDA" / "output", "ISFD_*.docx", ".json"),
+}
+
+# Nome da lista de itens no contexto de cada tipo
+CHAVE_ITENS = {"dfd": "lista_itens", "etp": "lista_de_itens", "isfd": "lista_itens"}
+
+
+def _numero_valor(valor: Any) -> Optional[float]:
+    """Converte 'R$ 1.234,56', '1234.56' ou números em float (None se não for possível)."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+    texto = valor.replace("R$", "").strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def _resumo(tipo: str, dados: Dict[str, Any]) -> Dict[str, Any]:
+    """Número, título, itens e valor total de um documento, a partir do contexto salvo."""
+    itens = dados.get(CHAVE_ITENS.get(tipo, "lista_itens")) or []
+    if not isinstance(itens, list):
+        itens = []
+
+    numero = None
+    if tipo == "etp":
+        numero = dados.get("etp_numero")
+    elif tipo == "isfd" and dados.get("numero_ISFD") is not None:
+        numero = f"{dados['numero_ISFD']}/{dados.get('ano', '')}".rstrip("/")
+
+    titulo = ""
+    if itens and isinstance(itens[0], dict):
+        titulo = str(itens[0].get("descricao") or "")
+    titulo = titulo or str(dados.get("obj_sint") or dados.get("objetivo") or "")
+
+    total = _numero_valor(dados.get("total_aquisicao"))
+    if total is None:
+        parciais = []
+        for item in itens:
+            if not isinstance(item, dict):
+                continue
+            valor = _numero_valor(item.get("valor_un", item.get("valor_unitario")))
+            qtd = _numero_valor(item.get("qtd"))
+            if valor is not None and qtd is not None:
+                parciais.append(valor * qtd)
+        total = sum(parciais) if parciais else None
+
+    return {"numero": numero, "titulo": titulo.strip()[:300], "itens": itens, "total": total}
+
+
+class CatalogoDocumentos:
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        self._local = threading.local()
+        self._sincronizados = set()
+        self._lock = threading.Lock()
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documentos (
+                    caminho       TEXT PRIMARY KEY,
+                    tipo          TEXT NOT NULL,
+                    numero        TEXT,
+                    titulo        TEXT NOT NULL DEFAULT '',
+                    data          REAL NOT NULL,
+                    total         REAL,
+                    num_itens     INTEGER NOT NULL DEFAULT 0,
+                    caminho_json  TEXT,
+                    dados         TEXT,
+                    registrado_em REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos (tipo, data DESC)")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS itens (
+                    caminho   TEXT NOT NULL,
+                    ordem     INTEGER NOT NULL,
+                    codigo    TEXT,
+                    descricao TEXT,
+                    unidade   TEXT,
+                    qtd       TEXT,
+                    PRIMARY KEY (caminho, ordem)
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_itens_codigo ON itens (codigo)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread: os jobs da fila registram documentos em paralelo
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def _chave(caminho: Union[str, Path]) -> str:
+        return str(Path(caminho).resolve())
+
+    # ---------------- Gravação ----------------
+
+    def registrar(
+        self,
+        tipo: str,
+        caminho_docx: Union[str, Path],
+        dados: Optional[Dict[str, Any]] = None,
+        caminho_json: Union[str, Path, None] = None,
+    ) -> None:
+        """
+        Registra (ou atualiza) um documento gerado.
+
+        `dados` é o contexto usado no template; se não for informado, é lido de
+        `caminho_json`. Documentos sem contexto (.docx antigos) também entram no
+        catálogo, só sem dados para importação.
+        """
+        caminho_docx = Path(caminho_docx)
+        if dados is None and caminho_json is not None and Path(caminho_json).is_file():
+            try:
+                with Path(caminho_json).open(encoding="utf-8") as f:
+                    dados = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f'Erro ao ler "{caminho_json}" para o catálogo: {e}')
+
+        resumo = _resumo(tipo, dados or {})
+        try:
+            data = caminho_docx.stat().st_mtime
+        except OSError:
+            data = time.time()
+        chave = self._chave(caminho_docx)
+
+        try:
+            with self._conexao() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        chave,
+                        tipo,
+                        resumo["numero"],
+                        resumo["titulo"],
+                        data,
+                        resumo["total"],
+                        len(resumo["itens"]),
+                        self._chave(caminho_json) if caminho_json else None,
+                        json.dumps(dados, ensure_ascii=False, default=str) if dados is not None else None,
+                        time.time(),
+                    ),
+                )
+                con.execute("DELETE FROM itens WHERE caminho = ?", (chave,))
+                con.executemany(
+                    "INSERT INTO itens VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            chave,
+                            ordem,
+                            str(item.get("catmat", item.get("cod_siag", "")) or "").strip(),
+                            str(item.get("descricao", "") or ""),
+                            str(item.get("unidade", "") or ""),
+                            str(item.get("qtd", "") or ""),
+                        )
+                        for ordem, item in enumerate(resumo["itens"], start=1)
+                        if isinstance(item, dict)
+                    ],
+                )
+        except sqlite3.Error as e:
+            print(f"Erro ao registrar documento no catálogo: {e}")
+
+    def remover(self, caminho: Union[str, Path]) -> None:
+        chave = self._chave(caminho)
+        with self._conexao() as con:
+            con.execute("DELETE FROM documentos WHERE caminho = ?", (chave,))
+            con.execute("DELETE FROM itens WHERE caminho = ?", (chave,))
+
+    def sincronizar(self, tipo: str, forcar: bool = False) -> int:
+        """
+        Acrescenta ao catálogo os documentos de `tipo` que já estavam na pasta do gerador
+        e remove os que foram apagados. Roda uma vez por processo (forcar=True repete).
+
+        Retorna quantos documentos foram acrescentados.
+        """
+        with self._lock:
+            if tipo in self._sincronizados and not forcar:
+                return 0
+            self._sincronizados.add(tipo)
+
+        pasta, padrao, sufixo_json = PASTAS[tipo]
+        if not pasta.is_dir():
+            return 0
+
+        try:
+            conhecidos = {
+                linha["caminho"]: linha["data"]
+                for linha in self._conexao().execute("SELECT caminho, data FROM documentos WHERE tipo = ?", (tipo,))
+            }
+        except sqlite3.Error as e:
+            print(f"Erro ao consultar o catálogo: {e}")
+            return 0
+
+        novos = 0
+        presentes = set()
+        for docx in pasta.glob(padrao):
+            if docx.name.startswith("~$"):  # arquivo temporário do Word
+                continue
+            chave = self._chave(docx)
+            presentes.add(chave)
+            if chave in conhecidos and conhecidos[chave] >= docx.stat().st_mtime:
+                continue
+            self.registrar(tipo, docx, caminho_json=docx.with_name(docx.stem + sufixo_json))
+            novos += 1
+
+        # Sincroniza só a pasta do gerador: documentos salvos em outras pastas (ex.: lotes) ficam
+        for chave in conhecidos:
+            if chave not in presentes and Path(chave).parent == pasta.resolve():
+                self.remover(chave)
+        return novos
+
+    # ---------------- Consulta ----------------
+
+    def listar(
+        self,
+        tipo: str,
+        texto: Optional[str] = None,
+        com_dados: bool = False,
+        limite: int = 500,
+    ) -> List[Dict[str, Any]]:
+        """
+        Documentos de `tipo`, do mais novo para o mais antigo, sem o contexto completo.
+
+        `texto` filtra por número ou título; com_dados=True traz só os que podem ser importados.
+        """
+        sql = (
+            "SELECT caminho, tipo, numero, titulo, data, total, num_itens, caminho_json, "
+            "dados IS NOT NULL AS tem_dados FROM documentos WHERE tipo = ?"
+        )
+        parametros: List[Any] = [tipo]
+        if texto:
+            sql += " AND (titulo LIKE ? OR numero LIKE ?)"
+            parametros += [f"%{texto}%", f"%{texto}%"]
+        if com_dados:
+            sql += " AND dados IS NOT NULL"
+        sql += " ORDER BY data DESC LIMIT ?"
+        parametros.append(limite)
+        return [dict(linha) for linha in self._conexao().execute(sql, parametros)]
+
+    def obter(self, caminho: Union[str, Path]) -> Optional[Dict[str, Any]]:
+        """Documento completo (com `dados` e `itens`); None se não estiver no catálogo ou se o arquivo sumiu."""
+        chave = self._chave(caminho)
+        linha = self._conexao().execute("SELECT * FROM documentos WHERE caminho = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        if not Path(chave).exists():
+            self.remover(chave)
+            return None
+
+        documento = dict(linha)
+        documento["dados"] = json.loads(documento["dados"]) if documento["dados"] else None
+        documento["itens"] = (documento["dados"] or {}).get(CHAVE_ITENS.get(documento["tipo"], "lista_itens")) or []
+        return documento
+
+    def documentos_com_item(self, codigo: str, tipo: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Documentos que têm um item com o código SIAG/CATMAT informado."""
+        sql = (
+            "SELECT DISTINCT d.caminho, d.tipo, d.numero, d.titulo, d.data, d.total, d.num_itens "
+            "FROM itens i JOIN documentos d ON d.caminho = i.caminho WHERE i.codigo = ?"
+        )
+        parametros: List[Any] = [str(codigo).strip()]
+        if tipo:
+            sql += " AND d.tipo = ?"
+            parametros.append(tipo)
+        sql += " ORDER BY d.data DESC"
+        return [dict(linha) for linha in self._conexao().execute(sql, parametros)]
+
+
+_catalogo: Optional[CatalogoDocumentos] = None
+_catalogo_lock = threading.Lock()
+
+
+def obter_catalogo() -> CatalogoDocumentos:
+    """Instância única do catálogo por processo, configurada por comum.config."""
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            _catalogo = CatalogoDocumentos(config.CATALOGO_ARQUIVO)
+        return _catalogo
+
+
+def registrar_documento(
+    tipo: str,
+    caminho_docx: Union[str, Path],
+    dados: Optional[Dict[str, Any]] = None,
+    caminho_json: Union[str, Path, None] = None,
+) -> None:
+    """Atalho usado pelos geradores ao salvar um documento."""
+    obter_catalogo().registrar(tipo, caminho_docx, dados, caminho_json)
+
+
+def documentos_para_selecao(tipo: str, com_dados: bool = False) -> Dict[str, str]:
+    """{caminho: rótulo} para as listas de seleção dos apps, do documento mais novo ao mais antigo."""
+    catalogo = obter_catalogo()
+    catalogo.sincronizar(tipo)
+    opcoes = {}
+    for documento in catalogo.listar(tipo, com_dados=com_dados):
+        rotulo = Path(documento["caminho"]).name
+        if documento["numero"]:
+            rotulo = f"{documento['numero']} - {rotulo}"
+        opcoes[documento["caminho"]] = rotulo
+    return opcoes
@@ -0,0 +1,252 @@
+# cliente_ia.py
+# Funções de acesso ao modelo de IA compartilhadas pelos geradores de documentos.
+#
+# A conversa com o modelo fica no backend configurado (comum.backend_ia: Ollama ou
+# o backend falso de testes); aqui ficam o cache das respostas, as mensagens de
+# erro que vão para o documento e a geração de várias seções em paralelo.
+#
+# gerar() devolve o texto completo; gerar_stream() devolve o texto em fragmentos à
+# medida que o modelo produz, para ser exibido com st.write_stream. Fechar o gerador
+# (ou sinalizar `cancelar`) fecha a conexão, e o Ollama interrompe a geração.
+#
+# Cada chamada é medida como um span "ia.gerar" (comum.instrumentacao), com o acerto
+# de cache, os tokens informados pelo backend e, no streaming, o tempo até o primeiro
+# fragmento.
+#
+# As chamadas que vão ao modelo (não as respondidas pelo cache) esperam uma vaga no
+# escalonador compartilhado pelos apps (comum.escalonador_ia), que limita quantas
+# rodam ao mesmo tempo, ordena a fila por prioridade e usuário e devolve uma
+# mensagem entre colchetes quando a IA está sobrecarregada.
+#
+# `formato` ("json" ou um JSON Schema) pede a resposta em JSON; quem chama valida o
+# texto devolvido, já que uma falha continua chegando como mensagem entre colchetes.
+# Com `validar`, só respostas aceitas por ele entram no cache (e são lidas dele), para
+# que uma resposta malformada não seja devolvida de novo a cada chamada.
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Union
+
+from comum import config
+from comum.backend_ia import ErroBackendIA, obter_backend
+from comum.cache_ia import obter_cache
+from comum.escalonador_ia import vaga_ia
+from comum.instrumentacao import iniciar_span, medir, no_contexto_atual
+
+
+def opcoes_modelo(max_tokens: int) -> dict:
+    """Opções de geração enviadas ao modelo (também fazem parte da chave do cache)."""
+    return {
+        "temperature": config.IA_TEMPERATURA,
+        "top_p": config.IA_TOP_P,
+        "max_tokens": max_tokens,
+    }
+
+
+_PEDACOS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Número aproximado de tokens de `texto`, sem o tokenizador do modelo.
+
+    Cada sinal de pontuação conta um token e cada palavra, um token a cada 5 letras
+    (no Llama 3, texto em português fica perto de 1 token a cada 4 caracteres).
+    """
+    return sum(1 + (len(pedaco) - 1) // 5 for pedaco in _PEDACOS.findall(texto))
+
+
+def _opcoes_cache(opcoes: dict, formato) -> dict:
+    # O formato pedido muda a resposta, então entra na chave do cache
+    return opcoes if formato is None else {**opcoes, "format": formato}
+
+
+def gerar(
+    prompt: str,
+    modelo: Optional[str],
+    opcoes: dict,
+    keep_alive: Optional[str] = None,
+    usar_cache: bool = True,
+    timeout: int = 120,
+    formato: Union[str, dict, None] = None,
+    validar: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    Gera texto com o modelo e devolve a resposta completa.
+
+    Respostas válidas ficam no cache local (comum.cache_ia); usar_cache=False ignora
+    o que estiver guardado. Em caso de falha devolve uma mensagem entre colchetes,
+    que é inserida no documento no lugar do texto.
+    """
+    modelo = modelo or config.IA_MODELO
+    chave_opcoes = _opcoes_cache(opcoes, formato)
+    with medir("ia.gerar", modelo=modelo, caracteres_prompt=len(prompt), stream=False) as span:
+        cache = obter_cache()
+        if usar_cache:
+            texto_em_cache = cache.obter(modelo, prompt, chave_opcoes)
+            if texto_em_cache is not None and (validar is None or validar(texto_em_cache)):
+                span.definir(cache=True, caracteres_resposta=len(texto_em_cache))
+                return texto_em_cache
+
+        metricas = {}
+        span.definir(cache=False)
+        try:
+            with vaga_ia() as vaga:
+                span.definir(espera_fila_s=round(vaga.espera, 3))
+                texto = obter_backend().gerar(
+                    prompt, modelo, opcoes, keep_alive=keep_alive, timeout=timeout, metricas=metricas, formato=formato
+                ).strip()
+                # Sem streaming, o tempo até o primeiro token é o total menos o tempo gerando a resposta
+                vaga.latencia = time.time() - vaga.iniciado_em - metricas.get("ollama_geracao_s", 0.0)
+        except ErroBackendIA as e:
+            span.definir(falha=e.texto)
+            return e.texto
+        except Exception as e:
+            print(f"Erro ao consultar modelo de IA: {e}")
+            span.definir(falha=f"{type(e).__name__}: {e}")
+            return "[FALHA AO GERAR TEXTO COM IA]"
+
+        span.definir(caracteres_resposta=len(texto), **metricas)
+        if validar is None or validar(texto):
+            cache.guardar(modelo, prompt, chave_opcoes, texto)
+        return texto
+
+
+def gerar_stream(
+    prompt: str,
+    modelo: Optional[str],
+    opcoes: dict,
+    keep_alive: Optional[str] = None,
+    usar_cache: bool = True,
+    cancelar: Optional[threading.Event] = None,
+    timeout: int = 120,
+    formato: Union[str, dict, None] = None,
+    validar: Optional[Callable[[str], bool]] = None,
+) -> Iterator[str]:
+    """
+    Gera texto com o modelo em modo streaming, produzindo os fragmentos conforme chegam.
+
+    Se a resposta já estiver no cache (e usar_cache=True) ela é entregue de uma vez.
+    A resposta completa é gravada no cache apenas se o modelo terminar a geração;
+    respostas canceladas ou com erro não são guardadas.
+    """
+    modelo = modelo or config.IA_MODELO
+    chave_opcoes = _opcoes_cache(opcoes, formato)
+    # iniciar_span, e não medir: o gerador roda no contexto de quem o consome
+    span = iniciar_span("ia.gerar", modelo=modelo, caracteres_prompt=len(prompt), stream=True)
+    try:
+        cache = obter_cache()
+        if usar_cache:
+            texto_em_cache = cache.obter(modelo, prompt, chave_opcoes)
+            if texto_em_cache is not None and (validar is None or validar(texto_em_cache)):
+                span.definir(cache=True, caracteres_resposta=len(texto_em_cache))
+                yield texto_em_cache
+                return
+
+        partes = []
+        metricas = {}
+        span.definir(cache=False)
+        try:
+            with vaga_ia(cancelar) as vaga:
+                span.definir(espera_fila_s=round(vaga.espera, 3))
+                fluxo = obter_backend().gerar_stream(
+                    prompt, modelo, opcoes, keep_alive=keep_alive, timeout=timeout, metricas=metricas, formato=formato
+                )
+                try:
+                    for fragmento in fluxo:
+                        if cancelar is not None and cancelar.is_set():
+                            span.definir(cancelado=True)
+                            return
+                        # O primeiro fragmento costuma vir com espaços/quebras à esquerda
+                        if not partes:
+                            fragmento = fragmento.lstrip()
+                            if not fragmento:
+                                continue
+                            vaga.latencia = time.time() - vaga.iniciado_em
+                            span.definir(primeiro_fragmento_s=round(time.time() - span.inicio, 3))
+                        partes.append(fragmento)
+                        yield fragmento
+                finally:
+                    fluxo.close()
+                    span.definir(caracteres_resposta=sum(len(parte) for parte in partes), **metricas)
+        except ErroBackendIA as e:
+            span.definir(falha=e.texto)
+            yield e.texto
+            return
+        except Exception as e:
+            print(f"Erro ao consultar modelo de IA: {e}")
+            span.definir(falha=f"{type(e).__name__}: {e}")
+            yield "[FALHA AO GERAR TEXTO COM IA]"
+            return
+
+        texto = "".join(partes).strip()
+        if validar is None or validar(texto):
+            cache.guardar(modelo, prompt, chave_opcoes, texto)
+    finally:
+        span.finalizar()
+
+
+def aquecer_modelo(modelo: Optional[str] = None, keep_alive: Optional[str] = None) -> bool:
+    """
+    Carrega o modelo na memória do servidor sem gerar texto.
+
+    Chamado uma vez quando os serviços são iniciados, para que a primeira geração
+    não pague o tempo de carregar os pesos do disco.
+    """
+    return obter_backend().aquecer(modelo or config.IA_MODELO, keep_alive)
+
+
+_FIM = object()
+
+
+def transmitir_em_paralelo(
+    fluxos: Dict[str, Callable[[], Iterator[str]]],
+    max_paralelo: int,
+    cancelar: Optional[threading.Event] = None,
+) -> Dict[str, Iterator[str]]:
+    """
+    Consome vários fluxos de texto ao mesmo tempo e devolve um iterador por chave.
+
+    Cada fluxo roda em uma thread do pool (até `max_paralelo`) e acumula os fragmentos
+    em uma fila; os iteradores retornados leem dessas filas. Assim a interface pode
+    exibir as seções em ordem, uma após a outra, enquanto as seguintes já estão sendo
+    geradas. Ao sinalizar `cancelar`, os fluxos ainda abertos são encerrados.
+    """
+    cancelar = cancelar or threading.Event()
+    filas = {chave: queue.Queue() for chave in fluxos}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_paralelo, len(fluxos))), thread_name_prefix="ia-stream")
+
+    def consumir(chave, criar_fluxo):
+        fila = filas[chave]
+        try:
+            if cancelar.is_set():
+                return
+            fluxo = criar_fluxo()
+            try:
+                for fragmento in fluxo:
+                    fila.put(fragmento)
+                    if cancelar.is_set():
+                        break
+            finally:
+                if hasattr(fluxo, "close"):
+                    fluxo.close()
+        except Exception as e:
+            print(f"Erro ao gerar texto com IA: {e}")
+            fila.put("[FALHA AO GERAR TEXTO COM IA]")
+        finally:
+            fila.put(_FIM)
+
+    for chave, criar_fluxo in fluxos.items():
+        executor.submit(no_contexto_atual(consumir), chave, criar_fluxo)
+    executor.shutdown(wait=False)
+
+    def ler(fila):
+        while True:
+            fragmento = fila.get()
+            if fragmento is _FIM or cancelar.is_set():
+                return
+            yield fragmento
+
+    return {chave: ler(fila) for chave, fila in filas.items()}
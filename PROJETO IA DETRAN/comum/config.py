@@ -0,0 +1,126 @@
+# config.py
+# Configurações compartilhadas pelos geradores de documentos.
+# Todos os valores podem ser sobrescritos por variáveis de ambiente.
+import os
+from pathlib import Path
+
+RAIZ_PROJETO = Path(__file__).resolve().parent.parent
+
+# Pasta com os bancos locais (cache, filas, catálogos). Não é versionada.
+PASTA_DADOS = Path(os.environ.get("IA_DETRAN_DADOS", RAIZ_PROJETO / "dados"))
+
+# ---------------- Modelo de IA ----------------
+# Backend de geração: "ollama" (padrão) ou "falso" (texto fixo, sem modelo; para testes e benchmarks)
+IA_BACKEND = os.environ.get("IA_BACKEND", "ollama").strip().lower()
+IA_MODELO = os.environ.get("IA_MODELO", "llama3:8b")
+IA_TEMPERATURA = float(os.environ.get("IA_TEMPERATURA", "0.3"))
+IA_TOP_P = float(os.environ.get("IA_TOP_P", "0.9"))
+# Tempo que o servidor mantém o modelo na memória após a última requisição
+IA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "10m")
+# Requisições simultâneas aceitas pelo servidor; também define o tamanho do pool de conexões
+IA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+# Tokens (estimados) da lista de itens nos prompts do DFD; acima disso os itens são resumidos
+IA_ORCAMENTO_ITENS = int(os.environ.get("IA_ORCAMENTO_ITENS", "1500"))
+# Seções do DFD: "secoes" (uma chamada por seção, padrão) ou "json" (todas em uma chamada com
+# resposta em JSON; as seções que vierem faltando ou inválidas são geradas uma a uma)
+IA_DFD_MODO = os.environ.get("IA_DFD_MODO", "secoes").strip().lower()
+
+# ---------------- Servidor Ollama ----------------
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434").rstrip("/")
+# Novas tentativas em falha de conexão ou resposta 502/503/504 (com espera crescente)
+OLLAMA_TENTATIVAS = int(os.environ.get("OLLAMA_TENTATIVAS", "3"))
+
+# ---------------- Backend falso ----------------
+IA_FALSO_TOKENS_POR_SEGUNDO = float(os.environ.get("IA_FALSO_TOKENS_POR_SEGUNDO", "40"))
+IA_FALSO_LATENCIA = float(os.environ.get("IA_FALSO_LATENCIA", "0.2"))  # segundos até o primeiro token
+IA_FALSO_TOKENS = int(os.environ.get("IA_FALSO_TOKENS", "60"))  # tamanho máximo da resposta
+
+# ---------------- Cache de respostas da IA ----------------
+CACHE_IA_ATIVO = os.environ.get("IA_CACHE", "1") != "0"
+CACHE_IA_ARQUIVO = Path(os.environ.get("IA_CACHE_ARQUIVO", PASTA_DADOS / "cache_ia.sqlite3"))
+CACHE_IA_TTL = int(os.environ.get("IA_CACHE_TTL", 7 * 24 * 3600))  # segundos
+CACHE_IA_MAX_BYTES = int(os.environ.get("IA_CACHE_MAX_MB", 64)) * 1024 * 1024
+
+# ---------------- Fila de geração de documentos ----------------
+FILA_JOBS_ARQUIVO = Path(os.environ.get("FILA_JOBS_ARQUIVO", PASTA_DADOS / "fila_jobs.sqlite3"))
+# Documentos gerados ao mesmo tempo por app; os demais aguardam na fila
+FILA_JOBS_WORKERS = int(os.environ.get("FILA_JOBS_WORKERS", "4"))
+FILA_JOBS_RETENCAO = int(os.environ.get("FILA_JOBS_RETENCAO", 7 * 24 * 3600))  # segundos
+
+# ---------------- Catálogo dos documentos gerados ----------------
+CATALOGO_ARQUIVO = Path(os.environ.get("CATALOGO_ARQUIVO", PASTA_DADOS / "catalogo.sqlite3"))
+
+# ---------------- Espelho local do SIAG ----------------
+SIAG_CATALOGO_ARQUIVO = Path(os.environ.get("SIAG_CATALOGO_ARQUIVO", PASTA_DADOS / "siag.sqlite3"))
+# Idade a partir da qual `python siag_catalogo.py atualizar` refaz uma consulta no SIAG
+SIAG_CATALOGO_VALIDADE_DIAS = float(os.environ.get("SIAG_CATALOGO_VALIDADE_DIAS", "30"))
+
+# ---------------- Consulta online ao SIAG ----------------
+SIAG_URL = os.environ.get("SIAG_URL", "http://aquisicoes.gestao.mt.gov.br/sgc/faces/pub/sgc/central/ItemCompraPageList.jsp")
+SIAG_TEMPO_LIMITE = float(os.environ.get("SIAG_TEMPO_LIMITE", "30"))  # segundos
+# Cliente HTTP (siag_http): páginas de resultados lidas por consulta
+SIAG_HTTP_MAX_PAGINAS = int(os.environ.get("SIAG_HTTP_MAX_PAGINAS", "20"))
+# Consultas simultâneas ao SIAG na busca de vários itens de uma vez
+SIAG_BUSCAS_SIMULTANEAS = int(os.environ.get("SIAG_BUSCAS_SIMULTANEAS", "4"))
+# Usa o Chrome headless (siag_navegador) quando o cliente HTTP falha
+SIAG_NAVEGADOR_RESERVA = os.environ.get("SIAG_NAVEGADOR_RESERVA", "1") != "0"
+# Navegadores abertos ao mesmo tempo e consultas feitas por cada um antes de ser reiniciado
+SIAG_NAVEGADORES = int(os.environ.get("SIAG_NAVEGADORES", "2"))
+SIAG_NAVEGADOR_MAX_USOS = int(os.environ.get("SIAG_NAVEGADOR_MAX_USOS", "50"))
+
+# ---------------- Supervisor dos apps (0.INTERFACE_INICIAL/controlador.py) ----------------
+SUPERVISOR_INTERVALO = float(os.environ.get("SUPERVISOR_INTERVALO", "2"))  # segundos entre health checks
+# Tempo máximo para um app responder ao /_stcore/health depois de iniciado
+SUPERVISOR_TEMPO_INICIO = float(os.environ.get("SUPERVISOR_TEMPO_INICIO", "90"))
+# Espera máxima entre tentativas de reiniciar um app que caiu (dobra a cada falha seguida)
+SUPERVISOR_ESPERA_MAX = float(os.environ.get("SUPERVISOR_ESPERA_MAX", "60"))
+# Sob demanda: cada app só sobe quando é aberto no portal (em vez de todos no "Iniciar Serviços")
+SUPERVISOR_SOB_DEMANDA = os.environ.get("SUPERVISOR_SOB_DEMANDA", "1") != "0"
+# Minutos sem nenhuma sessão aberta até o app ser encerrado (0: nunca encerra)
+SUPERVISOR_OCIOSO_MIN = float(os.environ.get("SUPERVISOR_OCIOSO_MIN", "30"))
+
+# ---------------- Instrumentação (comum.instrumentacao) ----------------
+INSTRUMENTACAO = os.environ.get("INSTRUMENTACAO", "1") != "0"
+INSTRUMENTACAO_ARQUIVO = Path(os.environ.get("INSTRUMENTACAO_ARQUIVO", PASTA_DADOS / "instrumentacao.jsonl"))
+# Tamanho a partir do qual o arquivo é renomeado para .1 e recomeçado
+INSTRUMENTACAO_MAX_BYTES = int(os.environ.get("INSTRUMENTACAO_MAX_MB", 32)) * 1024 * 1024
+# Perfil de cada requisição: "" (desligado), "cprofile" ou "pyinstrument"
+INSTRUMENTACAO_PERFIL = os.environ.get("INSTRUMENTACAO_PERFIL", "").strip().lower()
+INSTRUMENTACAO_PASTA_PERFIS = Path(os.environ.get("INSTRUMENTACAO_PASTA_PERFIS", PASTA_DADOS / "perfis"))
+
+# ---------------- Escalonador das chamadas à IA (comum.escalonador_ia) ----------------
+ESCALONADOR_IA = os.environ.get("ESCALONADOR_IA", "1") != "0"
+# Fila compartilhada pelos processos de todos os apps
+ESCALONADOR_ARQUIVO = Path(os.environ.get("ESCALONADOR_ARQUIVO", PASTA_DADOS / "escalonador_ia.sqlite3"))
+# Limites do número de chamadas simultâneas ao modelo, ajustado pela latência observada
+ESCALONADOR_MAX_PARALELO = int(os.environ.get("ESCALONADOR_MAX_PARALELO", IA_NUM_PARALLEL))
+ESCALONADOR_MIN_PARALELO = int(os.environ.get("ESCALONADOR_MIN_PARALELO", "1"))
+ESCALONADOR_MAX_FILA = int(os.environ.get("ESCALONADOR_MAX_FILA", "64"))  # pedidos aguardando; acima disso são recusados
+ESCALONADOR_ESPERA_MAXIMA = float(os.environ.get("ESCALONADOR_ESPERA_MAXIMA", "300"))  # segundos na fila
+# Tempo até o primeiro token acima do qual o número de vagas diminui
+ESCALONADOR_LATENCIA_ALVO = float(os.environ.get("ESCALONADOR_LATENCIA_ALVO", "10"))
+# Segundos na fila depois dos quais um pedido de lote passa a ter a prioridade dos interativos
+ESCALONADOR_ENVELHECIMENTO = float(os.environ.get("ESCALONADOR_ENVELHECIMENTO", "60"))
+
+# ---------------- Logs (comum.logs) ----------------
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO").strip().upper()
+# Um JSON por linha; vazio desliga o arquivo
+LOG_ARQUIVO = os.environ.get("LOG_ARQUIVO", str(PASTA_DADOS / "logs.jsonl"))
+# Tamanho a partir do qual o arquivo é renomeado para .1 e recomeçado
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_MB", 32)) * 1024 * 1024
+LOG_CONSOLE = os.environ.get("LOG_CONSOLE", "1") != "0"  # também escreve no stderr, em texto
+
+# ---------------- Benchmark (python -m comum.benchmark) ----------------
+# Números de referência, comparados a cada execução do benchmark. Ficam junto do código
+# (versionados, fora da pasta de dados): gravados com --salvar-referencia na máquina de
+# referência e atualizados no mesmo commit de uma mudança que altera o custo esperado.
+BENCHMARK_REFERENCIA = Path(os.environ.get("BENCHMARK_REFERENCIA", RAIZ_PROJETO / "comum" / "benchmark_referencia.json"))
+
+# ---------------- Portal (0.INTERFACE_INICIAL) ----------------
+# "separado": um servidor Streamlit por gerador; "unico": todos como páginas de portal.py
+PORTAL_LAYOUT = os.environ.get("PORTAL_LAYOUT", "separado")
+PORTAL_PORTA = os.environ.get("PORTAL_PORTA", "8500")  # porta do portal.py no layout "unico"
+
+# ---------------- Geração em lote (python -m comum.lote) ----------------
+# Processos que geram documentos ao mesmo tempo
+LOTE_PROCESSOS = int(os.environ.get("LOTE_PROCESSOS", min(4, os.cpu_count() or 1)))
@@ -0,0 +1,422 @@
+# escalonador_ia.py
+# Escalonador das chamadas ao modelo de IA, compartilhado por todos os apps.
+#
+# Os cinco apps, os jobs da fila e os lotes chamam o mesmo Ollama. Sem coordenação,
+# um pico de pedidos vira uma fila dentro do próprio Ollama, e os últimos estouram o
+# tempo limite ([ERRO DE TEMPO LIMITE DA IA]) sem que ninguém saiba quantos estão à
+# frente. Aqui cada chamada ao backend (comum.cliente_ia; respostas em cache não
+# passam por aqui) pede uma vaga antes de ir ao modelo:
+#
+#   - a fila é limitada (ESCALONADOR_MAX_FILA): acima disso, ou depois de
+#     ESCALONADOR_ESPERA_MAXIMA segundos esperando, o pedido falha com uma mensagem,
+#     em vez de esperar sem fim;
+#   - pedidos interativos (a interface) passam à frente dos de lote (comum.lote); um
+#     pedido de lote que espera mais de ESCALONADOR_ENVELHECIMENTO segundos passa a
+#     contar como interativo, para não ficar parado enquanto houver usuários;
+#   - entre pedidos de mesma prioridade, vai primeiro o do usuário com menos pedidos
+#     em andamento (divisão justa), e entre os de um mesmo usuário, o mais antigo;
+#   - o número de vagas se ajusta à latência observada (AIMD): cresce aos poucos
+#     enquanto o tempo até o primeiro token fica abaixo de ESCALONADOR_LATENCIA_ALVO e
+#     cai 30% (FATOR_REDUCAO) quando passa do alvo ou a IA estoura o tempo limite.
+#
+# Os apps rodam em processos separados, então a fila fica em SQLite (como a
+# comum.fila_jobs): cada processo grava os seus pedidos e os mantém vivos com um
+# pulso; pedidos de um processo que morreu expiram sozinhos.
+#
+# Quem chama informa a origem dos pedidos com origem_pedidos() (prioridade, usuário
+# e uma função que recebe a posição na fila, para a interface mostrar a espera); a
+# origem vale para as threads criadas com comum.instrumentacao.no_contexto_atual.
+import contextvars
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from comum import config
+from comum.backend_ia import ErroBackendIA, ErroTempoLimiteIA
+
+INTERATIVA = 0
+LOTE = 1
+
+AGUARDANDO = "aguardando"
+EXECUTANDO = "executando"
+
+
+class ErroFilaIA(ErroBackendIA):
+    """O pedido não foi atendido: fila cheia, espera máxima esgotada ou cancelamento."""
+
+
+class Origem(NamedTuple):
+    prioridade: int
+    usuario: str
+    ao_esperar: Optional[Callable[[Optional[int]], None]]  # posição na fila; None quando a vez chega
+
+
+_origem: contextvars.ContextVar[Origem] = contextvars.ContextVar(
+    "origem_pedidos_ia", default=Origem(INTERATIVA, "", None)
+)
+
+
+@contextmanager
+def origem_pedidos(
+    prioridade: Optional[int] = None,
+    usuario: Optional[str] = None,
+    ao_esperar: Optional[Callable[[Optional[int]], None]] = None,
+) -> Iterator[Origem]:
+    """Define prioridade, usuário e aviso de espera dos pedidos à IA feitos dentro do bloco."""
+    atual = _origem.get()
+    origem = Origem(
+        atual.prioridade if prioridade is None else prioridade,
+        atual.usuario if usuario is None else usuario,
+        atual.ao_esperar if ao_esperar is None else ao_esperar,
+    )
+    token = _origem.set(origem)
+    try:
+        yield origem
+    finally:
+        _origem.reset(token)
+
+
+class Vaga:
+    """Vaga concedida a um pedido. Quem chama preenche `latencia` (segundos até o primeiro token)."""
+
+    def __init__(self, pedido_id: Optional[str], iniciado_em: float, espera: float):
+        self.id = pedido_id
+        self.iniciado_em = iniciado_em
+        self.espera = espera
+        self.latencia: Optional[float] = None
+
+
+class EscalonadorIA:
+    INTERVALO = 0.1          # entre verificações da vez (a vaga pode ser liberada por outro processo)
+    INTERVALO_PULSO = 2.0    # cada processo renova os seus pedidos e apaga os expirados neste intervalo
+    VALIDADE_PULSO = 10.0    # pedidos sem pulso há mais tempo são de processos que terminaram
+    FATOR_REDUCAO = 0.7
+
+    def __init__(
+        self,
+        caminho: Path,
+        max_paralelo: int,
+        min_paralelo: int = 1,
+        max_fila: int = 64,
+        espera_maxima: float = 300.0,
+        latencia_alvo: float = 10.0,
+        envelhecimento: float = 60.0,
+    ):
+        self.caminho = Path(caminho)
+        self.max_paralelo = max(1, max_paralelo)
+        self.min_paralelo = max(1, min(min_paralelo, self.max_paralelo))
+        self.max_fila = max_fila
+        self.espera_maxima = espera_maxima
+        self.latencia_alvo = latencia_alvo
+        self.envelhecimento = envelhecimento
+
+        self._processo = uuid.uuid4().hex
+        self._local = threading.local()
+        self._condicao = threading.Condition()
+        self._pedidos_locais: set = set()
+        self._pulso: Optional[threading.Thread] = None
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._transacao() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pedidos (
+                    id          TEXT PRIMARY KEY,
+                    processo    TEXT NOT NULL,
+                    usuario     TEXT NOT NULL,
+                    prioridade  INTEGER NOT NULL,
+                    situacao    TEXT NOT NULL,
+                    criado_em   REAL NOT NULL,
+                    iniciado_em REAL,
+                    visto_em    REAL NOT NULL
+                )
+                """
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS estado (id INTEGER PRIMARY KEY CHECK (id = 0), limite REAL NOT NULL, ultima_reducao REAL NOT NULL)"
+            )
+            con.execute("INSERT OR IGNORE INTO estado VALUES (0, ?, 0)", (float(self.max_paralelo),))
+
+    # ---------------- Banco ----------------
+
+    def _conexao(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _transacao(self, escrita: bool = True):
+        # Só quem grava pega a trava de escrita; a leitura (BEGIN adiada) não bloqueia ninguém no WAL
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE" if escrita else "BEGIN")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def _limite(self, con: sqlite3.Connection) -> float:
+        limite = con.execute("SELECT limite FROM estado WHERE id = 0").fetchone()["limite"]
+        return max(float(self.min_paralelo), min(float(self.max_paralelo), limite))
+
+    def _ordem(self, con: sqlite3.Connection, agora: float) -> List[str]:
+        """Pedidos aguardando, na ordem em que serão atendidos."""
+        # A divisão justa considera também os pedidos do mesmo usuário que serão atendidos
+        # antes, nesta mesma rodada: o n-ésimo pedido dele conta com n - 1 a mais em andamento.
+        # Pedidos sem pulso há mais de VALIDADE_PULSO são de processos que terminaram: ficam
+        # de fora aqui e são apagados pelo pulso (_manter_pedidos).
+        linhas = con.execute(
+            """
+            WITH validos AS (
+                SELECT * FROM pedidos WHERE visto_em >= :validade
+            ),
+            aguardando AS (
+                SELECT id, usuario, criado_em,
+                       CASE WHEN prioridade > :interativa AND criado_em < :envelhecido
+                            THEN :interativa ELSE prioridade END AS prioridade
+                FROM validos WHERE situacao = :aguardando
+            ),
+            em_andamento AS (
+                SELECT usuario, COUNT(*) AS quantidade FROM validos WHERE situacao = :executando GROUP BY usuario
+            )
+            SELECT a.id,
+                   COALESCE(e.quantidade, 0)
+                   + ROW_NUMBER() OVER (PARTITION BY a.usuario ORDER BY a.prioridade, a.criado_em) AS carga
+            FROM aguardando a LEFT JOIN em_andamento e ON e.usuario = a.usuario
+            ORDER BY a.prioridade, carga, a.criado_em
+            """,
+            {
+                "validade": agora - self.VALIDADE_PULSO,
+                "interativa": INTERATIVA,
+                "envelhecido": agora - self.envelhecimento,
+                "aguardando": AGUARDANDO,
+                "executando": EXECUTANDO,
+            },
+        )
+        return [linha["id"] for linha in linhas]
+
+    def _executando(self, con: sqlite3.Connection, agora: float) -> int:
+        return con.execute(
+            "SELECT COUNT(*) FROM pedidos WHERE situacao = ? AND visto_em >= ?", (EXECUTANDO, agora - self.VALIDADE_PULSO)
+        ).fetchone()[0]
+
+    def _vez(self, con: sqlite3.Connection, pedido_id: str, agora: float) -> Tuple[Optional[int], int]:
+        """Posição do pedido na fila (None se ele expirou) e vagas livres agora."""
+        ordem = self._ordem(con, agora)
+        livres = int(self._limite(con)) - self._executando(con, agora)
+        return (ordem.index(pedido_id) if pedido_id in ordem else None), livres
+
+    # ---------------- Pulso ----------------
+
+    def _iniciar_pulso(self) -> None:
+        with self._condicao:
+            if self._pulso is None:
+                self._pulso = threading.Thread(target=self._manter_pedidos, name="escalonador-ia-pulso", daemon=True)
+                self._pulso.start()
+
+    def _manter_pedidos(self) -> None:
+        while True:
+            time.sleep(self.INTERVALO_PULSO)
+            with self._condicao:
+                ids = list(self._pedidos_locais)
+            if not ids:
+                continue
+            try:
+                agora = time.time()
+                marcadores = ", ".join("?" * len(ids))
+                with self._transacao() as con:
+                    con.execute(f"UPDATE pedidos SET visto_em = ? WHERE id IN ({marcadores})", (agora, *ids))
+                    con.execute("DELETE FROM pedidos WHERE visto_em < ?", (agora - self.VALIDADE_PULSO,))
+            except sqlite3.Error as e:
+                print(f"Erro ao renovar os pedidos do escalonador de IA: {e}")
+
+    # ---------------- API ----------------
+
+    def entrar(
+        self,
+        prioridade: int = INTERATIVA,
+        usuario: str = "",
+        cancelar: Optional[threading.Event] = None,
+        ao_esperar: Optional[Callable[[Optional[int]], None]] = None,
+    ) -> Vaga:
+        """
+        Espera a vez do pedido e ocupa uma vaga; quem recebe a vaga chama sair().
+
+        Levanta ErroFilaIA se a fila estiver cheia, se a espera passar de
+        espera_maxima ou se `cancelar` for sinalizado.
+        """
+        self._iniciar_pulso()
+        pedido_id = uuid.uuid4().hex
+        inicio = time.time()
+        with self._transacao() as con:
+            aguardando = con.execute("SELECT COUNT(*) FROM pedidos WHERE situacao = ?", (AGUARDANDO,)).fetchone()[0]
+            if aguardando >= self.max_fila:
+                raise ErroFilaIA("[IA SOBRECARREGADA: TENTE NOVAMENTE EM ALGUNS MINUTOS]")
+            con.execute(
+                "INSERT INTO pedidos (id, processo, usuario, prioridade, situacao, criado_em, visto_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pedido_id, self._processo, usuario or "", prioridade, AGUARDANDO, inicio, inicio),
+            )
+        with self._condicao:
+            self._pedidos_locais.add(pedido_id)
+
+        posicao_avisada = None
+        try:
+            while True:
+                # A verificação da vez só lê; a trava de escrita fica para quando a vez chega
+                agora = time.time()
+                with self._transacao(escrita=False) as con:
+                    posicao, livres = self._vez(con, pedido_id, agora)
+
+                if posicao is None or posicao < livres:
+                    with self._transacao() as con:
+                        posicao, livres = self._vez(con, pedido_id, agora)
+                        if posicao is None:
+                            # Expirou (o processo ficou sem pulso): volta para a fila
+                            con.execute(
+                                "INSERT OR REPLACE INTO pedidos (id, processo, usuario, prioridade, situacao, criado_em, visto_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (pedido_id, self._processo, usuario or "", prioridade, AGUARDANDO, inicio, agora),
+                            )
+                            posicao, livres = self._vez(con, pedido_id, agora)
+                        vez_chegou = posicao < livres
+                        if vez_chegou:
+                            con.execute(
+                                "UPDATE pedidos SET situacao = ?, iniciado_em = ?, visto_em = ? WHERE id = ?",
+                                (EXECUTANDO, agora, agora, pedido_id),
+                            )
+                    if vez_chegou:
+                        # Fora da transação: o aviso pode gravar em outro banco (fila de jobs)
+                        if posicao_avisada is not None and ao_esperar is not None:
+                            ao_esperar(None)
+                        return Vaga(pedido_id, agora, agora - inicio)
+
+                posicao = posicao - max(livres, 0) + 1
+                if ao_esperar is not None and posicao != posicao_avisada:
+                    ao_esperar(posicao)
+                posicao_avisada = posicao
+
+                if cancelar is not None and cancelar.is_set():
+                    raise ErroFilaIA("[GERAÇÃO CANCELADA]")
+                if agora - inicio > self.espera_maxima:
+                    raise ErroFilaIA("[IA SOBRECARREGADA: TEMPO DE ESPERA ESGOTADO]")
+                with self._condicao:
+                    self._condicao.wait(self.INTERVALO)
+        except BaseException:
+            self._remover(pedido_id)
+            raise
+
+    def sair(self, vaga: Vaga, latencia: Optional[float] = None, sobrecarga: bool = False) -> None:
+        """
+        Libera a vaga e ajusta o número de vagas (AIMD) com o resultado do pedido.
+
+        `latencia` é o tempo até o primeiro token (None: sem medida, só libera);
+        sobrecarga=True indica que o modelo estourou o tempo limite.
+        """
+        agora = time.time()
+        try:
+            with self._transacao() as con:
+                con.execute("DELETE FROM pedidos WHERE id = ?", (vaga.id,))
+                estado = con.execute("SELECT limite, ultima_reducao FROM estado WHERE id = 0").fetchone()
+                limite = max(float(self.min_paralelo), min(float(self.max_paralelo), estado["limite"]))
+                if sobrecarga or (latencia is not None and latencia > self.latencia_alvo):
+                    # Uma redução por vez: pedidos que começaram antes da última redução já estavam na carga antiga
+                    if vaga.iniciado_em > estado["ultima_reducao"]:
+                        limite = max(float(self.min_paralelo), limite * self.FATOR_REDUCAO)
+                        con.execute("UPDATE estado SET limite = ?, ultima_reducao = ? WHERE id = 0", (limite, agora))
+                elif latencia is not None:
+                    limite = min(float(self.max_paralelo), limite + 1 / limite)
+                    con.execute("UPDATE estado SET limite = ? WHERE id = 0", (limite,))
+        except sqlite3.Error as e:
+            print(f"Erro ao liberar a vaga do escalonador de IA: {e}")
+        finally:
+            with self._condicao:
+                self._pedidos_locais.discard(vaga.id)
+                self._condicao.notify_all()
+
+    def _remover(self, pedido_id: str) -> None:
+        try:
+            self._conexao().execute("DELETE FROM pedidos WHERE id = ?", (pedido_id,))
+        except sqlite3.Error as e:
+            print(f"Erro ao remover pedido do escalonador de IA: {e}")
+        with self._condicao:
+            self._pedidos_locais.discard(pedido_id)
+            self._condicao.notify_all()
+
+    def situacao(self) -> Dict[str, Any]:
+        """Vagas atuais, pedidos em andamento e aguardando (por prioridade)."""
+        agora = time.time()
+        with self._transacao(escrita=False) as con:
+            ordem = self._ordem(con, agora)
+            limite = self._limite(con)
+            contagem = {
+                (linha["situacao"], linha["prioridade"]): linha["quantidade"]
+                for linha in con.execute(
+                    "SELECT situacao, prioridade, COUNT(*) AS quantidade FROM pedidos WHERE visto_em >= ? GROUP BY situacao, prioridade",
+                    (agora - self.VALIDADE_PULSO,),
+                )
+            }
+        return {
+            "vagas": int(limite),
+            "limite": round(limite, 2),
+            "executando": sum(q for (s, _), q in contagem.items() if s == EXECUTANDO),
+            "aguardando": len(ordem),
+            "aguardando_interativos": contagem.get((AGUARDANDO, INTERATIVA), 0),
+            "aguardando_lote": contagem.get((AGUARDANDO, LOTE), 0),
+        }
+
+
+_escalonador: Optional[EscalonadorIA] = None
+_escalonador_lock = threading.Lock()
+
+
+def obter_escalonador() -> EscalonadorIA:
+    """Instância única do escalonador por processo, configurada por comum.config."""
+    global _escalonador
+    with _escalonador_lock:
+        if _escalonador is None:
+            _escalonador = EscalonadorIA(
+                config.ESCALONADOR_ARQUIVO,
+                max_paralelo=config.ESCALONADOR_MAX_PARALELO,
+                min_paralelo=config.ESCALONADOR_MIN_PARALELO,
+                max_fila=config.ESCALONADOR_MAX_FILA,
+                espera_maxima=config.ESCALONADOR_ESPERA_MAXIMA,
+                latencia_alvo=config.ESCALONADOR_LATENCIA_ALVO,
+                envelhecimento=config.ESCALONADOR_ENVELHECIMENTO,
+            )
+        return _escalonador
+
+
+@contextmanager
+def vaga_ia(cancelar: Optional[threading.Event] = None) -> Iterator[Vaga]:
+    """
+    Ocupa uma vaga do modelo durante o bloco, com a origem definida por origem_pedidos().
+
+    Dentro do bloco, preencha vaga.latencia para o ajuste do número de vagas. Se o
+    bloco terminar com ErroTempoLimiteIA, o pedido conta como sobrecarga.
+    Com ESCALONADOR_IA=0 não há fila: o bloco roda direto.
+    """
+    if not config.ESCALONADOR_IA:
+        yield Vaga(None, time.time(), 0.0)
+        return
+
+    origem = _origem.get()
+    escalonador = obter_escalonador()
+    vaga = escalonador.entrar(origem.prioridade, origem.usuario, cancelar, origem.ao_esperar)
+    try:
+        yield vaga
+    except ErroTempoLimiteIA:
+        escalonador.sair(vaga, sobrecarga=True)
+        raise
+    except BaseException:
+        escalonador.sair(vaga)
+        raise
+    escalonador.sair(vaga, vaga.latencia)
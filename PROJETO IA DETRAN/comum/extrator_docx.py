@@ -0,0 +1,248 @@
+# extrator_docx.py
+# Leitura das tabelas de um DFD (.docx) sem carregar o documento inteiro.
+#
+# Abrir o DFD com python-docx monta a árvore completa do documento, e cada acesso a
+# row.cells percorre de novo as linhas anteriores para resolver células mescladas
+# verticalmente (custo quadrático no número de linhas). Aqui o word/document.xml é
+# lido direto do zip com iterparse: cada linha das tabelas do corpo é convertida no
+# texto das células assim que termina e em seguida descartada, então o consumo de
+# memória não cresce com o tamanho do documento e a lista de itens é lida em uma
+# única passada.
+#
+# O texto das células segue as mesmas regras do python-docx (cell.text): um texto por
+# coluna da grade, repetido nas células mescladas na horizontal e copiado da célula
+# de origem nas mescladas na vertical. Tabelas aninhadas são ignoradas.
+import io
+import os
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from comum.instrumentacao import medir
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+OrigemDocx = Union[bytes, str, os.PathLike, BinaryIO]
+
+# Textos que identificam a linha de cabeçalho da tabela de itens do DFD
+CABECALHO_ITENS = ("SIAGO/TCE", "UN.", "QTDE", "ESPECIFICAÇÃO DO PRODUTO")
+
+
+def _texto_run(run) -> str:
+    partes = []
+    for filho in run:
+        tag = filho.tag
+        if tag == f"{W}t":
+            partes.append(filho.text or "")
+        elif tag in (f"{W}tab", f"{W}ptab"):
+            partes.append("\t")
+        elif tag == f"{W}br":
+            if filho.get(f"{W}type") in (None, "textWrapping"):
+                partes.append("\n")
+        elif tag == f"{W}cr":
+            partes.append("\n")
+        elif tag == f"{W}noBreakHyphen":
+            partes.append("-")
+    return "".join(partes)
+
+
+def _texto_paragrafo(paragrafo) -> str:
+    partes = []
+    for filho in paragrafo:
+        if filho.tag == f"{W}r":
+            partes.append(_texto_run(filho))
+        elif filho.tag == f"{W}hyperlink":
+            partes.extend(_texto_run(run) for run in filho.iterchildren(f"{W}r"))
+    return "".join(partes)
+
+
+def _texto_celula(tc) -> str:
+    return "\n".join(_texto_paragrafo(p) for p in tc.iterchildren(f"{W}p"))
+
+
+def _valor_inteiro(elemento, caminho: str, padrao: int) -> int:
+    encontrado = elemento.find(caminho)
+    if encontrado is None:
+        return padrao
+    return int(encontrado.get(f"{W}val", padrao))
+
+
+def _abrir_document_xml(origem: OrigemDocx) -> Tuple[zipfile.ZipFile, BinaryIO]:
+    if isinstance(origem, (bytes, bytearray)):
+        origem = io.BytesIO(origem)
+    pacote = zipfile.ZipFile(origem)
+    return pacote, pacote.open("word/document.xml")
+
+
+def iterar_linhas_tabelas(origem: OrigemDocx) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Percorre as linhas das tabelas do corpo do documento, na ordem em que aparecem.
+
+    Produz (índice da tabela, textos das células) para cada linha. `origem` pode ser o
+    conteúdo do arquivo (bytes), um caminho ou um arquivo aberto em modo binário.
+    """
+    pacote, xml = _abrir_document_xml(origem)
+    with pacote, xml:
+        indice_tabela = -1
+        tabela_atual = None
+        linha_anterior: Dict[int, str] = {}  # coluna da grade -> texto, para as mesclas verticais
+
+        for _, tr in etree.iterparse(xml, events=("end",), tag=f"{W}tr"):
+            tabela = tr.getparent()
+            if tabela is None or tabela.getparent() is None or tabela.getparent().tag == f"{W}tc":
+                continue  # linha de tabela aninhada: faz parte do conteúdo da célula externa
+
+            if tabela is not tabela_atual:
+                tabela_atual = tabela
+                indice_tabela += 1
+                linha_anterior = {}
+                # Parágrafos e tabelas anteriores do corpo já foram lidos
+                corpo = tabela.getparent()
+                while tabela.getprevious() is not None:
+                    del corpo[0]
+
+            celulas: List[str] = []
+            linha_atual: Dict[int, str] = {}
+            coluna = _valor_inteiro(tr, f"{W}trPr/{W}gridBefore", 0)
+            for tc in tr.iterchildren(f"{W}tc"):
+                largura = _valor_inteiro(tc, f"{W}tcPr/{W}gridSpan", 1)
+                mescla = tc.find(f"{W}tcPr/{W}vMerge")
+                if mescla is not None and mescla.get(f"{W}val", "continue") == "continue":
+                    texto = linha_anterior.get(coluna, "")
+                else:
+                    texto = _texto_celula(tc)
+                for deslocamento in range(largura):
+                    linha_atual[coluna + deslocamento] = texto
+                celulas.extend([texto] * largura)
+                coluna += largura
+            linha_anterior = linha_atual
+
+            yield indice_tabela, celulas
+
+            # Libera a linha já lida e as anteriores que ainda estavam na árvore
+            tr.clear()
+            while tr.getprevious() is not None:
+                del tabela[0]
+
+
+def colunas_itens(celulas: List[str]) -> Optional[Dict[str, int]]:
+    """
+    Se a linha for o cabeçalho da tabela de itens do DFD, retorna a posição de cada
+    coluna ({"catmat", "descricao", "unidade", "qtd"}; -1 se ausente). Senão, None.
+    """
+    textos = [texto.strip().upper() for texto in celulas]
+    texto_linha = " ".join(textos)
+    if not all(marcador in texto_linha for marcador in CABECALHO_ITENS):
+        return None
+
+    colunas = {"catmat": -1, "descricao": -1, "unidade": -1, "qtd": -1}
+    for i, texto in enumerate(textos):
+        if "SIAGO/TCE" in texto:
+            colunas["catmat"] = i
+        elif "ESPECIFICAÇÃO" in texto or "PRODUTO" in texto:
+            colunas["descricao"] = i
+        elif "UN." in texto:
+            colunas["unidade"] = i
+        elif "QTDE" in texto:
+            colunas["qtd"] = i
+    return colunas
+
+
+def item_da_linha(celulas: List[str], colunas: Dict[str, int]) -> Optional[Dict[str, str]]:
+    """Converte uma linha da tabela de itens no dicionário usado pelos apps (None se não for um item)."""
+    if len(celulas) <= max(colunas.values()):
+        return None
+    descricao = celulas[colunas["descricao"]].strip()
+    if not descricao:
+        return None
+    return {
+        "catmat": celulas[colunas["catmat"]].strip() if colunas["catmat"] != -1 else "",
+        "descricao": descricao,
+        "unidade": celulas[colunas["unidade"]].strip(),
+        "qtd": celulas[colunas["qtd"]].strip(),
+        "valor_unitario": "",
+    }
+
+
+def _colunas_validas(colunas: Optional[Dict[str, int]]) -> bool:
+    return colunas is not None and -1 not in (colunas["descricao"], colunas["unidade"], colunas["qtd"])
+
+
+def iterar_itens_dfd(origem: OrigemDocx) -> Iterator[Dict[str, str]]:
+    """
+    Produz os itens da primeira tabela de itens do DFD, um de cada vez.
+
+    A leitura do arquivo para assim que a tabela de itens termina.
+    """
+    tabela_itens = None
+    colunas: Optional[Dict[str, int]] = None
+    tabelas_descartadas = set()
+
+    for tabela, celulas in iterar_linhas_tabelas(origem):
+        if tabela_itens is None:
+            if tabela in tabelas_descartadas:
+                continue
+            colunas = colunas_itens(celulas)
+            if colunas is not None:
+                # O primeiro cabeçalho da tabela decide: sem as colunas obrigatórias, a tabela é ignorada
+                if _colunas_validas(colunas):
+                    tabela_itens = tabela
+                else:
+                    tabelas_descartadas.add(tabela)
+            continue
+
+        if tabela != tabela_itens:
+            return
+        item = item_da_linha(celulas, colunas)
+        if item is not None:
+            yield item
+
+
+def _normalizar_rotulo(texto: str) -> str:
+    return "".join(texto.replace(":", "").strip().lower().split())
+
+
+def extrair_dfd(origem: OrigemDocx, rotulos: Dict[str, str]) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    """
+    Lê, em uma única passada, a lista de itens e os campos rotulados do DFD.
+
+    `rotulos` associa o rótulo de uma célula (minúsculo, sem espaços e sem ":") à chave
+    do campo; o valor é a célula seguinte. São lidos os pares das colunas 0|1 e 2|3 de
+    todas as tabelas. Se houver mais de uma tabela de itens, vale a última.
+    """
+    tamanho = len(origem) if isinstance(origem, (bytes, bytearray)) else None
+    with medir("docx.extrair_dfd", bytes=tamanho) as span:
+        itens, dados = _extrair_dfd(origem, rotulos)
+        span.definir(itens=len(itens), campos=len(dados))
+        return itens, dados
+
+
+def _extrair_dfd(origem: OrigemDocx, rotulos: Dict[str, str]) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+    itens: List[Dict[str, str]] = []
+    dados: Dict[str, str] = {}
+
+    tabela_cabecalho = None
+    tabelas_com_cabecalho = set()
+    colunas: Optional[Dict[str, int]] = None
+
+    for tabela, celulas in iterar_linhas_tabelas(origem):
+        for i in (0, 2):
+            if len(celulas) >= i + 2:
+                chave = rotulos.get(_normalizar_rotulo(celulas[i]))
+                if chave is not None:
+                    dados[chave] = celulas[i + 1].strip()
+
+        if tabela_cabecalho == tabela:
+            item = item_da_linha(celulas, colunas)
+            if item is not None:
+                itens.append(item)
+        elif tabela not in tabelas_com_cabecalho:
+            colunas_linha = colunas_itens(celulas)
+            if colunas_linha is not None:
+                tabelas_com_cabecalho.add(tabela)
+                if _colunas_validas(colunas_linha):
+                    tabela_cabecalho, colunas = tabela, colunas_linha
+                    itens = []
+
+    return itens, dados
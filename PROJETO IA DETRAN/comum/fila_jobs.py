@@ -0,0 +1,384 @@
+# fila_jobs.py
+# Fila de geração de documentos em segundo plano, guardada em SQLite.
+#
+# Os apps não geram mais o documento dentro do script do Streamlit: enviam um job
+# (enviar -> id), guardam o id e acompanham o andamento consultando a fila. O
+# trabalho roda em threads do próprio processo do app, fora das execuções do
+# script, então recarregar a página ou vários usuários gerando ao mesmo tempo não
+# interrompem nem travam a geração. Como a fila fica no disco, o id continua
+# válido depois de um refresh (o app o guarda na URL).
+#
+# Cada processo só executa os tipos de job que registrou (registrar("etp", funcao)).
+# A função recebe os parâmetros e um ContextoJob, para informar o progresso, publicar
+# resultados parciais (ex.: os textos da IA já prontos) e verificar cancelamento.
+#
+# Cada execução é uma requisição da instrumentação (span "job.<tipo>", com o id do
+# job): as etapas medidas dentro da função do job ficam agrupadas sob ela.
+#
+# As chamadas à IA feitas pelo job são pedidos interativos do usuário que enviou o
+# job (comum.escalonador_ia); enquanto esperam a vez, a posição na fila aparece na
+# mensagem do job.
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from comum import config
+from comum.escalonador_ia import INTERATIVA, origem_pedidos
+from comum.instrumentacao import requisicao
+
+try:
+    import psutil
+except ImportError:  # opcional: sem ele, a verificação de processos usa a API do sistema
+    psutil = None
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+CANCELADO = "cancelado"
+
+FINALIZADOS = (CONCLUIDO, ERRO, CANCELADO)
+
+
+def _processo_ativo(pid: Optional[int]) -> bool:
+    """Se o processo `pid` ainda existe (na dúvida, considera que sim)."""
+    if not pid:
+        return False
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == "nt":
+        # No Windows, os.kill(pid, 0) encerraria o processo
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        processo = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not processo:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: existe, mas é de outro usuário
+        try:
+            codigo = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(processo, ctypes.byref(codigo)):
+                return True
+            return codigo.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(processo)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobCancelado(Exception):
+    """Levantada dentro da função do job quando o usuário cancela a geração."""
+
+
+class ContextoJob:
+    """Canal entre a função que executa o job e a fila."""
+
+    # Intervalo mínimo entre gravações de resultados parciais (o streaming gera muitas)
+    INTERVALO_PARCIAL = 0.5
+
+    def __init__(self, fila: "FilaJobs", job_id: str, tipo: str, usuario: Optional[str] = None):
+        self.fila = fila
+        self.id = job_id
+        self.tipo = tipo
+        self.usuario = usuario  # quem enviou o job (FilaJobs.enviar), se informado
+        self.evento_cancelar = threading.Event()
+        self._ultimo_parcial = 0.0
+        self._mensagem: Optional[str] = None
+
+    def progresso(self, fracao: float, mensagem: Optional[str] = None) -> None:
+        """Atualiza o andamento (0 a 1) e levanta JobCancelado se o job foi cancelado."""
+        if mensagem is not None:
+            self._mensagem = mensagem
+        self.fila._atualizar(self.id, progresso=max(0.0, min(1.0, fracao)), mensagem=mensagem)
+        self.verificar_cancelamento()
+
+    def aguardando_ia(self, posicao: Optional[int]) -> None:
+        """Mostra a posição do job na fila da IA (None: a vez chegou, volta a mensagem anterior)."""
+        if posicao is None:
+            self.fila._atualizar(self.id, mensagem=self._mensagem or "Gerando textos com IA...")
+        else:
+            self.fila._atualizar(self.id, mensagem=f"Aguardando a IA: posição {posicao} na fila...")
+
+    def parcial(self, dados: Dict[str, Any], forcar: bool = False) -> None:
+        """Publica resultados parciais, exibidos pela interface enquanto o job roda."""
+        agora = time.monotonic()
+        if forcar or agora - self._ultimo_parcial >= self.INTERVALO_PARCIAL:
+            self._ultimo_parcial = agora
+            self.fila._atualizar(self.id, parcial=json.dumps(dados, ensure_ascii=False))
+
+    def cancelado(self) -> bool:
+        if not self.evento_cancelar.is_set() and self.fila._cancelamento_pedido(self.id):
+            self.evento_cancelar.set()
+        return self.evento_cancelar.is_set()
+
+    def verificar_cancelamento(self) -> None:
+        if self.cancelado():
+            raise JobCancelado()
+
+
+FuncaoJob = Callable[[Dict[str, Any], ContextoJob], Optional[Dict[str, Any]]]
+
+
+class FilaJobs:
+    def __init__(self, caminho: Path, num_workers: int = 4, retencao: int = 7 * 24 * 3600):
+        self.caminho = Path(caminho)
+        self.num_workers = num_workers
+        self.retencao = retencao
+
+        self._funcoes: Dict[str, FuncaoJob] = {}
+        self._em_execucao: Dict[str, ContextoJob] = {}
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._novo_job = threading.Condition(self._lock)
+        self._local = threading.local()
+
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._transacao() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id           TEXT PRIMARY KEY,
+                    tipo         TEXT NOT NULL,
+                    situacao     TEXT NOT NULL,
+                    parametros   TEXT NOT NULL,
+                    resultado    TEXT,
+                    parcial      TEXT,
+                    erro         TEXT,
+                    progresso    REAL NOT NULL DEFAULT 0,
+                    mensagem     TEXT,
+                    cancelar     INTEGER NOT NULL DEFAULT 0,
+                    pid          INTEGER,
+                    criado_em    REAL NOT NULL,
+                    iniciado_em  REAL,
+                    concluido_em REAL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs (situacao, tipo, criado_em)")
+            # Filas criadas antes da coluna "usuario" existir
+            if "usuario" not in {linha["name"] for linha in con.execute("PRAGMA table_info(jobs)")}:
+                con.execute("ALTER TABLE jobs ADD COLUMN usuario TEXT")
+            con.execute(
+                "DELETE FROM jobs WHERE situacao IN (?, ?, ?) AND criado_em < ?",
+                (*FINALIZADOS, time.time() - self.retencao),
+            )
+
+    # ---------------- Banco ----------------
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread; isolation_level=None para controlar as transações
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _transacao(self):
+        # BEGIN IMMEDIATE: dois processos não pegam o mesmo job
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def _atualizar(self, job_id: str, **campos) -> None:
+        campos = {k: v for k, v in campos.items() if v is not None}
+        if not campos:
+            return
+        atribuicoes = ", ".join(f"{k} = ?" for k in campos)
+        self._conexao().execute(f"UPDATE jobs SET {atribuicoes} WHERE id = ?", (*campos.values(), job_id))
+
+    def _cancelamento_pedido(self, job_id: str) -> bool:
+        linha = self._conexao().execute("SELECT cancelar FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(linha and linha["cancelar"])
+
+    # ---------------- API ----------------
+
+    def registrar(self, tipo: str, funcao: FuncaoJob) -> None:
+        """
+        Registra a função que executa os jobs de `tipo` neste processo e inicia os workers.
+
+        Pode ser chamada a cada execução do script do Streamlit: só a primeira tem efeito.
+        """
+        with self._lock:
+            novo = tipo not in self._funcoes
+            self._funcoes[tipo] = funcao
+            if not self._workers:
+                for i in range(self.num_workers):
+                    worker = threading.Thread(target=self._executar_worker, name=f"fila-jobs-{i}", daemon=True)
+                    worker.start()
+                    self._workers.append(worker)
+            self._novo_job.notify_all()
+
+        if novo:
+            # Jobs deste tipo que estavam rodando em um processo que já terminou; os de
+            # outros processos ainda ativos (ex.: o mesmo app em outra porta) continuam
+            with self._transacao() as con:
+                linhas = con.execute(
+                    "SELECT id, pid FROM jobs WHERE tipo = ? AND situacao = ? AND pid != ?",
+                    (tipo, EXECUTANDO, os.getpid()),
+                ).fetchall()
+                interrompidos = [linha["id"] for linha in linhas if not _processo_ativo(linha["pid"])]
+                if interrompidos:
+                    agora = time.time()
+                    con.executemany(
+                        "UPDATE jobs SET situacao = ?, erro = ?, concluido_em = ? WHERE id = ? AND situacao = ?",
+                        [(ERRO, "Geração interrompida: o serviço foi reiniciado.", agora, job_id, EXECUTANDO)
+                         for job_id in interrompidos],
+                    )
+
+    def enviar(self, tipo: str, parametros: Dict[str, Any], usuario: Optional[str] = None) -> str:
+        """
+        Coloca um job na fila e retorna o id. `parametros` precisa ser serializável em JSON.
+
+        `usuario` identifica quem enviou, para a divisão das chamadas à IA entre usuários.
+        """
+        job_id = uuid.uuid4().hex
+        with self._transacao() as con:
+            con.execute(
+                "INSERT INTO jobs (id, tipo, situacao, parametros, usuario, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, tipo, PENDENTE, json.dumps(parametros, ensure_ascii=False), usuario, time.time()),
+            )
+        with self._lock:
+            self._novo_job.notify()
+        return job_id
+
+    def consultar(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Situação atual do job (None se o id não existir)."""
+        linha = self._conexao().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if linha is None:
+            return None
+
+        job = dict(linha)
+        for campo in ("parametros", "resultado", "parcial"):
+            job[campo] = json.loads(job[campo]) if job[campo] else None
+        if job["situacao"] == PENDENTE:
+            job["posicao"] = self._conexao().execute(
+                "SELECT COUNT(*) FROM jobs WHERE tipo = ? AND situacao = ? AND criado_em <= ?",
+                (job["tipo"], PENDENTE, job["criado_em"]),
+            ).fetchone()[0]
+        return job
+
+    def cancelar(self, job_id: str) -> None:
+        """Cancela o job: se ainda está na fila, não será executado; se está rodando, é interrompido."""
+        with self._transacao() as con:
+            con.execute(
+                "UPDATE jobs SET situacao = ?, concluido_em = ? WHERE id = ? AND situacao = ?",
+                (CANCELADO, time.time(), job_id, PENDENTE),
+            )
+            con.execute("UPDATE jobs SET cancelar = 1 WHERE id = ? AND situacao = ?", (job_id, EXECUTANDO))
+        with self._lock:
+            contexto = self._em_execucao.get(job_id)
+        if contexto is not None:
+            contexto.evento_cancelar.set()
+
+    def aguardar(self, job_id: str, timeout: Optional[float] = None, intervalo: float = 0.5) -> Dict[str, Any]:
+        """Bloqueia até o job terminar (ou o timeout passar) e retorna a situação dele."""
+        limite = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.consultar(job_id)
+            if job is None or job["situacao"] in FINALIZADOS:
+                return job
+            if limite is not None and time.monotonic() >= limite:
+                return job
+            time.sleep(intervalo)
+
+    # ---------------- Workers ----------------
+
+    def _pegar_proximo(self) -> Optional[sqlite3.Row]:
+        with self._lock:
+            tipos = list(self._funcoes)
+        if not tipos:
+            return None
+
+        marcadores = ", ".join("?" * len(tipos))
+        with self._transacao() as con:
+            linha = con.execute(
+                f"SELECT id, tipo, parametros, usuario FROM jobs WHERE situacao = ? AND tipo IN ({marcadores}) "
+                "ORDER BY criado_em LIMIT 1",
+                (PENDENTE, *tipos),
+            ).fetchone()
+            if linha is not None:
+                con.execute(
+                    "UPDATE jobs SET situacao = ?, pid = ?, iniciado_em = ? WHERE id = ?",
+                    (EXECUTANDO, os.getpid(), time.time(), linha["id"]),
+                )
+        return linha
+
+    def _executar_worker(self) -> None:
+        while True:
+            try:
+                linha = self._pegar_proximo()
+            except sqlite3.Error as e:
+                print(f"Erro ao consultar a fila de jobs: {e}")
+                linha = None
+
+            if linha is None:
+                # Acorda ao receber um job deste processo ou, no máximo a cada segundo,
+                # para pegar jobs enviados por outros processos
+                with self._lock:
+                    self._novo_job.wait(timeout=1.0)
+                continue
+
+            self._executar_job(linha["id"], linha["tipo"], json.loads(linha["parametros"]), linha["usuario"])
+
+    def _executar_job(self, job_id: str, tipo: str, parametros: Dict[str, Any], usuario: Optional[str] = None) -> None:
+        contexto = ContextoJob(self, job_id, tipo, usuario)
+        with self._lock:
+            funcao = self._funcoes[tipo]
+            self._em_execucao[job_id] = contexto
+
+        try:
+            with requisicao(f"job.{tipo}", job_id=job_id), origem_pedidos(
+                INTERATIVA, usuario or job_id, contexto.aguardando_ia
+            ):
+                resultado = funcao(parametros, contexto)
+                if contexto.cancelado():
+                    raise JobCancelado()
+            self._atualizar(
+                job_id,
+                situacao=CONCLUIDO,
+                progresso=1.0,
+                resultado=json.dumps(resultado or {}, ensure_ascii=False),
+                concluido_em=time.time(),
+            )
+        except JobCancelado:
+            self._atualizar(job_id, situacao=CANCELADO, mensagem="Geração cancelada.", concluido_em=time.time())
+        except Exception as e:
+            print(f"Erro no job {tipo} {job_id}:")
+            traceback.print_exc()
+            self._atualizar(job_id, situacao=ERRO, erro=f"{type(e).__name__}: {e}", concluido_em=time.time())
+        finally:
+            with self._lock:
+                self._em_execucao.pop(job_id, None)
+
+
+_fila: Optional[FilaJobs] = None
+_fila_lock = threading.Lock()
+
+
+def obter_fila() -> FilaJobs:
+    """Instância única da fila por processo, configurada por comum.config."""
+    global _fila
+    with _fila_lock:
+        if _fila is None:
+            _fila = FilaJobs(config.FILA_JOBS_ARQUIVO, num_workers=config.FILA_JOBS_WORKERS, retencao=config.FILA_JOBS_RETENCAO)
+        return _fila
@@ -0,0 +1,367 @@
+# instrumentacao.py
+# Medição do tempo gasto em cada etapa da geração dos documentos.
+#
+# Cada etapa medida é um "span": nome, duração e atributos (tokens, bytes gravados,
+# acerto de cache...). Os spans se aninham pelo contexto de execução (contextvars):
+# um span aberto dentro de outro vira filho dele, e todos os spans abertos a partir
+# de uma requisição (um job da fila, um documento do lote) levam o id dela.
+#
+#   with requisicao("job.etp", job_id=job_id):        # raiz: um documento
+#       with medir("docx.renderizar") as span:        # etapa
+#           ...
+#           span.definir(bytes=tamanho)
+#
+# Os spans terminados são gravados, um JSON por linha, em INSTRUMENTACAO_ARQUIVO
+# (todos os processos no mesmo arquivo). Para ver onde o tempo foi gasto:
+#
+#   python -m comum.instrumentacao                      # tempo por etapa
+#   python -m comum.instrumentacao --nome job.etp       # só as requisições "job.etp"
+#   python -m comum.instrumentacao --requisicao <id>    # árvore de uma requisição
+#
+# coletar() devolve também em memória os spans terminados em um trecho do programa
+# (usado pelo benchmark, python -m comum.benchmark).
+#
+# Threads não herdam o contexto de quem as criou: funções enviadas a um pool devem
+# passar por no_contexto_atual() para que os spans delas fiquem na requisição certa.
+#
+# Com INSTRUMENTACAO_PERFIL=cprofile (ou pyinstrument, se instalado) cada requisição
+# raiz também grava um perfil em INSTRUMENTACAO_PASTA_PERFIS. O perfil cobre só a
+# thread da requisição; as chamadas ao modelo feitas em paralelo aparecem nos spans.
+import argparse
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from comum import config
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Atributos numéricos somados no resumo (além da duração)
+ATRIBUTOS_SOMADOS = ("tokens_prompt", "tokens_resposta", "bytes")
+
+
+class Span:
+    """Uma etapa medida. Criado por medir()/requisicao() ou, em geradores, por iniciar_span()."""
+
+    def __init__(self, nome: str, pai: Optional["Span"], atributos: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.nome = nome
+        self.pai = pai.id if pai is not None else None
+        # Um span sem pai é a raiz da sua própria requisição
+        self.requisicao = pai.requisicao if pai is not None else self.id
+        self.atributos = dict(atributos)
+        self.inicio = time.time()
+        self.duracao: Optional[float] = None
+        self.erro: Optional[str] = None
+        self._inicio_monotonico = time.perf_counter()
+
+    def definir(self, **atributos) -> None:
+        self.atributos.update(atributos)
+
+    def somar(self, **valores) -> None:
+        for chave, valor in valores.items():
+            self.atributos[chave] = self.atributos.get(chave, 0) + valor
+
+    def finalizar(self, erro: Optional[BaseException] = None) -> None:
+        """Encerra a medição e grava o span (só a primeira chamada tem efeito)."""
+        if self.duracao is not None:
+            return
+        self.duracao = time.perf_counter() - self._inicio_monotonico
+        if erro is not None:
+            self.erro = f"{type(erro).__name__}: {erro}" if str(erro) else type(erro).__name__
+        registro = self.registro()
+        if _coletores:
+            with _trava_coletores:
+                for coletor in _coletores:
+                    coletor.append(registro)
+        _exportador.exportar(registro)
+
+    def registro(self) -> Dict[str, Any]:
+        return {
+            "requisicao": self.requisicao,
+            "span": self.id,
+            "pai": self.pai,
+            "nome": self.nome,
+            "inicio": round(self.inicio, 6),
+            "duracao_s": round(self.duracao, 6) if self.duracao is not None else None,
+            "erro": self.erro,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "atributos": self.atributos,
+        }
+
+
+class ExportadorJSONL:
+    """Grava os spans em um arquivo JSONL, em modo append (vários processos podem gravar juntos)."""
+
+    def __init__(self, caminho: Path, max_bytes: int):
+        self.caminho = Path(caminho)
+        self.max_bytes = max_bytes
+        self._arquivo = None
+        self._trava = threading.Lock()
+
+    def _abrir(self):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        if self.caminho.exists() and self.caminho.stat().st_size >= self.max_bytes:
+            os.replace(self.caminho, self.caminho.with_name(self.caminho.name + ".1"))
+        return open(self.caminho, "ab")
+
+    def exportar(self, registro: Dict[str, Any]) -> None:
+        if not config.INSTRUMENTACAO:
+            return
+        # Uma linha inteira por write: linhas de processos diferentes não se misturam
+        linha = (json.dumps(registro, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._trava:
+            try:
+                if self._arquivo is None:
+                    self._arquivo = self._abrir()
+                self._arquivo.write(linha)
+                self._arquivo.flush()
+                if self._arquivo.tell() >= self.max_bytes:
+                    # O próximo span reabre o arquivo, já rotacionado
+                    self._arquivo.close()
+                    self._arquivo = None
+            except OSError as e:
+                print(f"Não foi possível gravar a instrumentação em {self.caminho}: {e}")
+
+
+_exportador = ExportadorJSONL(config.INSTRUMENTACAO_ARQUIVO, config.INSTRUMENTACAO_MAX_BYTES)
+
+_span_atual: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span_atual", default=None)
+
+_coletores: List[List[Dict[str, Any]]] = []
+_trava_coletores = threading.Lock()
+
+
+# ---------------- Spans ----------------
+
+def span_atual() -> Optional[Span]:
+    return _span_atual.get()
+
+
+def iniciar_span(nome: str, **atributos) -> Span:
+    """
+    Cria um span filho do atual sem torná-lo o span atual; quem cria chama finalizar().
+
+    Para geradores (ex.: o streaming da IA): um gerador não pode trocar o span atual,
+    porque o contexto em que ele roda é o de quem o consome.
+    """
+    return Span(nome, _span_atual.get(), atributos)
+
+
+@contextmanager
+def medir(nome: str, **atributos) -> Iterator[Span]:
+    """Mede o bloco como um span filho do atual. Exceções ficam registradas em "erro"."""
+    span = iniciar_span(nome, **atributos)
+    token = _span_atual.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.finalizar(e)
+        raise
+    finally:
+        _span_atual.reset(token)
+        span.finalizar()
+
+
+@contextmanager
+def requisicao(nome: str, **atributos) -> Iterator[Span]:
+    """
+    Span de uma requisição inteira (um documento). Sendo a raiz, grava também o perfil
+    da requisição quando INSTRUMENTACAO_PERFIL estiver configurado.
+    """
+    with medir(nome, **atributos) as span:
+        perfilador = _iniciar_perfil() if span.pai is None else None
+        try:
+            yield span
+        finally:
+            if perfilador is not None:
+                _salvar_perfil(perfilador, span)
+
+
+@contextmanager
+def coletar() -> Iterator[List[Dict[str, Any]]]:
+    """Lista que recebe os spans terminados durante o bloco (de qualquer thread), mesmo com INSTRUMENTACAO=0."""
+    spans: List[Dict[str, Any]] = []
+    with _trava_coletores:
+        _coletores.append(spans)
+    try:
+        yield spans
+    finally:
+        with _trava_coletores:
+            # Por identidade: list.remove compararia o conteúdo das listas
+            _coletores[:] = [coletor for coletor in _coletores if coletor is not spans]
+
+
+def no_contexto_atual(funcao: Callable) -> Callable:
+    """Envolve `funcao` para que, rodando em outra thread, os spans dela fiquem sob o span atual."""
+    contexto = contextvars.copy_context()
+
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        # Uma cópia por chamada: o mesmo contexto não pode estar ativo em duas threads
+        return contexto.copy().run(funcao, *args, **kwargs)
+
+    return executar
+
+
+# ---------------- Perfil por requisição ----------------
+
+def _iniciar_perfil():
+    tipo = config.INSTRUMENTACAO_PERFIL
+    if not tipo:
+        return None
+    if tipo == "pyinstrument":
+        if pyinstrument is not None:
+            perfilador = pyinstrument.Profiler()
+            perfilador.start()
+            return perfilador
+        print("INSTRUMENTACAO_PERFIL=pyinstrument, mas o pyinstrument não está instalado; usando o cProfile.")
+    elif tipo != "cprofile":
+        print(f"INSTRUMENTACAO_PERFIL desconhecido: '{tipo}'. Opções: cprofile, pyinstrument.")
+        return None
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    return perfilador
+
+
+def _salvar_perfil(perfilador, span: Span) -> None:
+    pasta = config.INSTRUMENTACAO_PASTA_PERFIS
+    nome_base = f"{time.strftime('%Y%m%d_%H%M%S')}_{span.nome}_{span.id}"
+    try:
+        pasta.mkdir(parents=True, exist_ok=True)
+        if isinstance(perfilador, cProfile.Profile):
+            perfilador.disable()
+            caminho = pasta / f"{nome_base}.prof"  # python -m pstats <arquivo> ou snakeviz
+            perfilador.dump_stats(caminho)
+        else:
+            perfilador.stop()
+            caminho = pasta / f"{nome_base}.html"
+            caminho.write_text(perfilador.output_html(), encoding="utf-8")
+        span.definir(perfil=str(caminho))
+    except OSError as e:
+        print(f"Não foi possível gravar o perfil da requisição {span.id}: {e}")
+
+
+# ---------------- Leitura e resumo ----------------
+
+def ler_spans(caminho: Path = None) -> List[Dict[str, Any]]:
+    """Spans gravados no arquivo (linhas inválidas, como uma gravação interrompida, são ignoradas)."""
+    caminho = Path(caminho or config.INSTRUMENTACAO_ARQUIVO)
+    spans = []
+    if not caminho.exists():
+        return spans
+    with caminho.open(encoding="utf-8") as f:
+        for linha in f:
+            try:
+                spans.append(json.loads(linha))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def _percentil(valores: List[float], fracao: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(fracao * (len(ordenados) - 1))))]
+
+
+def resumir(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Tempo por nome de span (quantidade, total, média, p95, máximo e atributos somados), do maior total ao menor."""
+    por_nome = defaultdict(list)
+    for span in spans:
+        if span.get("duracao_s") is not None:
+            por_nome[span["nome"]].append(span)
+
+    linhas = []
+    for nome, grupo in por_nome.items():
+        duracoes = [span["duracao_s"] for span in grupo]
+        linha = {
+            "nome": nome,
+            "quantidade": len(grupo),
+            "erros": sum(1 for span in grupo if span.get("erro")),
+            "total_s": sum(duracoes),
+            "media_s": sum(duracoes) / len(duracoes),
+            "p95_s": _percentil(duracoes, 0.95),
+            "max_s": max(duracoes),
+        }
+        for atributo in ATRIBUTOS_SOMADOS:
+            valores = [span["atributos"].get(atributo) for span in grupo]
+            valores = [valor for valor in valores if isinstance(valor, (int, float))]
+            if valores:
+                linha[atributo] = sum(valores)
+        linhas.append(linha)
+    return sorted(linhas, key=lambda linha: linha["total_s"], reverse=True)
+
+
+def _imprimir_resumo(linhas: List[Dict[str, Any]]) -> None:
+    largura = max([len(linha["nome"]) for linha in linhas] + [5])
+    print(f"{'etapa'.ljust(largura)}  {'qtd':>6} {'erros':>5} {'total':>10} {'média':>9} {'p95':>9} {'máx':>9}  extras")
+    for linha in linhas:
+        extras = " ".join(f"{atributo}={linha[atributo]}" for atributo in ATRIBUTOS_SOMADOS if atributo in linha)
+        print(
+            f"{linha['nome'].ljust(largura)}  {linha['quantidade']:>6} {linha['erros']:>5} "
+            f"{linha['total_s']:>9.2f}s {linha['media_s']:>8.3f}s {linha['p95_s']:>8.3f}s {linha['max_s']:>8.3f}s  {extras}"
+        )
+
+
+def _imprimir_arvore(spans: List[Dict[str, Any]]) -> None:
+    filhos = defaultdict(list)
+    for span in spans:
+        filhos[span.get("pai")].append(span)
+    ids = {span["span"] for span in spans}
+
+    def imprimir(span, nivel):
+        atributos = " ".join(f"{chave}={valor}" for chave, valor in span["atributos"].items())
+        erro = f" ERRO {span['erro']}" if span.get("erro") else ""
+        print(f"{'  ' * nivel}{span['nome']} {span['duracao_s']:.3f}s {atributos}{erro}".rstrip())
+        for filho in sorted(filhos[span["span"]], key=lambda s: s["inicio"]):
+            imprimir(filho, nivel + 1)
+
+    raizes = [span for span in spans if span.get("pai") not in ids]
+    for raiz in sorted(raizes, key=lambda s: s["inicio"]):
+        imprimir(raiz, 0)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m comum.instrumentacao", description="Resume os tempos gravados pela instrumentação."
+    )
+    parser.add_argument("arquivo", type=Path, nargs="?", default=None,
+                        help=f"arquivo .jsonl (padrão: {config.INSTRUMENTACAO_ARQUIVO})")
+    parser.add_argument("--nome", default=None, help="só as requisições com este nome (ex.: job.etp)")
+    parser.add_argument("--requisicao", default=None, help="mostra a árvore de spans de uma requisição")
+    args = parser.parse_args(argv)
+
+    spans = ler_spans(args.arquivo)
+    if args.requisicao:
+        spans = [span for span in spans if span["requisicao"] == args.requisicao]
+        if not spans:
+            parser.error(f"Requisição não encontrada: {args.requisicao}")
+        _imprimir_arvore(spans)
+        return 0
+
+    if args.nome:
+        selecionadas = {span["requisicao"] for span in spans if span["nome"] == args.nome and span.get("pai") is None}
+        spans = [span for span in spans if span["requisicao"] in selecionadas]
+    if not spans:
+        print("Nenhum span encontrado.")
+        return 0
+    _imprimir_resumo(resumir(spans))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
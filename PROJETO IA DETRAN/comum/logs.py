@@ -0,0 +1,192 @@
+# logs.py
+# Logs estruturados dos geradores de documentos, baratos o bastante para os laços de render.
+#
+#   from comum.logs import obter_logger, registrar
+#
+#   logger = obter_logger(__name__)
+#   logger.info("Arquivo salvo", extra={"caminho": str(caminho)})   # logging padrão
+#   registrar(logger, logging.INFO, "Arquivo salvo")                 # caminho rápido
+#
+# Os loggers ficam sob "ia_detran" e escrevem por um QueueHandler: quem registra só
+# põe o registro em uma fila (não bloqueia), e uma thread (QueueListener) grava:
+#
+#   - LOG_ARQUIVO: um JSON por linha, com o id da requisição e do span atuais
+#     (comum.instrumentacao), para cruzar os logs com os tempos de cada documento;
+#   - stderr: uma linha de texto por registro (LOG_CONSOLE=0 desliga).
+#
+# registrar() verifica o nível antes de qualquer outro trabalho e guarda, por objeto de
+# código, o arquivo e a função de quem chamou: uma mensagem filtrada custa uma
+# comparação, e uma registrada não lê nada do disco (ao contrário do
+# inspect.getframeinfo, que lê as linhas do código-fonte a cada chamada).
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from pathlib import Path
+from types import CodeType
+from typing import Any, Dict, Optional, Tuple
+
+from comum import config
+from comum.instrumentacao import span_atual
+
+RAIZ_LOGGERS = "ia_detran"
+
+# Atributos de todo LogRecord; o que não estiver aqui veio de `extra` e vai para o JSON
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_locais: Dict[CodeType, Tuple[str, str, str]] = {}
+_configurado = False
+_trava_configuracao = threading.Lock()
+_ouvinte: Optional[logging.handlers.QueueListener] = None
+
+
+def caminho_exibido(arquivo: str) -> str:
+    """Caminho do arquivo relativo à raiz do projeto (ou o caminho completo, se estiver fora dela)."""
+    try:
+        return str(Path(arquivo).relative_to(config.RAIZ_PROJETO))
+    except ValueError:
+        return arquivo
+
+
+def local_do_codigo(codigo: CodeType) -> Tuple[str, str, str]:
+    """(caminho completo, caminho exibido, função) de um objeto de código, calculado uma vez por código."""
+    local = _locais.get(codigo)
+    if local is None:
+        local = (codigo.co_filename, caminho_exibido(codigo.co_filename), codigo.co_name)
+        _locais[codigo] = local
+    return local
+
+
+# ---------------- Formatação ----------------
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por registro."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": round(record.created, 6),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "arquivo": getattr(record, "arquivo_exibido", None) or caminho_exibido(record.pathname),
+            "linha": record.lineno,
+            "funcao": record.funcName,
+            "requisicao": getattr(record, "requisicao", None),
+            "span": getattr(record, "span", None),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        extras = {chave: valor for chave, valor in vars(record).items()
+                  if chave not in _ATRIBUTOS_PADRAO and chave not in ("arquivo_exibido", "requisicao", "span")}
+        if extras:
+            dados["extra"] = extras
+        if record.exc_text:
+            dados["excecao"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(arquivo_exibido)s:%(lineno)d: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not getattr(record, "arquivo_exibido", None):
+            record.arquivo_exibido = caminho_exibido(record.pathname)
+        texto = super().format(record)
+        return f"{texto}\n{record.exc_text}" if record.exc_text and record.exc_text not in texto else texto
+
+
+class ManipuladorFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que guarda no registro a requisição atual (o contexto só existe na
+    thread de quem registra) e mantém mensagem e exceção separadas para o JSON.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = span_atual()
+        registro = logging.makeLogRecord(vars(record))
+        registro.requisicao = span.requisicao if span is not None else None
+        registro.span = span.id if span is not None else None
+        registro.msg = record.getMessage()
+        registro.args = None
+        if record.exc_info:
+            registro.exc_text = logging.Formatter().formatException(record.exc_info)
+        registro.exc_info = None
+        return registro
+
+
+# ---------------- Configuração ----------------
+
+def configurar_logs() -> None:
+    """Liga os manipuladores dos loggers "ia_detran" (uma vez por processo; obter_logger chama)."""
+    global _configurado, _ouvinte
+    if _configurado:
+        return
+    with _trava_configuracao:
+        if _configurado:
+            return
+
+        manipuladores = []
+        if config.LOG_ARQUIVO:
+            try:
+                caminho = Path(config.LOG_ARQUIVO)
+                caminho.parent.mkdir(parents=True, exist_ok=True)
+                arquivo = logging.handlers.RotatingFileHandler(
+                    caminho, maxBytes=config.LOG_MAX_BYTES, backupCount=1, encoding="utf-8"
+                )
+                arquivo.setFormatter(FormatadorJSON())
+                manipuladores.append(arquivo)
+            except OSError as e:
+                print(f"Não foi possível abrir o arquivo de log {config.LOG_ARQUIVO}: {e}")
+        if config.LOG_CONSOLE:
+            console = logging.StreamHandler(sys.stderr)
+            console.setFormatter(FormatadorTexto())
+            manipuladores.append(console)
+
+        fila = queue.SimpleQueue()  # sem limite: registrar nunca espera
+        raiz = logging.getLogger(RAIZ_LOGGERS)
+        raiz.setLevel(config.LOG_NIVEL)
+        raiz.addHandler(ManipuladorFila(fila))
+        raiz.propagate = False
+
+        _ouvinte = logging.handlers.QueueListener(fila, *manipuladores, respect_handler_level=True)
+        _ouvinte.start()
+        atexit.register(_ouvinte.stop)  # grava o que ainda estiver na fila
+        _configurado = True
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """Logger "ia_detran.<nome>", já configurado."""
+    configurar_logs()
+    if nome != RAIZ_LOGGERS and not nome.startswith(RAIZ_LOGGERS + "."):
+        nome = f"{RAIZ_LOGGERS}.{nome}"
+    return logging.getLogger(nome)
+
+
+def registrar(
+    logger: logging.Logger,
+    nivel: int,
+    mensagem: str,
+    profundidade: int = 1,
+    extra: Optional[Dict[str, Any]] = None,
+    exc_info=None,
+) -> None:
+    """
+    Registra `mensagem` como logger.log(nivel, mensagem), mas sem o findCaller do logging.
+
+    O chamador é o frame `profundidade` acima deste (1: quem chamou registrar; 2: quem
+    chamou uma função que delega para registrar, como utils.log do ISFD).
+    """
+    if not logger.isEnabledFor(nivel):
+        return
+    frame = sys._getframe(profundidade)
+    caminho, exibido, funcao = local_do_codigo(frame.f_code)
+    registro = logger.makeRecord(
+        logger.name, nivel, caminho, frame.f_lineno, mensagem, None,
+        sys.exc_info() if exc_info is True else exc_info, funcao, extra,
+    )
+    registro.arquivo_exibido = exibido
+    logger.handle(registro)
@@ -0,0 +1,231 @@
+# lote.py
+# Geração de documentos em lote, sem a interface do Streamlit.
+#
+# Uso (a partir da pasta "PROJETO IA DETRAN"):
+#
+#   python -m comum.lote dfd  planilha.csv
+#   python -m comum.lote isfd pedidos.jsonl --saida lote_isfd --processos 8
+#   python -m comum.lote etp  estudos.jsonl --sem-cache
+#
+# Cada registro da entrada tem os mesmos campos do formulário do app. Os documentos
+# são gerados pelas mesmas funções dos apps (gerar_dfd_completo, gerar_etp_completo e
+# renderizar_isfd), distribuídos entre vários processos. Cada documento vai para a
+# sua própria subpasta da saída, e o manifesto.json lista os arquivos gerados, o
+# tempo de cada documento e os erros. Cada documento também é uma requisição da
+# instrumentação ("lote.<tipo>"; ver python -m comum.instrumentacao).
+#
+# Formatos de entrada:
+#
+#   .jsonl  um documento por linha: {"campo": valor, ..., "lista_itens": [{...}, ...]}
+#           (no ETP a lista se chama "lista_de_itens"). O .json salvo pelo ISFD junto
+#           com cada documento já serve como linha de entrada.
+#   .csv    uma linha por item. As colunas "item_<campo>" formam os itens e as demais
+#           são os campos do formulário, lidos da primeira linha do documento. A coluna
+#           "documento" agrupa as linhas de um mesmo documento; sem ela, cada linha é
+#           um documento com um único item. Aceita "," ou ";" como separador.
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from comum import config
+from comum.escalonador_ia import LOTE, origem_pedidos
+from comum.instrumentacao import requisicao
+
+# Tipo de documento -> pasta do app e nome da lista de itens no formulário
+TIPOS = {
+    "dfd": {"pasta": "DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA", "itens": "lista_itens"},
+    "etp": {"pasta": "ETP - ESTUDO TÉCNICO PRELIMINAR", "itens": "lista_de_itens"},
+    "isfd": {"pasta": "INSTRUMENTO SIMPLIFICADO DE FORMALIZAÇÃO DE DEMANDA", "itens": "lista_itens"},
+}
+
+PREFIXO_ITEM = "item_"
+
+
+# ---------------- Leitura da entrada ----------------
+
+def _ler_jsonl(caminho: Path, chave_itens: str) -> List[Dict[str, Any]]:
+    registros = []
+    with caminho.open(encoding="utf-8-sig") as f:
+        for numero, linha in enumerate(f, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{caminho}, linha {numero}: JSON inválido ({e})") from e
+            if "itens" in registro and chave_itens not in registro:
+                registro[chave_itens] = registro.pop("itens")
+            registros.append(registro)
+    return registros
+
+
+def _ler_csv(caminho: Path, chave_itens: str) -> List[Dict[str, Any]]:
+    with caminho.open(encoding="utf-8-sig", newline="") as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=",;") if amostra else csv.excel
+        linhas = list(csv.DictReader(f, dialect=dialeto))
+
+    documentos: Dict[str, Dict[str, Any]] = {}
+    for numero, linha in enumerate(linhas, start=1):
+        linha = {(k or "").strip(): (v or "").strip() for k, v in linha.items()}
+        chave = linha.pop("documento", "") or f"linha {numero}"
+
+        item = {k[len(PREFIXO_ITEM):]: v for k, v in linha.items() if k.startswith(PREFIXO_ITEM)}
+        campos = {k: v for k, v in linha.items() if not k.startswith(PREFIXO_ITEM)}
+
+        registro = documentos.get(chave)
+        if registro is None:
+            registro = documentos[chave] = {"documento": chave, **campos, chave_itens: []}
+        if any(item.values()):
+            registro[chave_itens].append(item)
+    return list(documentos.values())
+
+
+def ler_entrada(caminho: Path, tipo: str) -> List[Dict[str, Any]]:
+    """Lê os documentos de um .csv ou .jsonl, no formato descrito no início do módulo."""
+    chave_itens = TIPOS[tipo]["itens"]
+    if caminho.suffix.lower() == ".csv":
+        return _ler_csv(caminho, chave_itens)
+    if caminho.suffix.lower() in (".jsonl", ".json"):
+        return _ler_jsonl(caminho, chave_itens)
+    raise ValueError(f'Formato de entrada não suportado: "{caminho.suffix}" (use .csv ou .jsonl)')
+
+
+# ---------------- Processos ----------------
+
+def _inicializar_processo(tipo: str) -> None:
+    # Cada processo trabalha como o app do tipo: pasta do app no path e como pasta atual
+    pasta_app = config.RAIZ_PROJETO / TIPOS[tipo]["pasta"]
+    for caminho in (str(config.RAIZ_PROJETO), str(pasta_app)):
+        if caminho not in sys.path:
+            sys.path.insert(0, caminho)
+    os.chdir(pasta_app)
+
+    if tipo == "isfd":
+        from gerar_isfd import configurar_locale
+        configurar_locale()
+
+
+def _gerar_documento(tipo: str, registro: Dict[str, Any], pasta_saida: Path, usar_cache: bool) -> List[str]:
+    chave_itens = TIPOS[tipo]["itens"]
+    dados = {k: v for k, v in registro.items() if k not in ("documento", chave_itens)}
+    itens = registro.get(chave_itens) or []
+
+    if tipo == "dfd":
+        from gerar_dfd import gerar_dfd_completo
+        caminho_docx = gerar_dfd_completo(dados, itens, usar_cache=usar_cache, pasta_saida=str(pasta_saida))
+        return [caminho_docx, str(Path(caminho_docx).with_suffix(".json"))]
+
+    if tipo == "etp":
+        from gerar_etp import gerar_etp_completo
+        caminho_docx, _ = gerar_etp_completo(dados, itens, usar_cache=usar_cache, pasta_saida=str(pasta_saida))
+        return [caminho_docx, caminho_docx.replace(".docx", "_DATA.json")]
+
+    from gerar_isfd import completar_contexto, renderizar_isfd
+    caminho_docx = renderizar_isfd(completar_contexto({**dados, chave_itens: itens}), pasta_saida)
+    return [str(caminho_docx), str(caminho_docx.with_suffix(".json"))]
+
+
+def _gerar(tipo: str, indice: int, registro: Dict[str, Any], pasta_saida: Path, usar_cache: bool) -> Dict[str, Any]:
+    """Gera um documento e devolve a linha dele no manifesto (nunca levanta exceção)."""
+    inicio = time.perf_counter()
+    linha = {"indice": indice, "documento": registro.get("documento", str(indice)), "arquivos": [], "erro": None}
+    try:
+        # Chamadas à IA do lote cedem a vez aos usuários da interface (comum.escalonador_ia)
+        with requisicao(f"lote.{tipo}", documento=linha["documento"]), origem_pedidos(LOTE, "lote"):
+            arquivos = _gerar_documento(tipo, registro, pasta_saida / f"{indice:04d}", usar_cache)
+        linha["arquivos"] = [os.path.abspath(a) for a in arquivos]
+        linha["situacao"] = "concluido"
+    except Exception as e:
+        traceback.print_exc()
+        linha["situacao"] = "erro"
+        linha["erro"] = f"{type(e).__name__}: {e}"
+    linha["segundos"] = round(time.perf_counter() - inicio, 3)
+    return linha
+
+
+def gerar_lote(
+    tipo: str,
+    registros: List[Dict[str, Any]],
+    pasta_saida: Path,
+    processos: Optional[int] = None,
+    usar_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Gera todos os documentos de `registros` em paralelo e grava o manifesto.json em `pasta_saida`.
+
+    Retorna o manifesto.
+    """
+    pasta_saida = Path(pasta_saida).resolve()
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    processos = max(1, min(processos or config.LOTE_PROCESSOS, len(registros) or 1))
+
+    iniciado_em = datetime.now()
+    inicio = time.perf_counter()
+    documentos = []
+    with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_processo, initargs=(tipo,)) as executor:
+        futuros = [
+            executor.submit(_gerar, tipo, indice, registro, pasta_saida, usar_cache)
+            for indice, registro in enumerate(registros, start=1)
+        ]
+        for futuro in as_completed(futuros):
+            linha = futuro.result()
+            documentos.append(linha)
+            marca = "OK  " if linha["situacao"] == "concluido" else "ERRO"
+            print(f"[{len(documentos)}/{len(registros)}] {marca} {linha['documento']} ({linha['segundos']:.1f}s)"
+                  + (f" - {linha['erro']}" if linha["erro"] else ""))
+
+    documentos.sort(key=lambda linha: linha["indice"])
+    manifesto = {
+        "tipo": tipo,
+        "iniciado_em": iniciado_em.isoformat(timespec="seconds"),
+        "concluido_em": datetime.now().isoformat(timespec="seconds"),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "processos": processos,
+        "total": len(documentos),
+        "erros": sum(1 for linha in documentos if linha["situacao"] == "erro"),
+        "documentos": documentos,
+    }
+    with (pasta_saida / "manifesto.json").open("w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=4, ensure_ascii=False)
+    return manifesto
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m comum.lote", description="Gera documentos DFD, ETP ou ISFD em lote.")
+    parser.add_argument("tipo", choices=sorted(TIPOS), help="tipo de documento")
+    parser.add_argument("entrada", type=Path, help="arquivo .csv ou .jsonl com um documento por registro")
+    parser.add_argument("--saida", type=Path, default=None, help="pasta de saída (padrão: lote_<tipo>_<data>)")
+    parser.add_argument("--processos", type=int, default=None, help=f"processos em paralelo (padrão: {config.LOTE_PROCESSOS})")
+    parser.add_argument("--sem-cache", action="store_true", help="não reaproveita respostas da IA guardadas no cache")
+    args = parser.parse_args(argv)
+
+    try:
+        registros = ler_entrada(args.entrada, args.tipo)
+    except (OSError, ValueError, csv.Error) as e:
+        parser.error(str(e))
+    if not registros:
+        parser.error(f'Nenhum documento encontrado em "{args.entrada}"')
+
+    pasta_saida = args.saida or Path(f"lote_{args.tipo}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
+    manifesto = gerar_lote(args.tipo, registros, pasta_saida, processos=args.processos, usar_cache=not args.sem_cache)
+
+    print(
+        f"{manifesto['total'] - manifesto['erros']} de {manifesto['total']} documentos gerados em "
+        f"{manifesto['segundos']:.1f}s com {manifesto['processos']} processos. "
+        f"Manifesto: {Path(pasta_saida).resolve() / 'manifesto.json'}"
+    )
+    return 1 if manifesto["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# multipagina.py
+# Todos os geradores (DFD, ETP, ISFD, PTS e GT) como páginas de um único app Streamlit.
+#
+# Cada gerador roda, por padrão, no seu próprio servidor Streamlit: cinco
+# interpretadores, cada um importando streamlit, pandas, docxtpl etc. e mantendo a sua
+# cópia do registro de templates, do cliente de IA, do cache e do catálogo. Como
+# páginas de um só processo (0.INTERFACE_INICIAL/portal.py), tudo isso é carregado uma
+# vez e compartilhado.
+#
+# Os apps foram escritos para rodar sozinhos: importam os módulos da própria pasta
+# pelo nome (from gerar_ia_dfd import ...). Em um único processo o sys.modules é um
+# só, então as pastas das páginas entram todas no sys.path e os módulos delas têm
+# nomes únicos entre os apps (gerar_ia_dfd, gerar_ia_etp, gerar_doc_pts...): um
+# módulo novo em uma pasta de app não pode repetir o nome de um módulo de outra.
+import sys
+from pathlib import Path
+from typing import List, NamedTuple
+
+from comum import config
+
+
+class Pagina(NamedTuple):
+    nome: str        # mesmo nome usado pelo controlador.py (DFD, ETP, ISS, PTS, GT)
+    pasta: str       # pasta do app, relativa à raiz do projeto
+    arquivo: str     # script Streamlit do app
+    titulo: str
+    url_path: str
+    icone: str
+
+    @property
+    def caminho(self) -> Path:
+        return config.RAIZ_PROJETO / self.pasta / self.arquivo
+
+
+PAGINAS: List[Pagina] = [
+    Pagina("DFD", "DFD - DOCUMENTO DE FORMALIZAÇÃO DE DEMANDA", "app.py",
+           "DFD - Documento de Formalização de Demanda", "dfd", "📝"),
+    Pagina("ETP", "ETP - ESTUDO TÉCNICO PRELIMINAR", "app.py",
+           "ETP - Estudo Técnico Preliminar", "etp", "📘"),
+    Pagina("GT", "GT - Gestão de riscos", "app.py",
+           "GT - Gestão de Riscos", "gt", "⚠️"),
+    Pagina("ISS", "INSTRUMENTO SIMPLIFICADO DE FORMALIZAÇÃO DE DEMANDA", "app.py",
+           "Instrumento Simplificado de Formalização de Demanda", "isfd", "📄"),
+    Pagina("PTS", "PARECER TÉCNICO SETORIAL - MTI", "app_streamlit.py",
+           "Parecer Técnico Setorial - MTI", "pts", "🖥️"),
+]
+
+
+# ---------------- Módulos de cada app ----------------
+
+def adicionar_pastas_ao_path(paginas: List[Pagina] = PAGINAS) -> None:
+    """Põe a pasta de cada app no sys.path, para os imports dos módulos locais de cada página."""
+    for pagina in paginas:
+        pasta = str(pagina.caminho.parent)
+        if pasta not in sys.path:
+            sys.path.append(pasta)
+
+
+# ---------------- Portal ----------------
+
+def executar_portal(paginas: List[Pagina] = PAGINAS) -> None:
+    """Monta a navegação entre os geradores e executa a página escolhida (chamar a cada execução do script)."""
+    import streamlit as st
+
+    adicionar_pastas_ao_path(paginas)
+
+    st.set_page_config(layout="wide", page_title="Gerador de Documentos DETRAN-MT")
+    navegacao = st.navigation(
+        {
+            "Geradores de documentos": [
+                st.Page(
+                    str(pagina.caminho),
+                    title=pagina.titulo,
+                    url_path=pagina.url_path,
+                    icon=pagina.icone,
+                    default=indice == 0,
+                )
+                for indice, pagina in enumerate(paginas)
+            ]
+        }
+    )
+    navegacao.run()
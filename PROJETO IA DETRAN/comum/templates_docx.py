@@ -0,0 +1,175 @@
+# templates_docx.py
+# Registro dos templates .docx usados pelos geradores de documentos.
+#
+# Criar um DocxTemplate a cada documento obriga o docxtpl a ler o arquivo do disco,
+# refazer o patch_xml (várias expressões regulares sobre o XML inteiro do corpo,
+# cabeçalhos e rodapés) e compilar de novo o template Jinja resultante. Como o
+# template não muda entre um documento e outro, o registro guarda por processo:
+#
+#   - o conteúdo do arquivo (cada render recebe uma cópia nova, lida da memória);
+#   - o XML já processado pelo patch_xml;
+#   - o template Jinja compilado (AmbienteJinja.from_string);
+#   - o conjunto de variáveis do template.
+#
+# Tudo é descartado quando a data de modificação ou o tamanho do arquivo mudam,
+# então editar o template no Word tem efeito no documento seguinte.
+#
+# Leitura do arquivo, render e gravação são medidos pela instrumentação
+# (spans "template.carregar", "docx.renderizar" e "docx.salvar").
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Optional, Tuple, Union
+
+import jinja2
+from docxtpl import DocxTemplate
+
+from comum.instrumentacao import medir
+
+
+class AmbienteJinja(jinja2.Environment):
+    """
+    Environment do Jinja que guarda os templates compilados por from_string.
+
+    O docxtpl chama from_string com o XML de cada parte do documento a cada render;
+    com o mesmo template .docx esse XML é sempre o mesmo e a compilação pode ser
+    reaproveitada (templates compilados do Jinja podem ser renderizados em paralelo).
+    """
+
+    def __init__(self, *args, max_compilados: int = 32, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compilados: "OrderedDict[str, jinja2.Template]" = OrderedDict()
+        self._max_compilados = max_compilados
+        self._trava_compilados = threading.Lock()
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+
+        with self._trava_compilados:
+            template = self._compilados.get(source)
+            if template is not None:
+                self._compilados.move_to_end(source)
+                return template
+
+        template = super().from_string(source)
+        with self._trava_compilados:
+            self._compilados[source] = template
+            while len(self._compilados) > self._max_compilados:
+                self._compilados.popitem(last=False)
+        return template
+
+
+_ambiente_padrao = AmbienteJinja()
+
+
+class _EntradaTemplate:
+    """Dados de um arquivo de template guardados pelo registro."""
+
+    def __init__(self, caminho: Path, assinatura: Tuple[int, int], conteudo: bytes):
+        self.caminho = caminho
+        self.assinatura = assinatura
+        self.conteudo = conteudo
+        self.xml_processado: Dict[str, str] = {}
+        self.variaveis: Dict[jinja2.Environment, FrozenSet[str]] = {}
+        self.trava = threading.Lock()
+
+    def patch_xml(self, src_xml: str, processar: Callable[[str], str]) -> str:
+        with self.trava:
+            xml = self.xml_processado.get(src_xml)
+        if xml is None:
+            xml = processar(src_xml)
+            with self.trava:
+                self.xml_processado[src_xml] = xml
+        return xml
+
+
+class TemplateDocx(DocxTemplate):
+    """
+    DocxTemplate entregue pelo registro: cada instância é uma cópia independente para
+    um único documento, mas reaproveita o trabalho de preparação já feito no template.
+    """
+
+    def __init__(self, entrada: _EntradaTemplate):
+        super().__init__(io.BytesIO(entrada.conteudo))
+        self._entrada = entrada
+
+    def patch_xml(self, src_xml):
+        return self._entrada.patch_xml(src_xml, super().patch_xml)
+
+    def render(self, context, jinja_env: Optional[jinja2.Environment] = None, autoescape: bool = False) -> None:
+        if jinja_env is None and not autoescape:
+            jinja_env = _ambiente_padrao
+        with medir("docx.renderizar", template=self._entrada.caminho.name):
+            super().render(context, jinja_env, autoescape)
+
+    def save(self, filename, *args, **kwargs) -> None:
+        with medir("docx.salvar", template=self._entrada.caminho.name) as span:
+            super().save(filename, *args, **kwargs)
+            if isinstance(filename, (str, os.PathLike)):
+                span.definir(bytes=os.path.getsize(filename))
+            elif hasattr(filename, "tell"):
+                span.definir(bytes=filename.tell())
+
+    def get_undeclared_template_variables(self, jinja_env=None, context=None):
+        jinja_env = jinja_env or _ambiente_padrao
+        with self._entrada.trava:
+            variaveis = self._entrada.variaveis.get(jinja_env)
+        if variaveis is None:
+            variaveis = frozenset(super().get_undeclared_template_variables(jinja_env))
+            with self._entrada.trava:
+                self._entrada.variaveis[jinja_env] = variaveis
+
+        if context is not None:
+            return set(variaveis) - set(context.keys())
+        return set(variaveis)
+
+
+class RegistroTemplates:
+    def __init__(self):
+        self._entradas: Dict[Path, _EntradaTemplate] = {}
+        self._trava = threading.Lock()
+
+    def _entrada(self, caminho: Union[str, os.PathLike]) -> _EntradaTemplate:
+        caminho = Path(caminho).resolve()
+        estado = caminho.stat()  # FileNotFoundError se o template não existir
+        assinatura = (estado.st_mtime_ns, estado.st_size)
+
+        with self._trava:
+            entrada = self._entradas.get(caminho)
+            if entrada is not None and entrada.assinatura == assinatura:
+                return entrada
+
+        with medir("template.carregar", template=caminho.name) as span:
+            conteudo = caminho.read_bytes()
+            span.definir(bytes=len(conteudo))
+        entrada = _EntradaTemplate(caminho, assinatura, conteudo)
+        with self._trava:
+            self._entradas[caminho] = entrada
+        return entrada
+
+    def obter(self, caminho: Union[str, os.PathLike]) -> TemplateDocx:
+        """Retorna um template novo, pronto para um render, do arquivo em `caminho`."""
+        return TemplateDocx(self._entrada(caminho))
+
+    def variaveis(self, caminho: Union[str, os.PathLike], jinja_env: Optional[jinja2.Environment] = None) -> set:
+        """Variáveis usadas pelo template (equivalente a get_undeclared_template_variables)."""
+        return self.obter(caminho).get_undeclared_template_variables(jinja_env)
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._entradas.clear()
+
+
+_registro = RegistroTemplates()
+
+
+def obter_template(caminho: Union[str, os.PathLike]) -> TemplateDocx:
+    """Atalho para o registro do processo: um TemplateDocx novo para cada documento."""
+    return _registro.obter(caminho)
+
+
+def variaveis_template(caminho: Union[str, os.PathLike], jinja_env: Optional[jinja2.Environment] = None) -> set:
+    return _registro.variaveis(caminho, jinja_env)
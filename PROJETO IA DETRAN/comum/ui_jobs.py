@@ -0,0 +1,111 @@
+# ui_jobs.py
+# Acompanhamento, na interface do Streamlit, dos jobs enviados para comum.fila_jobs.
+#
+# O id do job fica no session_state e na URL (?job_etp=...), então recarregar a
+# página volta a exibir o andamento da mesma geração. Enquanto o job roda, só um
+# fragmento da página é atualizado a cada segundo; o restante do formulário não é
+# reexecutado.
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import streamlit as st
+
+from comum.fila_jobs import CANCELADO, CONCLUIDO, ERRO, FINALIZADOS, PENDENTE, FilaJobs
+
+INTERVALO_ATUALIZACAO = 1.0  # segundos
+
+
+def usuario_atual() -> str:
+    """
+    Quem está usando o app, para enviar com o job (comum.fila_jobs): o IP do navegador
+    ou, acessando pela própria máquina, um id da sessão.
+    """
+    ip = st.context.ip_address
+    if isinstance(ip, str) and ip:
+        return ip
+    if "usuario_ia" not in st.session_state:
+        st.session_state.usuario_ia = uuid.uuid4().hex
+    return st.session_state.usuario_ia
+
+
+def lembrar_job(nome: str, job_id: str) -> None:
+    st.session_state[f"job_{nome}"] = job_id
+    st.query_params[f"job_{nome}"] = job_id
+
+
+def job_atual(nome: str) -> Optional[str]:
+    return st.session_state.get(f"job_{nome}") or st.query_params.get(f"job_{nome}")
+
+
+def esquecer_job(nome: str) -> None:
+    st.session_state.pop(f"job_{nome}", None)
+    if f"job_{nome}" in st.query_params:
+        del st.query_params[f"job_{nome}"]
+
+
+def _exibir(fila: FilaJobs, nome: str, job: Dict[str, Any], titulos: Optional[Dict[str, str]], ao_concluir):
+    situacao = job["situacao"]
+
+    if situacao == PENDENTE:
+        st.info(f"⏳ Aguardando na fila de geração (posição {job.get('posicao', 1)})...")
+    elif situacao not in FINALIZADOS:
+        st.progress(job["progresso"], text=job["mensagem"] or "Gerando documento...")
+
+    textos = job["parcial"] or {}
+    if titulos and textos:
+        with st.container(border=True):
+            st.markdown("#### Textos gerados pela IA")
+            for chave, titulo in titulos.items():
+                if textos.get(chave):
+                    st.markdown(f"**{titulo}**")
+                    st.write(textos[chave])
+
+    if situacao not in FINALIZADOS:
+        st.button("⏹️ Cancelar geração", key=f"cancelar_job_{nome}", on_click=fila.cancelar, args=(job["id"],))
+        return
+
+    if situacao == CONCLUIDO:
+        if ao_concluir is not None:
+            ao_concluir(job["resultado"] or {})
+    elif situacao == ERRO:
+        st.error(f"❌ Erro ao gerar o documento. Por favor, tente novamente. Detalhes: {job['erro']}")
+    elif situacao == CANCELADO:
+        st.warning("Geração cancelada.")
+
+    st.button("Limpar", key=f"limpar_job_{nome}", on_click=esquecer_job, args=(nome,))
+
+
+def painel_job(
+    fila: FilaJobs,
+    nome: str,
+    titulos: Optional[Dict[str, str]] = None,
+    ao_concluir: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> None:
+    """
+    Exibe o andamento do job atual de `nome` (se houver).
+
+    `titulos` ({chave: título}) define quais resultados parciais mostrar e em que
+    ordem; `ao_concluir(resultado)` desenha os botões de download quando o job termina.
+    """
+    job_id = job_atual(nome)
+    if not job_id:
+        return
+
+    job = fila.consultar(job_id)
+    if job is None:
+        esquecer_job(nome)
+        return
+
+    if job["situacao"] in FINALIZADOS:
+        _exibir(fila, nome, job, titulos, ao_concluir)
+        return
+
+    @st.fragment(run_every=INTERVALO_ATUALIZACAO)
+    def acompanhar():
+        atual = fila.consultar(job_id)
+        if atual is None or atual["situacao"] in FINALIZADOS:
+            # Redesenha a página inteira uma vez, agora sem atualização periódica
+            st.rerun()
+        _exibir(fila, nome, atual, titulos, ao_concluir)
+
+    acompanhar()